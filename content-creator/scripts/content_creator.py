@@ -13,12 +13,15 @@ Usage:
     python3 content_creator.py --topic "counting colors"       # Từ chủ đề
     python3 content_creator.py --dry-run                       # Test không gọi LLM
     python3 content_creator.py --review-prompts                # Xem prompts Agent 4
+    python3 content_creator.py --topics "abc song,bath time"   # Batch nhiều chủ đề
+    python3 content_creator.py --topics-file topics.txt --batch-api
 """
 
 import argparse
 import json
 import os
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -28,10 +31,16 @@ from utils import (
     setup_logging, get_config, ensure_output_dirs, save_json, load_json,
     check_content_safety, print_header, print_step, print_success,
     print_warning, print_error, safe_filename, get_output_dir,
-    send_telegram
+    send_telegram, json_mode, emit_json
 )
+from tracing import get_tracer, trace_response
+from profiling import run_profiled
+from json_stream import JsonStreamParser, extract_json
+from script_validator import validate_script
+from llm_router import get_router, route_key
 
 logger = setup_logging("ContentCreator")
+tracer = get_tracer("content_creator")
 
 # ── LLM Prompt Templates ──
 SCRIPT_PROMPT = """Bạn là biên kịch chuyên nghiệp cho video YouTube Kids (trẻ em {age_range} tuổi).
@@ -95,6 +104,108 @@ Trả lời CHÍNH XÁC theo format JSON sau (không thêm text ngoài JSON):
 }}
 """
 
+# Video dài: 2 pha — dàn ý (lyrics, music, section plan) rồi scenes theo từng đoạn
+OUTLINE_PROMPT = """Bạn là biên kịch chuyên nghiệp cho video YouTube Kids (trẻ em {age_range} tuổi).
+
+NHIỆM VỤ: Lập DÀN Ý cho video {duration} phút ({total_seconds} giây) về chủ đề: "{topic}"
+Phân cảnh chi tiết sẽ được viết sau theo từng đoạn — ở đây CHƯA viết scenes.
+
+YÊU CẦU BẮT BUỘC:
+1. Nội dung TUYỆT ĐỐI AN TOÀN cho trẻ em (COPPA compliant)
+2. Lời bài hát bắt tai, lặp đi lặp lại, dễ nhớ; có yếu tố giáo dục
+3. "sections": thứ tự các đoạn trong video, mỗi đoạn là 1 key của "lyrics"
+   (được lặp lại, vd. chorus nhiều lần); tổng "seconds" = {total_seconds}
+4. "characters": nhân vật chính + mô tả ngoại hình cố định (dùng lại ở mọi scene)
+
+Trả lời CHÍNH XÁC theo format JSON sau (không thêm text ngoài JSON):
+
+{{
+    "title": "Tên video hấp dẫn bằng tiếng Anh",
+    "title_vi": "Tên video tiếng Việt",
+    "duration_minutes": {duration},
+    "target_age": "{age_range}",
+    "theme": "{topic}",
+    "characters": ["Teddy Bear (brown, fluffy, big eyes)"],
+    "lyrics": {{
+        "intro": "4-8 dòng mở đầu",
+        "verse1": "4-8 dòng verse 1",
+        "chorus": "4-6 dòng chorus",
+        "verse2": "4-8 dòng verse 2",
+        "bridge": "4 dòng bridge",
+        "outro": "4 dòng kết thúc"
+    }},
+    "sections": [
+        {{"lyrics_section": "intro", "seconds": 16, "summary": "1 câu: chuyện gì xảy ra trong đoạn này"}}
+    ],
+    "music_direction": {{
+        "genre": "Cocomelon-style kids pop",
+        "bpm": 120,
+        "key": "C major",
+        "mood": "happy, cheerful, energetic",
+        "instruments": ["ukulele", "xylophone", "claps"],
+        "vocal_style": "cheerful child-like voice, clear pronunciation",
+        "reference_songs": ["Baby Shark"]
+    }},
+    "seo": {{
+        "tags": ["tag1", "tag2", "tag3"],
+        "description": "Mô tả video cho YouTube (150 ký tự)"
+    }}
+}}
+"""
+
+SCENES_PROMPT = """Bạn là biên kịch chuyên nghiệp cho video YouTube Kids (trẻ em {age_range} tuổi).
+Video: "{title}" — chủ đề "{topic}". Nhân vật (giữ nguyên ngoại hình): {characters}
+
+Viết phân cảnh cho ĐOẠN "{section}" (từ {start} tới {end}, = {seconds} giây).
+Lời đoạn này:
+{lyrics}
+
+Nội dung đoạn: {summary}
+Đoạn trước: {previous} | Đoạn sau: {next}
+
+YÊU CẦU: Nội dung TUYỆT ĐỐI AN TOÀN cho trẻ em. Cần CHÍNH XÁC {count} scenes,
+mỗi scene TỐI ĐA 8 GIÂY, CHỈ 1 hành động đơn giản, nối tiếp mạch lạc với 2 đoạn bên cạnh.
+
+Trả lời CHÍNH XÁC theo format JSON sau (không thêm text ngoài JSON):
+
+{{
+    "scenes": [
+        {{
+            "description": "Mô tả chi tiết cảnh (nhân vật, hành động, bối cảnh)",
+            "characters": ["tên nhân vật"],
+            "action": "1 hành động cụ thể, đơn giản",
+            "background": "mô tả nền",
+            "colors": "bảng màu chủ đạo",
+            "camera_movement": "zoom in/out/pan/static",
+            "mood": "happy/exciting/calm"
+        }}
+    ]
+}}
+"""
+
+# Sửa an toàn: chỉ viết lại các phần bị bộ lọc đánh dấu (không sinh lại cả kịch bản)
+REPAIR_PROMPT = """Bạn là biên tập viên nội dung cho video YouTube Kids (trẻ em {age_range} tuổi).
+Video: "{title}" — chủ đề "{topic}".
+
+Bộ lọc an toàn đánh dấu các phần dưới đây. Viết lại CHỈ những phần này: giữ ý, nhịp,
+độ dài, nhân vật và bối cảnh; TUYỆT ĐỐI KHÔNG dùng các từ: {banned}
+
+{fragments}
+
+Trả lời CHÍNH XÁC theo format JSON sau (không thêm text ngoài JSON), chỉ gồm các phần ở trên:
+
+{{
+    "lyrics": {{"<tên đoạn>": "lời mới"}},
+    "scenes": [
+        {{"id": 1, "description": "...", "characters": ["..."], "action": "...", "background": "...",
+          "colors": "...", "camera_movement": "...", "mood": "..."}}
+    ]
+}}
+"""
+
+MAX_SCENE_SECONDS = 8
+SAFETY_REPAIR_ROUNDS = 3
+
 # ── Dry-run Sample (max 8s per scene) ──
 SAMPLE_SCRIPT = {
     "title": "Counting Stars with Teddy Bear",
@@ -206,44 +317,194 @@ SAMPLE_SCRIPT = {
 }
 
 def extract_json_from_text(text):
-    """Trích xuất JSON từ LLM response (xử lý markdown fences, trailing commas)."""
-    import re
-    
-    # Strip markdown code fences
-    cleaned = text.strip()
-    if cleaned.startswith("```"):
-        # Remove ```json ... ``` or ``` ... ```
-        cleaned = re.sub(r'^```(?:json)?\s*\n?', '', cleaned)
-        cleaned = re.sub(r'\n?```\s*$', '', cleaned)
-    
-    # Remove trailing commas before } or ]
-    cleaned = re.sub(r',\s*([}\]])', r'\1', cleaned)
-    
-    try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
-        pass
+    """
+    Trích xuất JSON từ LLM response: object cân bằng đầu tiên (bỏ qua markdown
+    fences / text thừa), sửa dấu phẩy thừa và tail bị cắt cụt — 1 lần quét.
+    """
+    return extract_json(text or "")
+
+def record_response(text, config, provider):
+    """LLM_RECORD_DIR: lưu raw response (dữ liệu cho scripts/bench_json.py)."""
+    record_dir = config.get("llm_record_dir")
+    if not record_dir or not text:
+        return
+    path = Path(record_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    name = f"{provider}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.txt"
+    (path / name).write_text(text, encoding="utf-8")
+
+def parse_llm_text(text, config, provider, result=None):
+    """Ghi lại response (tùy chọn) + parse JSON. result: object stream parser đã parse được."""
+    record_response(text, config, provider)
+    result = result or extract_json_from_text(text)
+    if result is None:
+        print_error(f"Không parse được JSON từ {provider}. Raw text (500 chars):\n{text[:500]}")
+    return result
+
+class UnsafeContent(Exception):
+    """Phát hiện nội dung không an toàn giữa stream → dừng LLM sớm."""
+
+    def __init__(self, path, violations):
+        super().__init__(f"{'/'.join(map(str, path))}: {', '.join(violations)}")
+        self.path = path
+        self.violations = violations
+
+class ScriptStreamMonitor:
+    """
+    Nhận từng phần kịch bản ngay khi LLM stream xong phần đó:
+    lyrics[section], music_direction, scenes[i] → kiểm tra an toàn tại chỗ + log tiến độ.
+    abort=True: vi phạm → raise UnsafeContent, hủy request (dùng khi sửa từng phần:
+    phần sửa vẫn vi phạm thì không cần đợi model sinh hết).
+    abort=False: chỉ ghi nhận — phần vi phạm được sửa riêng sau khi có đủ kịch bản.
+    """
+
+    def __init__(self, abort=False):
+        self.abort = abort
+        self.start = time.monotonic()
+        self.scenes = 0
+        self.first_scene_s = None
+        self.flagged = 0
+
+    def __call__(self, path, value):
+        if len(path) == 2 and path[0] == "lyrics" and isinstance(value, str):
+            self._check(path, value)
+        elif len(path) == 2 and path[0] == "scenes" and isinstance(value, dict):
+            self._check(path, value.get("description", ""))
+            self.scenes += 1
+            if self.first_scene_s is None:
+                self.first_scene_s = round(time.monotonic() - self.start, 2)
+                print(f"    📥 Scene đầu tiên sau {self.first_scene_s}s")
+        elif path == ("music_direction",) and isinstance(value, dict):
+            print(f"    🎵 Music direction sẵn sàng: {value.get('genre', '?')}, {value.get('bpm', '?')} BPM")
+
+    def _check(self, path, text):
+        is_safe, violations = check_content_safety(text)
+        if is_safe:
+            return
+        if self.abort:
+            raise UnsafeContent(path, violations)
+        self.flagged += 1
+        print(f"    ⚠️  {'/'.join(map(str, path))}: {', '.join(violations)} → sẽ sửa riêng phần này")
+
+def _sse_delta(provider, event):
+    """Text mới trong 1 event SSE (Gemini streamGenerateContent / OpenAI stream)."""
+    if provider == "gemini":
+        candidates = event.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(p.get("text", "") for p in parts)
+    choices = event.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+def stream_llm(url, payload, provider, model, prompt, headers=None, on_value=None, cancel=None):
+    """
+    Gọi LLM dạng stream (SSE), parse JSON tăng dần.
+    Timeout đọc tính giữa các chunk (model còn sinh là còn chờ) thay vì 1200s tổng.
+    cancel.set() (route khác đã trả kết quả) → đóng kết nối ở chunk kế tiếp.
+    Returns: (text đầy đủ, object đã parse hoặc None)
+    """
+    import requests
+
+    parser = JsonStreamParser(on_value=on_value)
+    chunks = []
+    received = 0
+    start = time.monotonic()
+    with tracer.span("http:llm", provider=provider, model=model, stream=True) as span:
+        with requests.post(url, json=payload, headers=headers, stream=True, timeout=(15, 120)) as response:
+            span.set(status_code=response.status_code)
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel is not None and cancel.is_set():
+                    span.set(cancelled=True)
+                    break
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                received += len(data)
+                delta = _sse_delta(provider, json.loads(data))
+                if not delta:
+                    continue
+                if not chunks:
+                    span.set(first_token_s=round(time.monotonic() - start, 3))
+                chunks.append(delta)
+                parser.feed(delta)
+        span.add_bytes(bytes_in=received, bytes_out=len(prompt.encode()))
+        span.set(chunks=len(chunks), values_emitted=parser.emitted)
+    return "".join(chunks), parser.close()
+
+def call_llm(prompt, config, on_value=None, routes=None, kind="script"):
+    """
+    Gọi LLM API để tạo kịch bản qua router (LLM_ROUTES): failover khi route lỗi,
+    hedge sang route kế tiếp khi route hiện tại chậm hơn p95, circuit breaker mỗi route.
+    LLM_STREAM=1 (mặc định): stream + on_value(path, value) cho từng phần hoàn chỉnh.
+    kind: "script" / "outline" / "scenes" / "repair" — p95 để hedge tính riêng từng loại.
+    """
+    routes = routes or config.get("llm_routes") or [
+        {"provider": config["llm_provider"], "model": config["llm_model"], "api_key": config["llm_api_key"]}]
     
-    # Fallback: find first { ... } block
-    match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-    if match:
+    with tracer.span("llm:route", routes=[route_key(r) for r in routes], kind=kind) as span:
+        events = []
+        
+        def attempt(route, cancel):
+            with tracer.span("llm:attempt", parent=span.id, route=route_key(route)):
+                return call_provider(prompt, config, route, on_value=on_value, cancel=cancel)
+        
+        def on_event(kind, key):
+            events.append(f"{kind}:{key}")
+            if kind in ("hedge", "failover"):
+                print(f"    🔀 {'Route chậm' if kind == 'hedge' else 'Route lỗi'} → thử thêm {key}")
+        
         try:
-            block = match.group(0)
-            block = re.sub(r',\s*([}\]])', r'\1', block)
-            return json.loads(block)
-        except json.JSONDecodeError:
-            pass
-    
+            return get_router().call(routes, attempt, passthrough=(UnsafeContent,),
+                                     hedge=config.get("llm_hedge", True), on_event=on_event, kind=kind)
+        finally:
+            span.set(events=events)
+
+def draft_problem(result, required=()):
+    """Lý do bản nháp của model nhanh không dùng được: "json" / "schema" / "safety" (None = dùng được)."""
+    if not isinstance(result, dict):
+        return "json"
+    if any(not result.get(key) for key in required):
+        return "schema"
+    if find_violations(result):
+        return "safety"
     return None
 
-def call_llm(prompt, config):
-    """Gọi LLM API để tạo kịch bản."""
-    provider = config["llm_provider"]
-    api_key = config["llm_api_key"]
-    model = config["llm_model"]
+def call_llm_tiered(prompt, config, on_value=None, required=("lyrics", "scenes"), kind="script"):
+    """
+    LLM_FAST_ROUTES: model nhanh/rẻ viết trước; chỉ gọi model mạnh (LLM_ROUTES) khi bản nháp
+    không parse được JSON, thiếu phần bắt buộc (required) hoặc vi phạm an toàn.
+    Tỉ lệ escalate được ghi vào thống kê router (python3 shared/llm_router.py).
+    """
+    fast = config.get("llm_fast_routes")
+    if not fast:
+        return call_llm(prompt, config, on_value=on_value, kind=kind)
+    
+    with tracer.span("llm:tiered", kind=kind) as span:
+        try:
+            draft = call_llm(prompt, config, on_value=on_value, routes=fast, kind=kind)
+            reason = draft_problem(draft, required)
+        except UnsafeContent:
+            reason = "safety"
+        except Exception as e:
+            logger.warning(f"Model nhanh lỗi: {e}")
+            reason = "error"
+        get_router().record_tier(reason)
+        span.set(escalated=bool(reason), reason=reason)
+    if not reason:
+        return draft
+    print(f"    ⬆️  Bản nháp model nhanh không đạt ({reason}) → dùng model mạnh")
+    return call_llm(prompt, config, on_value=on_value, kind=kind)
+
+def call_provider(prompt, config, route, on_value=None, cancel=None):
+    """1 request tới 1 route (provider + model). cancel: Event — route khác đã thắng."""
+    provider = route["provider"]
+    api_key = route["api_key"]
+    model = route["model"]
     
     if not api_key:
-        print_error("LLM_API_KEY chưa được cấu hình! Dùng --dry-run để test.")
+        print_error(f"API key cho {provider} chưa được cấu hình (LLM_API_KEY)! Dùng --dry-run để test.")
         return None
     
     try:
@@ -252,8 +513,11 @@ def call_llm(prompt, config):
         print_error("Cần cài requests: pip install requests")
         return None
     
+    stream = config.get("llm_stream", True)
+    
     if provider == "gemini":
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+        base_url = config.get("google_api_url", "https://generativelanguage.googleapis.com").rstrip("/")
+        url = f"{base_url}/v1beta/models/{model}:generateContent?key={api_key}"
         payload = {
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {
@@ -263,18 +527,23 @@ def call_llm(prompt, config):
             }
         }
         
-        response = requests.post(url, json=payload, timeout=1200)
+        if stream:
+            url = f"{base_url}/v1beta/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
+            text, result = stream_llm(url, payload, "gemini", model, prompt, on_value=on_value, cancel=cancel)
+            return parse_llm_text(text, config, "gemini", result)
+        
+        with tracer.span("http:llm", provider="gemini", model=model) as span:
+            response = requests.post(url, json=payload, timeout=1200)
+            trace_response(span, response, bytes_out=len(prompt.encode()))
         response.raise_for_status()
         data = response.json()
         
         text = data["candidates"][0]["content"]["parts"][0]["text"]
-        result = extract_json_from_text(text)
-        if result is None:
-            print_error(f"Không parse được JSON từ Gemini. Raw text (500 chars):\n{text[:500]}")
-        return result
+        return parse_llm_text(text, config, "gemini")
     
     elif provider == "openai":
-        url = "https://api.openai.com/v1/chat/completions"
+        base_url = config.get("openai_api_url", "https://api.openai.com/v1").rstrip("/")
+        url = f"{base_url}/chat/completions"
         headers = {"Authorization": f"Bearer {api_key}"}
         payload = {
             "model": model,
@@ -283,20 +552,270 @@ def call_llm(prompt, config):
             "response_format": {"type": "json_object"}
         }
         
-        response = requests.post(url, json=payload, headers=headers, timeout=1200)
+        if stream:
+            payload["stream"] = True
+            text, result = stream_llm(url, payload, "openai", model, prompt, headers=headers,
+                                      on_value=on_value, cancel=cancel)
+            return parse_llm_text(text, config, "openai", result)
+        
+        with tracer.span("http:llm", provider="openai", model=model) as span:
+            response = requests.post(url, json=payload, headers=headers, timeout=1200)
+            trace_response(span, response, bytes_out=len(prompt.encode()))
         response.raise_for_status()
         data = response.json()
         
         text = data["choices"][0]["message"]["content"]
-        result = extract_json_from_text(text)
-        if result is None:
-            print_error(f"Không parse được JSON từ OpenAI. Raw text (500 chars):\n{text[:500]}")
-        return result
+        return parse_llm_text(text, config, "openai")
     
     else:
         print_error(f"LLM provider '{provider}' chưa được hỗ trợ. Dùng gemini hoặc openai.")
         return None
 
+def format_time(seconds):
+    """68 → "1:08"."""
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def format_timestamp(start, end):
+    """(0, 68) → "0:00-1:08"."""
+    return f"{format_time(start)}-{format_time(end)}"
+
+def plan_sections(outline, total_seconds, batch_scenes):
+    """
+    Section plan của dàn ý → các batch scenes liên tục, giây nguyên, tổng = total_seconds.
+    Đoạn dài được chia thành nhiều batch ≤ batch_scenes scenes.
+    Returns: [{"lyrics_section", "summary", "start", "end", "count"}]
+    """
+    sections = [s for s in outline.get("sections") or []
+                if isinstance(s, dict) and s.get("lyrics_section")]
+    if not sections:  # LLM bỏ section plan → chia đều theo thứ tự lyrics
+        sections = [{"lyrics_section": k} for k in outline.get("lyrics") or {}] or [{"lyrics_section": "verse1"}]
+
+    weights = []
+    for section in sections:
+        try:
+            weights.append(max(float(section.get("seconds") or 0), 0))
+        except (TypeError, ValueError):
+            weights.append(0)
+    known = [w for w in weights if w]
+    default = sum(known) / len(known) if known else 1.0
+    weights = [w or default for w in weights]
+    scale = total_seconds / sum(weights)
+
+    batches = []
+    acc, start = 0.0, 0
+    for i, (section, weight) in enumerate(zip(sections, weights)):
+        acc += weight * scale
+        end = total_seconds if i == len(sections) - 1 else round(acc)
+        if end <= start:
+            continue  # đoạn quá ngắn → phần giây dồn sang đoạn sau
+        seconds = end - start
+        count = -(-seconds // MAX_SCENE_SECONDS)
+        for first in range(0, count, batch_scenes):
+            n = min(batch_scenes, count - first)
+            batches.append({
+                "lyrics_section": section["lyrics_section"],
+                "summary": section.get("summary", ""),
+                "start": start + round(seconds * first / count),
+                "end": start + round(seconds * (first + n) / count),
+                "count": n,
+            })
+        start = end
+    return batches
+
+def generate_scene_batch(batch, neighbours, outline, topic, age_range, config, monitor=None):
+    """1 request LLM cho 1 batch scenes; timestamps chia đều trong [start, end] của batch."""
+    previous, following = neighbours
+    lyrics = (outline.get("lyrics") or {}).get(batch["lyrics_section"], "")
+    prompt = SCENES_PROMPT.format(
+        age_range=age_range,
+        title=outline.get("title", topic),
+        topic=topic,
+        characters=", ".join(outline.get("characters") or []) or "nhân vật hoạt hình dễ thương",
+        section=batch["lyrics_section"],
+        start=format_time(batch["start"]),
+        end=format_time(batch["end"]),
+        seconds=batch["end"] - batch["start"],
+        lyrics=lyrics or "(nhạc không lời)",
+        summary=batch["summary"] or "tiếp tục câu chuyện",
+        previous=previous or "(mở đầu video)",
+        next=following or "(kết thúc video)",
+        count=batch["count"],
+    )
+    result = call_llm_tiered(prompt, config, on_value=monitor, required=("scenes",), kind="scenes")
+    scenes = [s for s in (result or {}).get("scenes") or [] if isinstance(s, dict)][:batch["count"]]
+    if not scenes:
+        raise RuntimeError(f"LLM không trả scenes cho đoạn {batch['lyrics_section']}")
+
+    seconds = batch["end"] - batch["start"]
+    for i, scene in enumerate(scenes):
+        start = batch["start"] + round(seconds * i / len(scenes))
+        end = batch["start"] + round(seconds * (i + 1) / len(scenes))
+        scene["timestamp"] = format_timestamp(start, end)
+        scene["lyrics_section"] = batch["lyrics_section"]
+    return scenes
+
+def generate_script_chunked(topic, age_range, duration, config):
+    """
+    Kịch bản video dài trong 2 pha:
+    1. Dàn ý nhỏ: title, lyrics, music direction, section plan
+    2. Scenes từng batch (theo đoạn lyrics) gọi song song → nối lại, timestamps liên tục
+    Thời gian ≈ dàn ý + batch chậm nhất, gần như không tăng theo độ dài video.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    total_seconds = duration * 60
+    monitor = ScriptStreamMonitor()
+    prompt = OUTLINE_PROMPT.format(age_range=age_range, duration=duration, topic=topic,
+                                   total_seconds=total_seconds)
+    with tracer.span("llm:outline"):
+        outline = call_llm_tiered(prompt, config, on_value=monitor, required=("lyrics",), kind="outline")
+    if outline is None:
+        return None
+
+    batches = plan_sections(outline, total_seconds, config["script_batch_scenes"])
+    workers = max(min(config.get("llm_concurrency", 4), len(batches)), 1)
+    summaries = [b["summary"] or b["lyrics_section"] for b in batches]
+    print(f"    🧩 Dàn ý: {len(batches)} batch, {sum(b['count'] for b in batches)} scenes "
+          f"→ sinh song song ({workers} request cùng lúc)")
+
+    with tracer.span("llm:scene-batches", batches=len(batches), workers=workers) as span:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def _job(i):
+                neighbours = (summaries[i - 1] if i else None,
+                              summaries[i + 1] if i + 1 < len(batches) else None)
+                with tracer.span("llm:scenes", parent=span.id, section=batches[i]["lyrics_section"],
+                                 scenes=batches[i]["count"]):
+                    return generate_scene_batch(batches[i], neighbours, outline, topic, age_range,
+                                                config, monitor)
+
+            futures = [pool.submit(_job, i) for i in range(len(batches))]
+            try:
+                parts = [f.result() for f in futures]
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+
+    script = dict(outline)
+    script["duration_minutes"] = duration
+    script["scenes"] = [scene for part in parts for scene in part]
+    for i, scene in enumerate(script["scenes"]):
+        scene["id"] = i + 1
+    return script
+
+def find_violations(script):
+    """
+    Vị trí các phần vi phạm an toàn.
+    Returns: [(("lyrics", section) | ("scenes", index), violations)]
+    """
+    found = []
+    for section, text in (script.get("lyrics") or {}).items():
+        is_safe, violations = check_content_safety(str(text))
+        if not is_safe:
+            found.append((("lyrics", section), violations))
+    for i, scene in enumerate(script.get("scenes") or []):
+        is_safe, violations = check_content_safety(str(scene.get("description", "")))
+        if not is_safe:
+            found.append((("scenes", i), violations))
+    return found
+
+def _repair_fragment(script, path, violations):
+    kind, key = path
+    if kind == "lyrics":
+        return f'- lyrics "{key}" (vi phạm: {", ".join(violations)}):\n{script["lyrics"][key]}'
+    scene = script["scenes"][key]
+    return (f'- scene id {scene.get("id", key + 1)} [{scene.get("timestamp", "")}, '
+            f'đoạn {scene.get("lyrics_section", "?")}] (vi phạm: {", ".join(violations)}):\n'
+            f"{json.dumps(scene, ensure_ascii=False)}")
+
+def merge_repair(script, found, repair):
+    """Ghép phần đã sửa vào kịch bản (scene giữ nguyên id / timestamp / lyrics_section)."""
+    lyrics = repair.get("lyrics") if isinstance(repair.get("lyrics"), dict) else {}
+    scenes = {s.get("id"): s for s in repair.get("scenes") or [] if isinstance(s, dict)}
+    merged = 0
+    for (kind, key), _ in found:
+        if kind == "lyrics" and isinstance(lyrics.get(key), str):
+            script["lyrics"][key] = lyrics[key]
+            merged += 1
+        elif kind == "scenes":
+            scene = script["scenes"][key]
+            new = scenes.get(scene.get("id", key + 1))
+            if new:
+                keep = {k: scene[k] for k in ("id", "timestamp", "lyrics_section") if k in scene}
+                scene.update(new, **keep)
+                merged += 1
+    return merged
+
+def repair_script(script, topic, age_range, config, max_rounds=SAFETY_REPAIR_ROUNDS):
+    """
+    Vòng sửa an toàn: tìm lyrics/scenes vi phạm → 1 prompt nhỏ viết lại đúng các phần đó
+    → ghép lại → kiểm tra lại. Returns: kịch bản an toàn, hoặc None sau max_rounds vòng.
+    """
+    banned = []
+    for round_num in range(1, max_rounds + 1):
+        found = find_violations(script)
+        if not found:
+            return script
+        for _, violations in found:
+            banned += [v for v in violations if v not in banned]
+        labels = [f"{kind}/{key}" for (kind, key), _ in found]
+        print_warning(f"Vi phạm ở {len(found)} phần ({', '.join(labels)}) → sửa riêng (vòng {round_num}/{max_rounds})")
+
+        prompt = REPAIR_PROMPT.format(
+            age_range=age_range,
+            title=script.get("title", topic),
+            topic=topic,
+            banned=", ".join(banned),
+            fragments="\n\n".join(_repair_fragment(script, path, v) for path, v in found),
+        )
+        with tracer.span("llm:safety-repair", round=round_num, fragments=labels, violations=banned) as span:
+            span.retry()
+            try:
+                repair = call_llm_tiered(prompt, config, on_value=ScriptStreamMonitor(abort=True), required=(),
+                                         kind="repair")
+            except UnsafeContent as e:
+                print_warning(f"Phần sửa vẫn vi phạm ({e}) → thử lại")
+                continue
+            merged = merge_repair(script, found, repair or {})
+            span.set(merged=merged)
+
+    found = find_violations(script)
+    if found:
+        print_error(f"Vẫn vi phạm sau {max_rounds} vòng sửa: {sorted({v for _, vs in found for v in vs})}")
+        return None
+    return script
+
+def script_prompt(topic, age_range, duration):
+    """Prompt 1 request cho cả kịch bản."""
+    total_seconds = duration * 60
+    return SCRIPT_PROMPT.format(
+        age_range=age_range,
+        duration=duration,
+        topic=topic,
+        total_seconds=total_seconds,
+        num_scenes=total_seconds // MAX_SCENE_SECONDS,  # ~22-23 scenes for 3 min
+    )
+
+def finalize_script(script, topic, age_range, duration, config):
+    """Validate schema/timing + sửa phần vi phạm an toàn. Returns: kịch bản hoặc None."""
+    # Sửa schema / timing tại chỗ trước khi tốn thêm request LLM / giây Veo nào
+    script, fixes = validate_script(script, duration * 60, topic)
+    if fixes:
+        print_warning(f"Tự sửa kịch bản ({len(fixes)}): " + "; ".join(fixes[:6]) + (" ..." if len(fixes) > 6 else ""))
+    if not script["scenes"]:
+        print_error("Kịch bản không có scene nào")
+        return None
+    
+    # Safety check: chỉ sửa lại phần vi phạm, kiểm tra lại tới khi sạch
+    print_step(2, 3, "Kiểm tra an toàn nội dung...")
+    script = repair_script(script, topic, age_range, config)
+    if script is None:
+        return None
+    
+    print_step(3, 3, "Hoàn thiện kịch bản...")
+    print_success("Kịch bản đã tạo thành công!")
+    return script
+
 def create_script(topic, age_range="2-5", duration=3, style="cocomelon", dry_run=False, config=None):
     """Tạo kịch bản video."""
     print_header("Agent 2: Content Creator", "✍️")
@@ -316,45 +835,185 @@ def create_script(topic, age_range="2-5", duration=3, style="cocomelon", dry_run
     if config is None:
         config = get_config()
     
-    # Build prompt
-    total_seconds = duration * 60
-    num_scenes = total_seconds // 8  # ~22-23 scenes for 3 min
-    
-    prompt = SCRIPT_PROMPT.format(
-        age_range=age_range,
-        duration=duration,
-        topic=topic,
-        total_seconds=total_seconds,
-        num_scenes=num_scenes,
-    )
-    
-    print_step(1, 3, "Gọi LLM tạo kịch bản...")
-    script = call_llm(prompt, config)
+    num_scenes = duration * 60 // MAX_SCENE_SECONDS
+    batch_scenes = config.get("script_batch_scenes", 0)
+    chunked = bool(batch_scenes) and num_scenes > batch_scenes
     
+    print_step(1, 3, "Gọi LLM tạo kịch bản" + (" (dàn ý + scenes song song)..." if chunked else "..."))
+    if chunked:
+        script = generate_script_chunked(topic, age_range, duration, config)
+    else:
+        script = call_llm_tiered(script_prompt(topic, age_range, duration), config,
+                                 on_value=ScriptStreamMonitor())
     if script is None:
         print_error("Không thể tạo kịch bản từ LLM")
         return None
     
-    # Safety check
-    print_step(2, 3, "Kiểm tra an toàn nội dung...")
-    lyrics_text = " ".join(script.get("lyrics", {}).values())
-    scenes_text = " ".join(s.get("description", "") for s in script.get("scenes", []))
-    full_text = f"{lyrics_text} {scenes_text}"
-    
-    is_safe, violations = check_content_safety(full_text)
-    if not is_safe:
-        print_error(f"Nội dung KHÔNG AN TOÀN! Vi phạm: {violations}")
-        print_warning("Đang yêu cầu LLM viết lại...")
-        # Retry with stronger safety prompt
-        prompt += "\n\n⚠️ LƯU Ý: Nội dung PHẢI tuyệt đối an toàn. KHÔNG ĐƯỢC chứa: " + ", ".join(violations)
-        script = call_llm(prompt, config)
-        if script is None:
-            return None
+    return finalize_script(script, topic, age_range, duration, config)
+
+# ── Batch: nhiều chủ đề 1 lần ──
+
+class BatchJobError(Exception):
+    """Batch job của provider lỗi / hết hạn / bị hủy."""
+
+def openai_batch(prompts, config, route):
+    """
+    OpenAI Batch API: {custom_id: prompt} → 1 file JSONL → 1 batch job → poll tới khi xong.
+    Returns: {custom_id: text} — request lỗi trong batch không có mặt trong dict.
+    """
+    import requests
     
-    print_step(3, 3, "Hoàn thiện kịch bản...")
-    print_success("Kịch bản đã tạo thành công!")
+    base_url = config.get("openai_api_url", "https://api.openai.com/v1").rstrip("/")
+    headers = {"Authorization": f"Bearer {route['api_key']}"}
+    lines = [json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": route["model"],
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.8,
+            "response_format": {"type": "json_object"},
+        },
+    }, ensure_ascii=False) for custom_id, prompt in prompts.items()]
+    body = "\n".join(lines).encode("utf-8")
     
-    return script
+    with tracer.span("http:llm-batch", provider="openai", model=route["model"], requests=len(prompts)) as span:
+        response = requests.post(f"{base_url}/files", headers=headers, data={"purpose": "batch"},
+                                 files={"file": ("scripts.jsonl", body, "application/jsonl")}, timeout=300)
+        trace_response(span, response, bytes_out=len(body))
+        response.raise_for_status()
+        response = requests.post(f"{base_url}/batches", headers=headers, timeout=60, json={
+            "input_file_id": response.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+        })
+        response.raise_for_status()
+        batch = response.json()
+        span.set(batch_id=batch["id"])
+        
+        interval = config.get("llm_batch_poll_interval", 30)
+        while batch.get("status") not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(interval)
+            response = requests.get(f"{base_url}/batches/{batch['id']}", headers=headers, timeout=60)
+            response.raise_for_status()
+            batch = response.json()
+        span.set(status=batch["status"])
+        if batch["status"] != "completed" or not batch.get("output_file_id"):
+            raise BatchJobError(f"batch {batch['id']}: {batch['status']}")
+        
+        response = requests.get(f"{base_url}/files/{batch['output_file_id']}/content",
+                                headers=headers, timeout=300)
+        response.raise_for_status()
+        span.add_bytes(bytes_in=len(response.content))
+    
+    texts = {}
+    for line in response.text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        result = item.get("response") or {}
+        if item.get("error") or result.get("status_code") != 200:
+            continue
+        texts[item["custom_id"]] = result["body"]["choices"][0]["message"]["content"]
+    return texts
+
+def draft_scripts_batch(topics, age_range, duration, config):
+    """
+    Kịch bản nháp cho nhiều chủ đề qua batch endpoint của provider (route chính).
+    Returns: {index: script} — chủ đề thiếu (lỗi / JSON hỏng / thiếu field) sẽ được
+    gọi lại từng cái; cả batch hỏng → {} (mọi chủ đề gọi từng cái).
+    """
+    route = config["llm_routes"][0]
+    if route["provider"] != "openai":
+        print_warning(f"{route['provider']} chưa hỗ trợ batch endpoint → gọi song song từng chủ đề")
+        return {}
+    prompts = {f"topic-{i}": script_prompt(topic, age_range, duration) for i, topic in enumerate(topics)}
+    try:
+        texts = openai_batch(prompts, config, route)
+    except Exception as e:
+        print_warning(f"Batch job lỗi ({e}) → gọi song song từng chủ đề")
+        return {}
+    
+    drafts = {}
+    for custom_id, text in texts.items():
+        script = parse_llm_text(text, config, "openai")
+        if draft_problem(script, ("lyrics", "scenes")) in (None, "safety"):  # an toàn: finalize sửa
+            drafts[int(custom_id.split("-")[1])] = script
+    return drafts
+
+def create_scripts_batch(topics, age_range="2-5", duration=3, style="cocomelon", dry_run=False,
+                         config=None, batch_api=False, workers=None):
+    """
+    Tạo kịch bản cho nhiều chủ đề, mỗi chủ đề 1 file riêng (OUTPUT_DIR/scripts/).
+    batch_api: nộp 1 batch job cho provider (OpenAI Batch API) thay vì N request
+    workers: số chủ đề xử lý song song (mặc định LLM_CONCURRENCY)
+    Lỗi của 1 chủ đề không ảnh hưởng chủ đề khác.
+    Returns: summary {ok, failed, seconds, throughput_per_min, results: [...]}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    if config is None:
+        config = get_config()
+    workers = max(workers or config.get("llm_concurrency", 4), 1)
+    num_scenes = duration * 60 // MAX_SCENE_SECONDS
+    batch_scenes = config.get("script_batch_scenes", 0)
+    chunked = bool(batch_scenes) and num_scenes > batch_scenes
+    scripts_dir = ensure_output_dirs() / "scripts"
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    start = time.perf_counter()
+    
+    with tracer.span("llm:batch-scripts", topics=len(topics), workers=workers) as span:
+        drafts = {}
+        if batch_api and not dry_run:
+            if chunked:
+                print_warning("Kịch bản dài chia batch scenes → không dùng batch endpoint")
+            else:
+                drafts = draft_scripts_batch(topics, age_range, duration, config)
+                span.set(provider_batch=len(drafts))
+        
+        def run(index):
+            topic = topics[index]
+            started = time.perf_counter()
+            with tracer.span("script:topic", parent=span.id, topic=topic) as topic_span:
+                try:
+                    if index in drafts:
+                        script = finalize_script(drafts[index], topic, age_range, duration, config)
+                    else:
+                        script = create_script(topic, age_range, duration, style, dry_run, config)
+                    if script is None:
+                        raise RuntimeError("không tạo được kịch bản")
+                    path = scripts_dir / f"script-{stamp}-{index + 1:02d}-{safe_filename(topic, 40)}.json"
+                    save_json(script, path)
+                    result = {"topic": topic, "status": "ok", "file": str(path),
+                              "scenes": len(script.get("scenes", [])), "batch_api": index in drafts}
+                except Exception as e:
+                    topic_span.fail(e)
+                    logger.error(f"Chủ đề '{topic}' lỗi: {e}")
+                    result = {"topic": topic, "status": "failed", "error": str(e)}
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            return result
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, range(len(topics))))
+        
+        total = time.perf_counter() - start
+        ok = sum(r["status"] == "ok" for r in results)
+        span.set(ok=ok, failed=len(results) - ok)
+    
+    summary = {
+        "timestamp": datetime.now().isoformat(),
+        "topics": len(topics),
+        "ok": ok,
+        "failed": len(results) - ok,
+        "workers": workers,
+        "batch_api": batch_api,
+        "seconds": round(total, 3),
+        "throughput_per_min": round(ok / total * 60, 2) if total else 0,
+        "results": results,
+    }
+    summary["manifest"] = str(save_json(summary, scripts_dir / f"batch-{stamp}.json"))
+    return summary
 
 def generate_veo_prompts(script):
     """Tạo prompts cho Google Veo từ kịch bản (để Agent 2 review trước)."""
@@ -381,6 +1040,32 @@ def generate_veo_prompts(script):
     
     return veo_prompts
 
+def run_batch(topics, args):
+    """CLI batch: tạo kịch bản cho nhiều chủ đề, in + gửi tóm tắt."""
+    print_header(f"Agent 2: Content Creator — Batch {len(topics)} chủ đề", "✍️")
+    summary = create_scripts_batch(topics, args.age_range, args.duration, args.style, args.dry_run,
+                                   batch_api=args.batch_api, workers=args.batch_workers)
+    
+    if args.json:
+        emit_json(summary)
+    else:
+        print(f"\n{'━' * 50}")
+        for r in summary["results"]:
+            detail = r["file"] if r["status"] == "ok" else r["error"]
+            print(f"  {'✅' if r['status'] == 'ok' else '❌'} {r['topic'][:40]:<40} {r['seconds']:>7.1f}s  {detail}")
+        print(f"\n⏱️  {summary['ok']}/{summary['topics']} kịch bản trong {summary['seconds']:.1f}s "
+              f"→ {summary['throughput_per_min']}/phút")
+        print(f"📁 Manifest: {summary['manifest']}")
+        print(f"{'━' * 50}\n")
+    
+    if not args.no_telegram:
+        msg_lines = ["✍️ *Agent 2: Content Creator — Batch*", "",
+                     f"✅ {summary['ok']}/{summary['topics']} kịch bản ({summary['seconds']:.0f}s)"]
+        msg_lines += [f"  ❌ {r['topic']}: {r['error'][:80]}" for r in summary["results"] if r["status"] != "ok"]
+        send_telegram("\n".join(msg_lines))
+    if not summary["ok"]:
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(
         description="✍️ Agent 2: Content Creator — Tạo kịch bản YouTube Kids"
@@ -403,7 +1088,25 @@ def main():
     parser.add_argument("--output", help="Đường dẫn output")
     parser.add_argument("--json", action="store_true",
                        help="In JSON ra stdout")
+    parser.add_argument("--profile", nargs="?", const="auto", metavar="PATH",
+                       help="Chạy dưới cProfile, lưu .prof (mặc định: OUTPUT_DIR/profiles/)")
+    parser.add_argument("--topics", help="Batch: nhiều chủ đề, phân cách bằng dấu phẩy")
+    parser.add_argument("--topics-file", help="Batch: file chủ đề (mỗi dòng 1 chủ đề)")
+    parser.add_argument("--batch-api", action="store_true",
+                       help="Batch: nộp 1 batch job cho provider (OpenAI Batch API, chậm nhưng rẻ)")
+    parser.add_argument("--batch-workers", type=int,
+                       help="Batch: số chủ đề xử lý song song (mặc định: LLM_CONCURRENCY)")
     args = parser.parse_args()
+    if args.json:
+        json_mode()
+    
+    topics = [t.strip() for t in (args.topics or "").split(",") if t.strip()]
+    if args.topics_file:
+        topics += [line.strip() for line in Path(args.topics_file).read_text(encoding="utf-8").splitlines()
+                   if line.strip() and not line.startswith("#")]
+    if topics:
+        run_batch(topics, args)
+        return
     
     # Determine topic
     topic = args.topic
@@ -454,17 +1157,17 @@ def main():
             print(f"  {vp['prompt'][:200]}...")
         print()
     
+    # Save (cả khi --json: Agent 3/4 đọc kịch bản từ file)
+    output_dir = ensure_output_dirs()
+    output_path = args.output or str(
+        output_dir / "scripts" / f"script-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    save_json(script, output_path)
+    
     # Output
     if args.json:
-        print(json.dumps(script, ensure_ascii=False, indent=2))
+        emit_json({**script, "output_file": output_path})
     else:
-        # Save
-        output_dir = ensure_output_dirs()
-        output_path = args.output or str(
-            output_dir / "scripts" / f"script-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
-        )
-        save_json(script, output_path)
-        
         # Summary
         print(f"\n{'━' * 50}")
         print(f"✅ Kịch bản đã tạo!")
@@ -520,4 +1223,4 @@ def main():
     print_success("Đã gửi kịch bản qua Telegram")
 
 if __name__ == "__main__":
-    main()
+    run_profiled(main, "content_creator")
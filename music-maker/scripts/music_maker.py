@@ -15,8 +15,6 @@ Usage:
 import argparse
 import json
 import os
-import re
-import subprocess
 import sys
 import time
 from datetime import datetime
@@ -27,10 +25,14 @@ sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
 from utils import (
     setup_logging, get_config, ensure_output_dirs, save_json, load_json,
     print_header, print_step, print_success, print_warning, print_error,
-    safe_filename, get_output_dir, send_telegram
+    safe_filename, get_output_dir, send_telegram, json_mode, emit_json
 )
+from tracing import get_tracer, trace_response
+from ffmpeg_runner import probe_duration
+from profiling import run_profiled
 
 logger = setup_logging("MusicMaker")
+tracer = get_tracer("music_maker")
 
 # ── Minimal sample (avoid broken cross-skill import) ──
 MINI_SAMPLE_SCRIPT = {
@@ -110,6 +112,7 @@ def call_suno_api(suno_prompt, config):
     api_key = config["suno_api_key"]
     api_url = config["suno_api_url"].rstrip("/")
     timeout = config["suno_timeout"]
+    poll_interval = config.get("suno_poll_interval", 10)
     
     if not api_key:
         print_error("SUNO_API_KEY chưa được cấu hình!")
@@ -142,7 +145,9 @@ def call_suno_api(suno_prompt, config):
         print_step(2, 4, f"Gửi request tới GoAPI.ai Suno ({generate_url})...")
         
         try:
-            response = requests.post(generate_url, json=payload, headers=headers, timeout=30)
+            with tracer.span("http:suno-submit", api="goapi") as span:
+                response = requests.post(generate_url, json=payload, headers=headers, timeout=30)
+                trace_response(span, response)
             logger.info(f"GoAPI response status: {response.status_code}")
             if response.status_code != 200:
                 print_error(f"GoAPI error {response.status_code}: {response.text[:500]}")
@@ -164,13 +169,18 @@ def call_suno_api(suno_prompt, config):
         poll_url = f"{api_url}/api/suno/v1/music/{task_id}"
         
         while time.time() - start_time < timeout:
-            time.sleep(10)
-            try:
-                status_resp = requests.get(poll_url, headers=headers, timeout=15)
-                status_data = status_resp.json()
-            except Exception as e:
-                logger.warning(f"Poll error: {e}")
-                continue
+            time.sleep(poll_interval)
+            with tracer.span("http:suno-poll", task_id=task_id) as span:
+                try:
+                    status_resp = requests.get(poll_url, headers=headers, timeout=15)
+                    trace_response(span, status_resp)
+                    status_data = status_resp.json()
+                except Exception as e:
+                    # Ghi lỗi + retry khi span còn mở (span đã finish thì retry không vào trace)
+                    logger.warning(f"Poll error: {e}")
+                    span.fail(e)
+                    span.retry()
+                    continue
             
             status = status_data.get("data", {}).get("status", "")
             
@@ -212,7 +222,9 @@ def call_suno_api(suno_prompt, config):
         print_step(2, 4, f"Gửi request tới Suno API ({generate_url})...")
         
         try:
-            response = requests.post(generate_url, json=payload, headers=headers, timeout=30)
+            with tracer.span("http:suno-submit", api="official") as span:
+                response = requests.post(generate_url, json=payload, headers=headers, timeout=30)
+                trace_response(span, response)
             logger.info(f"Suno response status: {response.status_code}")
             if response.status_code != 200:
                 print_error(f"Suno error {response.status_code}: {response.text[:500]}")
@@ -239,12 +251,15 @@ def download_audio(audio_url, output_path):
     """Download file audio từ URL."""
     try:
         import requests
-        response = requests.get(audio_url, timeout=60, stream=True)
-        response.raise_for_status()
+        with tracer.span("http:audio-download") as span:
+            response = requests.get(audio_url, timeout=60, stream=True)
+            span.set(status_code=response.status_code)
+            response.raise_for_status()
 
-        with open(output_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+            with open(output_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+                    span.add_bytes(bytes_in=len(chunk))
 
         return True
     except Exception as e:
@@ -254,12 +269,7 @@ def download_audio(audio_url, output_path):
 def get_audio_duration(audio_path, ffmpeg_path="ffmpeg"):
     """Đo duration thật sự của file audio bằng FFmpeg."""
     try:
-        cmd = [ffmpeg_path, "-i", str(audio_path), "-hide_banner", "-f", "null", "-"]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        match = re.search(r"Duration: (\d{2}):(\d{2}):(\d{2})\.(\d{2})", result.stderr)
-        if match:
-            h, m, s, cs = int(match.group(1)), int(match.group(2)), int(match.group(3)), int(match.group(4))
-            return h * 3600 + m * 60 + s + cs / 100.0
+        return probe_duration(audio_path, ffmpeg_path)
     except Exception as e:
         logger.warning(f"Cannot measure audio duration: {e}")
     return None
@@ -353,7 +363,11 @@ def main():
     parser.add_argument("--output", help="Đường dẫn output MP3")
     parser.add_argument("--json", action="store_true",
                        help="In JSON ra stdout")
+    parser.add_argument("--profile", nargs="?", const="auto", metavar="PATH",
+                       help="Chạy dưới cProfile, lưu .prof (mặc định: OUTPUT_DIR/profiles/)")
     args = parser.parse_args()
+    if args.json:
+        json_mode()
     
     # Load script
     if args.script:
@@ -419,9 +433,10 @@ def main():
             "status": result.get("status", "completed"),
             "audio_file": result.get("audio_file"),
             "title": result.get("title"),
+            "actual_duration": result.get("actual_duration"),
             "suno_prompt": result.get("suno_prompt"),
         }
-        print(json.dumps(output, ensure_ascii=False, indent=2))
+        emit_json(output)
     else:
         print(f"\n{'━' * 50}")
         if result.get("audio_file"):
@@ -457,5 +472,5 @@ def main():
     print_success("Đã gửi kết quả qua Telegram")
 
 if __name__ == "__main__":
-    main()
+    run_profiled(main, "music_maker")
 
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+⏱️ MyShort — Benchmark Agent 5 (Video Aggregator)
+Đo wall time / CPU / peak RSS / output size của từng stage FFmpeg với input
+tổng hợp (lavfi testsrc + sine) — chạy offline, chỉ cần ffmpeg.
+
+Input sinh ra (deterministic):
+- Clips testsrc khác resolution/fps (720p@24, 1080p@30, 360p@25, ...)
+- Audio sine với 3 độ dài → chạm đủ 3 strategy của overlay_audio:
+  shortest (lệch ≤ 2s), pad_video (audio dài hơn), fade_audio (audio ngắn hơn)
+
+Usage:
+    python3 bench_aggregator.py                    # Chạy + so sánh với lần trước
+    python3 bench_aggregator.py --clips 12         # Video dài hơn
+    python3 bench_aggregator.py --stages concat    # Chỉ 1 stage (+ stage nó cần)
+    python3 bench_aggregator.py --repeat 3         # Lấy median 3 lần
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+MYSHORT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
+sys.path.insert(0, str(MYSHORT_ROOT / "video-aggregator" / "scripts"))
+
+from utils import (
+    setup_logging, get_output_dir, save_json, load_json,
+    print_header, print_success, print_error
+)
+
+logger = setup_logging("BenchAggregator")
+
+# Clip variants: (resolution, fps) — xoay vòng theo index
+CLIP_VARIANTS = [
+    ("1280x720", 24),
+    ("1920x1080", 30),
+    ("640x360", 25),
+    ("1080x1920", 30),   # clip dọc → test pad
+]
+CLIP_SECONDS = 8
+STAGE_TIMEOUT = 3600      # giây — stage treo quá mức này bị kill
+POLL_SECONDS = 1.0
+
+STAGES = ["segments", "concat", "overlay_shortest", "overlay_pad_video",
+          "overlay_fade_audio", "end_to_end"]
+STAGE_DEPS = {
+    "concat": "segments",
+    "overlay_shortest": "concat",
+    "overlay_pad_video": "concat",
+    "overlay_fade_audio": "concat",
+}
+
+# ── Synthetic inputs ──
+
+def _lavfi(ffmpeg, source, output, extra):
+    cmd = [ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+           "-f", "lavfi", "-i", source, *extra, str(output)]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=300)
+
+def generate_inputs(work_dir, num_clips, ffmpeg="ffmpeg"):
+    """Sinh clips testsrc + 3 file audio sine. Cache theo (num_clips) trong work_dir."""
+    clips_dir = Path(work_dir) / "clips"
+    audio_dir = Path(work_dir) / "audio"
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    audio_dir.mkdir(parents=True, exist_ok=True)
+
+    for i in range(num_clips):
+        size, fps = CLIP_VARIANTS[i % len(CLIP_VARIANTS)]
+        out = clips_dir / f"clip-{i + 1:03d}.mp4"
+        if not out.exists():
+            _lavfi(ffmpeg, f"testsrc=size={size}:rate={fps}:duration={CLIP_SECONDS}", out,
+                   ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"])
+
+    video_seconds = num_clips * CLIP_SECONDS
+    audio = {
+        "shortest": video_seconds + 1,        # |diff| ≤ 2 → -shortest
+        "pad_video": video_seconds + 12,      # audio dài hơn → tpad
+        "fade_audio": max(video_seconds - 10, 3),  # audio ngắn hơn → afade
+    }
+    audio_files = {}
+    for strategy, seconds in audio.items():
+        out = audio_dir / f"sine-{strategy}-{seconds}s.mp3"
+        if not out.exists():
+            _lavfi(ffmpeg, f"sine=frequency=440:sample_rate=44100:duration={seconds}", out,
+                   ["-c:a", "libmp3lame", "-b:a", "128k"])
+        audio_files[strategy] = str(out)
+
+    return clips_dir, audio_files
+
+# ── Stage runners (chạy trong process con riêng để đo rusage của ffmpeg) ──
+
+def _stage(name, ctx):
+    """Chạy 1 stage. Returns: list output files."""
+    import video_aggregator as va
+
+    ffmpeg = ctx["ffmpeg"]
+    out_dir = Path(ctx["out_dir"])
+    profile = va.get_render_profile(ctx["profile"])
+
+    if name == "segments":
+        # Encode song song từng clip → segment (fade đầu/cuối). Cache riêng mỗi lần lặp
+        # → --repeat đo encode thật, không phải cache hit; lần cuối giữ lại cho concat
+        clips = va.find_clips(ctx["clips_dir"])
+        cache_dir = tempfile.mkdtemp(prefix="segment-cache-", dir=out_dir)
+        ctx["scratch"].append(cache_dir)
+        segments = va.encode_segments(clips, cache_dir, ffmpeg, profile)
+        if not segments:
+            raise RuntimeError("segments failed")
+        keep = out_dir / "segments"
+        shutil.rmtree(keep, ignore_errors=True)
+        os.replace(cache_dir, keep)
+        names = [Path(s).name for s in segments]
+        save_json(names, str(out_dir / "segments.json"))
+        return [str(keep / n) for n in names]
+
+    if name == "concat":
+        # Nối segments bằng stream copy
+        segments = [out_dir / "segments" / n for n in load_json(out_dir / "segments.json")]
+        output = out_dir / "merged.mp4"
+        if not va.concat_segments(segments, output, ffmpeg):
+            raise RuntimeError("concat failed")
+        return [str(output)]
+
+    if name.startswith("overlay_"):
+        # OUTPUT_DIR mới mỗi lần lặp: audio-cache (final/audio-cache) của lần trước không được dùng lại
+        strategy = name[len("overlay_"):]
+        os.environ["OUTPUT_DIR"] = tempfile.mkdtemp(prefix=f"overlay-{strategy}-", dir=out_dir)
+        ctx["scratch"].append(os.environ["OUTPUT_DIR"])
+        output = out_dir / f"with-audio-{strategy}.mp4"
+        if not va.overlay_audio(str(out_dir / "merged.mp4"), ctx["audio"][strategy], str(output), ffmpeg,
+                                preset=profile["normalize_preset"], crf=profile["crf"]):
+            raise RuntimeError(f"overlay {strategy} failed")
+        return [str(output)]
+
+    if name == "end_to_end":
+        # OUTPUT_DIR mới mỗi lần lặp: segment-cache / audio-cache của lần trước không được dùng lại
+        os.environ["OUTPUT_DIR"] = tempfile.mkdtemp(prefix="end-to-end-", dir=out_dir)
+        ctx["scratch"].append(os.environ["OUTPUT_DIR"])
+        result = va.aggregate_video(ctx["clips_dir"], audio_path=ctx["audio"]["shortest"],
+                                    config={"ffmpeg_path": ffmpeg}, render_profile=ctx["profile"])
+        if not result or result.get("status") != "completed":
+            raise RuntimeError("aggregate_video failed")
+        return [result["final_video"]]
+
+    raise ValueError(f"Unknown stage: {name}")
+
+def _stage_worker(name, ctx, queue):
+    # Output của agent (print) không lẫn vào báo cáo benchmark
+    sys.stdout = open(os.devnull, "w")
+    os.environ["OUTPUT_DIR"] = ctx["out_dir"]
+    ctx["scratch"] = []
+    try:
+        files = _stage(name, ctx)
+        error = None
+    except Exception as e:
+        files, error = [], str(e)
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    queue.put({
+        "files": files,
+        "scratch": ctx["scratch"],
+        "error": error,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,  # Linux: KB
+    })
+
+def run_stage(name, ctx):
+    """Chạy stage trong process con → rusage chỉ tính ffmpeg của stage này."""
+    mp = multiprocessing.get_context("fork")
+    queue = mp.Queue()
+    start = time.perf_counter()
+    proc = mp.Process(target=_stage_worker, args=(name, ctx, queue))
+    proc.start()
+    stats = None
+    while stats is None:
+        try:
+            stats = queue.get(timeout=POLL_SECONDS)
+        except queue_module.Empty:
+            error = None
+            if not proc.is_alive():
+                # Con chết trước khi gửi kết quả (OOM kill, segfault...) — đọc nốt rồi báo lỗi
+                try:
+                    stats = queue.get(timeout=POLL_SECONDS)
+                    break
+                except queue_module.Empty:
+                    error = f"process con thoát (exitcode {proc.exitcode}) không trả kết quả"
+            elif time.perf_counter() - start > STAGE_TIMEOUT:
+                proc.kill()
+                error = f"timeout sau {STAGE_TIMEOUT}s"
+            if error:
+                stats = {"files": [], "scratch": [], "error": error, "cpu_seconds": 0.0, "peak_rss_mb": 0.0}
+    proc.join()
+    stats["wall_seconds"] = time.perf_counter() - start
+    stats["output_bytes"] = sum(Path(f).stat().st_size for f in stats.pop("files") if Path(f).exists())
+    for scratch in stats.pop("scratch"):
+        shutil.rmtree(scratch, ignore_errors=True)
+    return stats
+
+# ── History ──
+
+def get_history_file():
+    return get_output_dir() / "bench" / "aggregator-history.json"
+
+def get_environment(ffmpeg):
+    try:
+        version = subprocess.run([ffmpeg, "-version"], capture_output=True, text=True,
+                                 timeout=5).stdout.split("\n")[0]
+    except Exception:
+        version = "unknown"
+    try:
+        commit = subprocess.run(["git", "-C", str(MYSHORT_ROOT), "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "ffmpeg": version,
+        "commit": commit,
+    }
+
+def compare(current, previous):
+    """In bảng so sánh wall/CPU với run trước cùng cấu hình."""
+    print(f"\n  {'Stage':<20} {'Wall (s)':>10} {'Δ wall':>9} {'CPU (s)':>9} {'Δ CPU':>9} {'RSS MB':>8} {'Out MB':>8}")
+    print(f"  {'─' * 77}")
+    for stage, stats in current["stages"].items():
+        prev = (previous or {}).get("stages", {}).get(stage)
+
+        def delta(key):
+            if not prev or not prev.get(key):
+                return "—"
+            return f"{(stats[key] - prev[key]) / prev[key] * 100:+.0f}%"
+
+        if stats.get("error"):
+            print(f"  {stage:<20} ❌ {stats['error']}")
+            continue
+        print(f"  {stage:<20} {stats['wall_seconds']:>10.2f} {delta('wall_seconds'):>9} "
+              f"{stats['cpu_seconds']:>9.2f} {delta('cpu_seconds'):>9} "
+              f"{stats['peak_rss_mb']:>8.0f} {stats['output_bytes'] / (1024 * 1024):>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="⏱️ Benchmark Agent 5 — FFmpeg stages với input tổng hợp"
+    )
+    parser.add_argument("--clips", type=int, default=6, help="Số clips testsrc (mặc định: 6)")
+    parser.add_argument("--profile", default="standard", help="Render profile (draft/standard/final)")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                       help=f"Stages cần đo (mặc định: tất cả) — {', '.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy mỗi stage (lấy median)")
+    parser.add_argument("--work-dir", help="Thư mục input/output (mặc định: thư mục tạm)")
+    parser.add_argument("--label", default="", help="Nhãn ghi vào history")
+    parser.add_argument("--no-save", action="store_true", help="Không ghi history")
+    parser.add_argument("--json", action="store_true", help="In JSON ra stdout")
+    args = parser.parse_args()
+
+    ffmpeg = os.environ.get("FFMPEG_PATH", "ffmpeg")
+    if not shutil.which(ffmpeg):
+        print_error(f"FFmpeg không tìm thấy: {ffmpeg}")
+        sys.exit(1)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Stage không hợp lệ: {', '.join(sorted(unknown))}")
+    # Stage sau cần output của stage trước
+    selected = set(stages)
+    for stage in stages:
+        while stage in STAGE_DEPS:
+            stage = STAGE_DEPS[stage]
+            selected.add(stage)
+    stages = [s for s in STAGES if s in selected]
+
+    print_header("Benchmark: Video Aggregator", "⏱️")
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="myshort-bench-"))
+    print(f"  📂 Work dir: {work_dir}")
+    print(f"  📹 Clips: {args.clips} × {CLIP_SECONDS}s | Profile: {args.profile} | Repeat: {args.repeat}")
+
+    clips_dir, audio_files = generate_inputs(work_dir / "inputs", args.clips, ffmpeg)
+    print_success("Input tổng hợp sẵn sàng")
+
+    ctx = {
+        "ffmpeg": ffmpeg,
+        "clips_dir": str(clips_dir),
+        "audio": audio_files,
+        "out_dir": str(work_dir / "out"),
+        "profile": args.profile,
+    }
+    Path(ctx["out_dir"]).mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for stage in stages:
+        runs = []
+        for _ in range(args.repeat):
+            runs.append(run_stage(stage, ctx))
+            if runs[-1]["error"]:
+                break
+        runs.sort(key=lambda r: r["wall_seconds"])
+        results[stage] = runs[len(runs) // 2]
+        status = f"❌ {results[stage]['error']}" if results[stage]["error"] else f"{results[stage]['wall_seconds']:.2f}s"
+        print(f"  ⏱️  {stage:<20} {status}")
+
+    run = {
+        "timestamp": datetime.now().isoformat(),
+        "label": args.label,
+        "config": {"clips": args.clips, "clip_seconds": CLIP_SECONDS,
+                   "profile": args.profile, "repeat": args.repeat},
+        "environment": get_environment(ffmpeg),
+        "stages": results,
+    }
+
+    history_file = get_history_file()
+    history = load_json(history_file) if history_file.exists() else []
+    previous = next((h for h in reversed(history) if h.get("config") == run["config"]), None)
+    compare(run, previous)
+
+    if not args.no_save:
+        history.append(run)
+        save_json(history, history_file)
+        print(f"\n  📁 History: {history_file}")
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(run, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
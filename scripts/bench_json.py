@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+⏱️ MyShort — Benchmark trích xuất JSON từ response LLM
+So sánh extractor cũ (regex `\\{.*\\}` DOTALL + xóa dấu phẩy thừa bằng regex)
+với extract_json (1 lần quét, cân bằng ngoặc) và JsonStreamParser (feed từng chunk).
+
+Input:
+- Response thật đã ghi lại (LLM_RECORD_DIR=... khi chạy content_creator) → --responses DIR
+- Mặc định: kịch bản tổng hợp (fake_script của mock_providers) phóng to bằng --scenes,
+  mỗi kịch bản sinh các biến thể LLM hay trả về:
+  plain, fenced (```json), prose (text có {} trước/sau), trailing_commas, truncated
+
+Usage:
+    python3 bench_json.py                          # Kịch bản tổng hợp
+    python3 bench_json.py --scenes 2000            # Response lớn hơn (~1MB)
+    python3 bench_json.py --responses ~/llm-rec    # Response đã ghi lại
+    python3 bench_json.py --repeat 9 --json
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+MYSHORT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils import print_header, print_error
+from json_stream import JsonStreamParser, extract_json
+from mock_providers import fake_script
+
+STREAM_CHUNK = 64  # ~ kích thước 1 delta SSE
+
+# ── Extractors ──
+
+def legacy_extract(text):
+    """Bản regex trước đây của content_creator.extract_json_from_text."""
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = re.sub(r'^```(?:json)?\s*\n?', '', cleaned)
+        cleaned = re.sub(r'\n?```\s*$', '', cleaned)
+    cleaned = re.sub(r',\s*([}\]])', r'\1', cleaned)
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+    match = re.search(r'\{.*\}', cleaned, re.DOTALL)
+    if match:
+        try:
+            return json.loads(re.sub(r',\s*([}\]])', r'\1', match.group(0)))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+def stream_extract(text):
+    parser = JsonStreamParser()
+    for i in range(0, len(text), STREAM_CHUNK):
+        parser.feed(text[i:i + STREAM_CHUNK])
+    return parser.close()
+
+EXTRACTORS = {
+    "regex": legacy_extract,
+    "extract_json": extract_json,
+    "stream": stream_extract,
+}
+
+# ── Inputs ──
+
+def synthetic_responses(num_scenes):
+    """Biến thể response từ 1 kịch bản num_scenes scenes. Returns: [(name, text, expected)]."""
+    script = fake_script(f"= {num_scenes * 8} giây, CHÍNH XÁC {num_scenes} scenes, "
+                         f'chủ đề: "Bé {{vui}} học đếm \\"1, 2, 3\\""')
+    plain = json.dumps(script, ensure_ascii=False, indent=2)
+    trailing = re.sub(r'(\n\s*)([}\]])', r',\1\2', plain)
+    cut = plain[:int(len(plain) * 0.9)]
+    return [
+        ("plain", plain, script),
+        ("fenced", f"```json\n{plain}\n```", script),
+        ("prose", f"Đây là kịch bản {{theo yêu cầu}}:\n{plain}\nGhi chú: thay {{tên}} nếu cần.", script),
+        ("trailing_commas", trailing, script),
+        ("truncated", cut, None),   # chỉ kiểm tra parse được (dict), không so nội dung
+    ]
+
+def recorded_responses(directory):
+    responses = []
+    for path in sorted(Path(directory).glob("*.txt")):
+        text = path.read_text(encoding="utf-8")
+        responses.append((path.stem, text, extract_json(text)))
+    return responses
+
+# ── Run ──
+
+def measure(fn, text, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def check(result, expected):
+    if result is None:
+        return "none"
+    if expected is None:
+        return "ok" if isinstance(result, dict) else "wrong"
+    return "ok" if result == expected else "wrong"
+
+def main():
+    parser = argparse.ArgumentParser(description="⏱️ Benchmark trích xuất JSON từ response LLM")
+    parser.add_argument("--scenes", type=int, default=500, help="Số scenes kịch bản tổng hợp (mặc định: 500)")
+    parser.add_argument("--responses", help="Thư mục response đã ghi lại (*.txt, LLM_RECORD_DIR)")
+    parser.add_argument("--extractors", default=",".join(EXTRACTORS),
+                        help=f"Extractor cần đo — {', '.join(EXTRACTORS)}")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần chạy mỗi case (lấy median)")
+    parser.add_argument("--json", action="store_true", help="In JSON ra stdout")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.extractors.split(",") if n.strip()]
+    unknown = set(names) - set(EXTRACTORS)
+    if unknown:
+        parser.error(f"Extractor không hợp lệ: {', '.join(sorted(unknown))}")
+
+    if args.responses:
+        responses = recorded_responses(args.responses)
+        if not responses:
+            print_error(f"Không có response *.txt trong {args.responses}")
+            sys.exit(1)
+    else:
+        responses = synthetic_responses(args.scenes)
+
+    print_header("Benchmark: JSON extraction", "⏱️")
+    print(f"  {'case':<22}{'KB':>8}  " + "".join(f"{n:>20}" for n in names))
+
+    results = []
+    for case, text, expected in responses:
+        row = {"case": case, "bytes": len(text.encode("utf-8")), "extractors": {}}
+        cells = []
+        for name in names:
+            seconds, result = measure(EXTRACTORS[name], text, args.repeat)
+            status = check(result, expected)
+            row["extractors"][name] = {"seconds": round(seconds, 6), "status": status,
+                                       "mb_per_s": round(row["bytes"] / 1e6 / seconds, 1) if seconds else None}
+            mark = "✅" if status == "ok" else "❌"
+            cells.append(f"{mark} {seconds * 1000:>9.2f}ms")
+        results.append(row)
+        print(f"  {case[:21]:<22}{row['bytes'] / 1024:>8.0f}  " + "".join(f"{c:>20}" for c in cells))
+
+    if args.json:
+        print(json.dumps({"scenes": None if args.responses else args.scenes,
+                          "repeat": args.repeat, "results": results}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
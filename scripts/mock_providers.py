@@ -0,0 +1,825 @@
+#!/usr/bin/env python3
+"""
+🧪 MyShort — Mock Provider Server
+Server giả lập Tavily, Gemini/OpenAI, Suno (GoAPI + official), Veo và Telegram
+để load-test orchestrator / polling offline (chỉ dùng stdlib).
+
+Mỗi provider có thể cấu hình:
+- Latency: fixed:0.2 | uniform:0.1,0.5 | normal:1,0.3 | lognormal:0,0.5
+- Error rate: tỉ lệ trả 503
+- Rate limit: request/giây (token bucket) → 429 + Retry-After
+- Job time (suno/veo): số giây cho đến khi poll trả về done
+
+Agents trỏ vào mock qua biến base-URL (TAVILY_API_URL, GOOGLE_API_URL,
+OPENAI_API_URL, SUNO_API_URL, TELEGRAM_API_URL).
+
+Usage:
+    python3 mock_providers.py --port 8765                           # Chỉ chạy server
+    python3 mock_providers.py --latency llm=lognormal:1,0.4 --error-rate veo=0.1
+    python3 mock_providers.py --run-pipelines 4 --concurrency 2     # Harness full pipeline
+    python3 mock_providers.py --script-batch 20 --latency llm=fixed:1  # Throughput batch kịch bản
+    python3 mock_providers.py --script-batch 20 --pipeline-args "--batch-api"
+    python3 mock_providers.py --check                               # Kiểm tra end-to-end (exit 1 nếu fail)
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+MYSHORT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
+
+from utils import (
+    setup_logging, save_json, load_json, print_header, print_success,
+    print_warning, print_error, parse_agent_output
+)
+
+logger = setup_logging("MockProviders")
+
+PROVIDERS = ["tavily", "llm", "suno", "veo", "telegram", "download"]
+
+DEFAULT_JOB_SECONDS = {"suno": 3.0, "veo": 2.0}
+# Harness: provider phải nhận ít nhất N request / pipeline (không thì agent đã fallback dry-run)
+MIN_REQUESTS_PER_PIPELINE = {"tavily": 1, "llm": 1, "suno": 2, "veo": 2, "download": 2}
+DEFAULT_SONG_SECONDS = 63.5
+
+# ── Provider behaviour ──
+
+def parse_latency(spec):
+    """'lognormal:0,0.5' → hàm trả về số giây delay."""
+    if not spec or spec in ("0", "none"):
+        return lambda rng: 0.0
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v] if params else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Latency spec không hợp lệ: {spec}")
+
+class ProviderProfile:
+    """Latency / error rate / rate limit của 1 provider."""
+
+    def __init__(self, latency=None, error_rate=0.0, rate_limit=0.0, job_seconds=0.0):
+        self.latency_spec = latency or "0"
+        self.latency = parse_latency(self.latency_spec)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.job_seconds = job_seconds
+        self._tokens = max(rate_limit, 1.0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take_token(self):
+        """Token bucket. Returns: True nếu request được phép."""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._last) * self.rate_limit,
+                               max(self.rate_limit, 1.0))
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+class MockState:
+    """State dùng chung giữa các request: jobs, assets, thống kê."""
+
+    def __init__(self, profiles, seed=0, song_seconds=DEFAULT_SONG_SECONDS, ffmpeg="ffmpeg"):
+        self.profiles = profiles
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.song_seconds = song_seconds
+        self.ffmpeg = ffmpeg if shutil.which(ffmpeg) else None
+        self.jobs = {}
+        self.assets = {}
+        self.lock = threading.Lock()
+        self.stats = {p: {"requests": 0, "errors": 0, "rate_limited": 0,
+                          "latency_total": 0.0, "bytes_in": 0, "bytes_out": 0} for p in PROVIDERS}
+
+    def sample(self, fn):
+        with self.rng_lock:
+            return fn(self.rng)
+
+    def record(self, provider, key, value=1):
+        with self.lock:
+            self.stats[provider][key] += value
+
+    def snapshot(self):
+        with self.lock:
+            out = {}
+            for provider, s in self.stats.items():
+                out[provider] = {**s, "avg_latency": round(s["latency_total"] / s["requests"], 4)
+                                 if s["requests"] else 0.0}
+            return out
+
+# ── Fake payloads ──
+
+def fake_script(prompt):
+    """Kịch bản JSON hợp lệ, số scenes/tổng giây lấy từ prompt của content_creator."""
+    seconds_match = re.search(r"= (\d+) giây", prompt)
+    scenes_match = re.search(r"CHÍNH XÁC (\d+) scenes", prompt)
+    topic_match = re.search(r'chủ đề: "([^"]+)"', prompt)
+    total = int(seconds_match.group(1)) if seconds_match else 60
+    count = int(scenes_match.group(1)) if scenes_match else max(total // 8, 1)
+    step = total / count
+    sections = ["intro", "verse1", "chorus", "verse2", "chorus_repeat", "bridge", "outro"]
+    scenes = []
+    for i in range(count):
+        start, end = round(i * step), round((i + 1) * step)
+        scenes.append({
+            "id": i + 1,
+            "timestamp": f"{start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}",
+            "lyrics_section": sections[min(i * len(sections) // count, len(sections) - 1)],
+            "description": f"Mock scene {i + 1}: cute bunny hops across a rainbow meadow.",
+            "characters": ["Bunny"],
+            "action": "hops and waves",
+            "background": "rainbow meadow",
+            "colors": "pastel rainbow",
+            "camera_movement": "slow pan",
+            "mood": "happy",
+        })
+    script = {
+        "title": f"Mock Song: {topic_match.group(1) if topic_match else 'kids'}",
+        "title_vi": "Bài hát mock",
+        "duration_minutes": round(total / 60, 2),
+        "target_age": "2-5",
+        "theme": topic_match.group(1) if topic_match else "mock",
+        "lyrics": {s: f"La la la {s}\nHop hop hop!" for s in sections},
+        "scenes": scenes,
+        "music_direction": {"genre": "kids pop", "bpm": 120, "key": "C major", "mood": "happy",
+                            "instruments": ["ukulele"], "vocal_style": "cheerful"},
+        "seo": {"tags": ["mock", "kids"], "description": "Mock video"},
+    }
+    outline_match = re.search(r"DÀN Ý cho video .*?\((\d+) giây\)", prompt)
+    if outline_match:  # pha 1 của kịch bản chia batch: section plan thay cho scenes
+        total = int(outline_match.group(1))
+        order = sections[:5] + ["chorus"] + sections[5:]
+        script["sections"] = [{"lyrics_section": s, "seconds": total / len(order), "summary": f"Mock {s}"}
+                              for s in order]
+        script["characters"] = ["Bunny (white, fluffy, pink ears)"]
+        del script["scenes"]
+    return script
+
+def make_wav(seconds, rate=8000):
+    """Sine 440Hz mono 16-bit — đủ để ffmpeg đo duration."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        frames = int(seconds * rate)
+        w.writeframes(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / rate))) for i in range(frames)
+        ))
+    return buf.getvalue()
+
+def make_video(state, seconds):
+    """MP4 testsrc (cần ffmpeg); không có ffmpeg → bytes giả."""
+    if not state.ffmpeg:
+        return b"\x00" * 4096
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
+        path = tmp.name
+    try:
+        subprocess.run([state.ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+                        "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate=24:duration={seconds}",
+                        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path],
+                       check=True, capture_output=True, timeout=120)
+        return Path(path).read_bytes()
+    finally:
+        Path(path).unlink(missing_ok=True)
+
+def get_asset(state, key, factory):
+    with state.lock:
+        if key in state.assets:
+            return state.assets[key]
+    data = factory()
+    with state.lock:
+        state.assets.setdefault(key, data)
+        return state.assets[key]
+
+# ── HTTP handler ──
+
+ROUTES = [
+    ("POST", r"^/search$", "tavily", "tavily_search"),
+    ("POST", r"^/v1beta/models/[^/:]+:generateContent$", "llm", "gemini_generate"),
+    ("POST", r"^/v1beta/models/[^/:]+:streamGenerateContent$", "llm", "gemini_stream"),
+    ("POST", r"^/v1/chat/completions$", "llm", "openai_chat"),
+    ("POST", r"^/v1/files$", "llm", "openai_file_upload"),
+    ("GET", r"^/v1/files/(?P<file_id>[\w-]+)/content$", "llm", "openai_file_content"),
+    ("POST", r"^/v1/batches$", "llm", "openai_batch_submit"),
+    ("GET", r"^/v1/batches/(?P<batch_id>[\w-]+)$", "llm", "openai_batch_poll"),
+    ("POST", r"^/v1beta/models/[^/:]+:predictLongRunning$", "veo", "veo_submit"),
+    ("GET", r"^/v1beta/operations/(?P<op>[\w-]+)$", "veo", "veo_poll"),
+    ("POST", r"^(/goapi)?/api/suno/v1/music$", "suno", "suno_submit"),
+    ("GET", r"^(/goapi)?/api/suno/v1/music/(?P<task>[\w-]+)$", "suno", "suno_poll"),
+    ("POST", r"^/api/generate/v2$", "suno", "suno_generate"),
+    ("GET", r"^/files/(?P<name>[\w.-]+)$", "download", "download"),
+    ("POST", r"^/bot[^/]+/(?P<method>send\w+)$", "telegram", "telegram"),
+]
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MyShortMock/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+    @property
+    def state(self):
+        return self.server.mock_state
+
+    def _base_url(self):
+        host = self.headers.get("Host") or f"127.0.0.1:{self.server.server_port}"
+        return f"http://{host}"
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return body
+
+    def _send(self, provider, status, payload=None, raw=None, content_type="application/json",
+              headers=None):
+        data = raw if raw is not None else json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        if provider:
+            self.state.record(provider, "bytes_out", len(data))
+
+    def _send_sse(self, provider, events, interval=0.0):
+        """Server-sent events qua chunked transfer (mỗi event 1 chunk, cách nhau interval giây)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        for event in events:
+            data = f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            sent += len(data)
+            if interval:
+                time.sleep(interval)
+        self.wfile.write(b"0\r\n\r\n")
+        if provider:
+            self.state.record(provider, "bytes_out", sent)
+
+    def _stream_pieces(self, provider, text, pieces=20):
+        """Chia text thành ~pieces chunk; job_seconds của provider = thời gian stream."""
+        size = max(len(text) // pieces, 1)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        return chunks, self.state.profiles[provider].job_seconds / max(len(chunks), 1)
+
+    def _dispatch(self, method):
+        path = urlparse(self.path).path
+        if path == "/_stats":
+            return self._send(None, 200, self.state.snapshot())
+        for route_method, pattern, provider, handler in ROUTES:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                break
+        else:
+            self._read_body()
+            return self._send(None, 404, {"error": f"no mock route: {method} {path}"})
+
+        body = self._body = self._read_body()
+        state = self.state
+        profile = state.profiles[provider]
+        state.record(provider, "requests")
+        state.record(provider, "bytes_in", len(body))
+
+        if not profile.take_token():
+            state.record(provider, "rate_limited")
+            return self._send(provider, 429, {"error": "rate limited"}, headers={"Retry-After": "1"})
+
+        delay = state.sample(profile.latency)
+        state.record(provider, "latency_total", delay)
+        time.sleep(delay)
+
+        if profile.error_rate and state.sample(lambda rng: rng.random()) < profile.error_rate:
+            state.record(provider, "errors")
+            return self._send(provider, 503, {"error": "injected failure"})
+
+        try:
+            payload = json.loads(body) if body and self.headers.get("Content-Type", "").startswith(
+                "application/json") else {}
+        except json.JSONDecodeError:
+            payload = {}
+        getattr(self, f"_handle_{handler}")(provider, payload, **match.groupdict())
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    # ── Providers ──
+
+    def _handle_tavily_search(self, provider, payload):
+        query = payload.get("query", "")
+        results = [{
+            "title": f"{query} — viral kids song #{i + 1}",
+            "url": f"https://example.com/mock/{uuid.uuid5(uuid.NAMESPACE_URL, query + str(i)).hex[:8]}",
+            "content": f"Mock result {i + 1} for {query}: trending nursery rhyme with dance.",
+        } for i in range(int(payload.get("max_results", 5)))]
+        self._send(provider, 200, {"query": query, "results": results})
+
+    def _handle_gemini_generate(self, provider, payload):
+        prompt = payload.get("contents", [{}])[0].get("parts", [{}])[0].get("text", "")
+        text = json.dumps(fake_script(prompt), ensure_ascii=False)
+        self._send(provider, 200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    def _handle_gemini_stream(self, provider, payload):
+        prompt = payload.get("contents", [{}])[0].get("parts", [{}])[0].get("text", "")
+        chunks, interval = self._stream_pieces(provider, json.dumps(fake_script(prompt), ensure_ascii=False))
+        self._send_sse(provider, ({"candidates": [{"content": {"parts": [{"text": c}]}}]} for c in chunks),
+                       interval)
+
+    def _handle_openai_chat(self, provider, payload):
+        prompt = (payload.get("messages") or [{}])[-1].get("content", "")
+        text = json.dumps(fake_script(prompt), ensure_ascii=False)
+        if payload.get("stream"):
+            chunks, interval = self._stream_pieces(provider, text)
+            events = [{"choices": [{"delta": {"content": c}}]} for c in chunks] + ["[DONE]"]
+            return self._send_sse(provider, events, interval)
+        self._send(provider, 200, {"choices": [{"message": {"role": "assistant", "content": text}}]})
+
+    def _handle_openai_file_upload(self, provider, payload):
+        """multipart/form-data (purpose=batch, file=JSONL) → lưu nội dung file."""
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode() + self._body)
+        parts = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                 for part in message.iter_parts()} if message.is_multipart() else {}
+        if not parts.get("file"):
+            return self._send(provider, 400, {"error": "missing file"})
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self.state.lock:
+            self.state.assets[file_id] = parts["file"]
+        self._send(provider, 200, {"id": file_id, "object": "file", "bytes": len(parts["file"]),
+                                   "purpose": (parts.get("purpose") or b"").decode()})
+
+    def _handle_openai_file_content(self, provider, payload, file_id):
+        data = self.state.assets.get(file_id)
+        if data is None:
+            return self._send(provider, 404, {"error": "unknown file"})
+        self._send(provider, 200, raw=data, content_type="application/jsonl")
+
+    def _handle_openai_batch_submit(self, provider, payload):
+        if payload.get("input_file_id") not in self.state.assets:
+            return self._send(provider, 400, {"error": "unknown input_file_id"})
+        batch_id = f"batch_{self._new_job('batch', input_file_id=payload['input_file_id'])}"
+        self._send(provider, 200, {"id": batch_id, "status": "validating"})
+
+    def _handle_openai_batch_poll(self, provider, payload, batch_id):
+        """Batch xong sau job_seconds của llm; output = 1 dòng JSONL / request (fake_script)."""
+        job, done = self._job_done(batch_id.removeprefix("batch_"), provider)
+        if not job:
+            return self._send(provider, 404, {"error": "unknown batch"})
+        if not done:
+            return self._send(provider, 200, {"id": batch_id, "status": "in_progress"})
+        if "output_file_id" not in job:
+            lines = []
+            for line in self.state.assets[job["input_file_id"]].decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                prompt = (request["body"].get("messages") or [{}])[-1].get("content", "")
+                text = json.dumps(fake_script(prompt), ensure_ascii=False)
+                lines.append(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": {
+                        "choices": [{"message": {"role": "assistant", "content": text}}]}},
+                    "error": None,
+                }, ensure_ascii=False))
+            output_id = f"file-{uuid.uuid4().hex[:12]}"
+            with self.state.lock:
+                self.state.assets[output_id] = "\n".join(lines).encode("utf-8")
+                job["output_file_id"] = output_id
+        self._send(provider, 200, {"id": batch_id, "status": "completed",
+                                   "output_file_id": job["output_file_id"]})
+
+    def _new_job(self, kind, **data):
+        job_id = uuid.uuid4().hex[:12]
+        with self.state.lock:
+            self.state.jobs[job_id] = {"kind": kind, "created": time.monotonic(), **data}
+        return job_id
+
+    def _job_done(self, job_id, provider):
+        job = self.state.jobs.get(job_id)
+        if not job:
+            return None, False
+        return job, time.monotonic() - job["created"] >= self.state.profiles[provider].job_seconds
+
+    def _handle_veo_submit(self, provider, payload):
+        seconds = int(payload.get("parameters", {}).get("durationSeconds", 8))
+        op = self._new_job("veo", seconds=seconds)
+        self._send(provider, 200, {"name": f"operations/{op}"})
+
+    def _handle_veo_poll(self, provider, payload, op):
+        job, done = self._job_done(op, provider)
+        if not job:
+            return self._send(provider, 404, {"error": "unknown operation"})
+        response = {"name": f"operations/{op}", "done": done}
+        if done:
+            uri = f"{self._base_url()}/files/video-{job['seconds']}s.mp4"
+            response["response"] = {"generatedSamples": [{"video": {"uri": uri}}]}
+        self._send(provider, 200, response)
+
+    def _song(self, task_id):
+        return {"audio_url": f"{self._base_url()}/files/song.wav",
+                "duration": self.state.song_seconds, "id": task_id}
+
+    def _handle_suno_submit(self, provider, payload):
+        task = self._new_job("suno")
+        self._send(provider, 200, {"code": 200, "data": {"task_id": task}})
+
+    def _handle_suno_poll(self, provider, payload, task):
+        job, done = self._job_done(task, provider)
+        if not job:
+            return self._send(provider, 404, {"error": "unknown task"})
+        data = {"task_id": task, "status": "completed" if done else "processing"}
+        if done:
+            data["output"] = [self._song(task)]
+        self._send(provider, 200, {"code": 200, "data": data})
+
+    def _handle_suno_generate(self, provider, payload):
+        time.sleep(self.state.profiles[provider].job_seconds)
+        self._send(provider, 200, {"clips": [self._song(uuid.uuid4().hex[:12])]})
+
+    def _handle_download(self, provider, payload, name):
+        if name == "song.wav":
+            data = get_asset(self.state, name, lambda: make_wav(self.state.song_seconds))
+            return self._send(provider, 200, raw=data, content_type="audio/wav")
+        match = re.match(r"video-(\d+)s\.mp4$", name)
+        if match:
+            seconds = int(match.group(1))
+            data = get_asset(self.state, name, lambda: make_video(self.state, seconds))
+            return self._send(provider, 200, raw=data, content_type="video/mp4")
+        self._send(provider, 404, {"error": "unknown file"})
+
+    def _handle_telegram(self, provider, payload, method):
+        self._send(provider, 200, {"ok": True, "result": {"message_id": random.randint(1, 10 ** 6),
+                                                          "method": method}})
+
+# ── Server ──
+
+def build_profiles(args):
+    profiles = {}
+    for provider in PROVIDERS:
+        profiles[provider] = ProviderProfile(
+            latency=args.latency.get(provider),
+            error_rate=args.error_rate.get(provider, 0.0),
+            rate_limit=args.rate_limit.get(provider, 0.0),
+            job_seconds=args.job_seconds.get(provider, DEFAULT_JOB_SECONDS.get(provider, 0.0)),
+        )
+    return profiles
+
+def start_server(profiles, host="127.0.0.1", port=0, seed=0, song_seconds=DEFAULT_SONG_SECONDS):
+    """Chạy server trong thread nền. Returns: (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.mock_state = MockState(profiles, seed=seed, song_seconds=song_seconds,
+                                  ffmpeg=os.environ.get("FFMPEG_PATH", "ffmpeg"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}"
+
+def mock_env(base_url, output_dir):
+    """Biến môi trường trỏ toàn bộ agents vào mock server."""
+    return {
+        "TAVILY_API_URL": base_url,
+        "TAVILY_API_KEY": "mock-tavily",
+        "GOOGLE_API_URL": base_url,
+        "OPENAI_API_URL": f"{base_url}/v1",
+        "LLM_API_KEY": "mock-llm",
+        "SUNO_API_URL": f"{base_url}/goapi",
+        "SUNO_API_KEY": "mock-suno",
+        "SUNO_POLL_INTERVAL": "0.5",
+        "GOOGLE_VEO_API_KEY": "mock-veo",
+        "VEO_POLL_INTERVAL": "0.5",
+        "LLM_BATCH_POLL_INTERVAL": "0.5",
+        "TELEGRAM_API_URL": base_url,
+        "TELEGRAM_TOKEN": "mock-token",
+        "TELEGRAM_CHAT_ID": "1",
+        "OUTPUT_DIR": str(output_dir),
+        "METRICS_DIR": str(Path(output_dir) / "metrics"),
+    }
+
+# ── Harness ──
+
+def run_one_pipeline(index, base_url, work_dir, extra_args):
+    """Chạy 1 orchestrator (OUTPUT_DIR riêng để các pipeline không đọc file của nhau)."""
+    output_dir = Path(work_dir) / f"pipeline-{index:02d}"
+    env = {**os.environ, **mock_env(base_url, output_dir)}
+    session = f"mock-{index:02d}"
+    cmd = [sys.executable, str(MYSHORT_ROOT / "scripts" / "orchestrator.py"),
+           "--session", session, "--topic", f"mock topic {index}",
+           "--duration", "1", "--skip-review", *extra_args]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    state_file = output_dir / "state" / f"pipeline-{session}.json"
+    steps, files = {}, {}
+    if state_file.exists():
+        state = load_json(state_file)
+        steps = {k: v.get("status") for k, v in state.get("steps", {}).items()}
+        files = state.get("files", {})
+    return {"index": index, "wall_seconds": round(wall, 3), "returncode": proc.returncode,
+            "steps": steps, "files": files, "stderr_tail": proc.stderr[-300:] if proc.returncode else ""}
+
+def run_harness(server, base_url, args):
+    print_header("Mock Harness: Full Pipelines", "🧪")
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="myshort-mock-"))
+    extra = [a for a in (args.pipeline_args or "").split() if a]
+    print(f"  🌐 Mock: {base_url}")
+    print(f"  🔁 Pipelines: {args.run_pipelines} (concurrency {args.concurrency})")
+    print(f"  📂 Work dir: {work_dir}\n")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        runs = list(pool.map(lambda i: run_one_pipeline(i, base_url, work_dir, extra),
+                             range(1, args.run_pipelines + 1)))
+    total = time.perf_counter() - start
+
+    for run in runs:
+        finals = [v for k, v in run["files"].items() if k.startswith("final_video_")]
+        run["final_video"] = finals[0] if finals and Path(finals[0]).exists() else None
+        run["ok"] = bool(run["returncode"] == 0 and run["steps"] and run["final_video"] and all(
+            v == "completed" for v in run["steps"].values()))
+        icon = "✅" if run["ok"] else "❌"
+        steps = " ".join(f"{k}:{v}" for k, v in sorted(run["steps"].items()))
+        print(f"  {icon} #{run['index']:02d} {run['wall_seconds']:>7.1f}s  {steps}  🎞️ {run['final_video'] or '—'}")
+
+    walls = sorted(r["wall_seconds"] for r in runs)
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "pipelines": args.run_pipelines,
+        "concurrency": args.concurrency,
+        "total_seconds": round(total, 3),
+        "throughput_per_min": round(len(runs) / total * 60, 2) if total else 0,
+        "p50_seconds": walls[len(walls) // 2] if walls else 0,
+        "max_seconds": walls[-1] if walls else 0,
+        "providers": server.mock_state.snapshot(),
+        "runs": runs,
+    }
+    print(f"\n  ⏱️  Tổng: {total:.1f}s | p50: {report['p50_seconds']:.1f}s | "
+          f"throughput: {report['throughput_per_min']}/phút")
+    print(f"\n  {'Provider':<10} {'req':>6} {'err':>5} {'429':>5} {'avg lat':>8}")
+    for provider, s in report["providers"].items():
+        print(f"  {provider:<10} {s['requests']:>6} {s['errors']:>5} {s['rate_limited']:>5} "
+              f"{s['avg_latency']:>8.3f}")
+
+    # Mỗi provider phải thật sự được gọi (Suno/Veo không bị thay bằng dry-run)
+    failures = [f"#{r['index']:02d}: pipeline chưa ra video final" for r in runs if not r["ok"]]
+    for provider, minimum in MIN_REQUESTS_PER_PIPELINE.items():
+        requests_seen = report["providers"][provider]["requests"]
+        if requests_seen < minimum * len(runs):
+            failures.append(f"{provider}: {requests_seen} request < {minimum * len(runs)}")
+    report["failures"] = failures
+
+    report_path = save_json(report, work_dir / "mock-report.json")
+    if failures:
+        for failure in failures:
+            print_error(failure)
+        print_error(f"Report: {report_path}")
+        sys.exit(1)
+    print_success(f"Report: {report_path}")
+    return report
+
+def run_script_batch(server, base_url, args):
+    """Đo throughput content_creator --topics (fan-out song song hoặc --batch-api) qua mock LLM."""
+    print_header("Mock Harness: Batch Scripts", "🧪")
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="myshort-mock-"))
+    output_dir = work_dir / "script-batch"
+    extra = [a for a in (args.pipeline_args or "").split() if a]
+    topics = [f"mock topic {i}" for i in range(1, args.script_batch + 1)]
+    env = {**os.environ, **mock_env(base_url, output_dir)}
+    if "--batch-api" in extra:
+        env.update(LLM_PROVIDER="openai", LLM_MODEL="gpt-4o-mini")
+    print(f"  🌐 Mock: {base_url}")
+    print(f"  📝 Topics: {len(topics)} ({' '.join(extra) or 'fan-out'})\n")
+
+    cmd = [sys.executable, str(MYSHORT_ROOT / "content-creator" / "scripts" / "content_creator.py"),
+           "--topics", ",".join(topics), "--duration", "1", "--no-telegram", *extra]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    manifests = sorted((output_dir / "scripts").glob("batch-*.json"))
+    summary = load_json(manifests[-1]) if manifests else {}
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "topics": len(topics),
+        "args": extra,
+        "returncode": proc.returncode,
+        "wall_seconds": round(wall, 3),
+        "ok": summary.get("ok", 0),
+        "failed": summary.get("failed", len(topics)),
+        "batch_seconds": summary.get("seconds"),
+        "throughput_per_min": summary.get("throughput_per_min", 0),
+        "providers": server.mock_state.snapshot(),
+        "stderr_tail": proc.stderr[-300:] if proc.returncode else "",
+    }
+    print(f"  {'✅' if proc.returncode == 0 else '❌'} {report['ok']}/{len(topics)} kịch bản | "
+          f"batch: {report['batch_seconds']}s | process: {wall:.1f}s | "
+          f"throughput: {report['throughput_per_min']}/phút")
+    llm = report["providers"]["llm"]
+    print(f"  🤖 LLM: {llm['requests']} request, {llm['bytes_in'] / 1024:.0f}KB in, "
+          f"{llm['bytes_out'] / 1024:.0f}KB out")
+    if report["stderr_tail"]:
+        print_error(report["stderr_tail"])
+
+    report_path = save_json(report, work_dir / "mock-script-batch-report.json")
+    print_success(f"Report: {report_path}")
+    return report
+
+AGENT_SCRIPTS = {
+    "content": MYSHORT_ROOT / "content-creator" / "scripts" / "content_creator.py",
+    "music": MYSHORT_ROOT / "music-maker" / "scripts" / "music_maker.py",
+}
+
+def run_agent_json(agent, agent_args, env):
+    """Chạy 1 agent với --json như orchestrator. Returns: (CompletedProcess, dict JSON hoặc None)."""
+    cmd = [sys.executable, str(AGENT_SCRIPTS[agent]), *agent_args, "--json", "--no-telegram"]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=600)
+    return proc, parse_agent_output(proc.stdout)
+
+def run_checks(server, base_url, args):
+    """Kiểm tra end-to-end qua mock (agents chạy subprocess thật). Returns: report, exit 1 nếu có check fail."""
+    print_header("Mock Harness: Checks", "🧪")
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="myshort-mock-"))
+    env = {**os.environ, **mock_env(base_url, work_dir / "agents")}
+    print(f"  🌐 Mock: {base_url}")
+    print(f"  📂 Work dir: {work_dir}\n")
+    results = []
+
+    def check(name, ok, detail=""):
+        print(f"  {'✅' if ok else '❌'} {name}" + ("" if ok or not detail else f"\n     {detail}"))
+        results.append({"check": name, "ok": bool(ok), "detail": "" if ok else detail})
+        return ok
+
+    # Contract --json: stdout chỉ có 1 JSON (log của agent ở stderr) → orchestrator đọc được kết quả
+    proc, script = run_agent_json("content", ["--topic", "mock check", "--duration", "1"], env)
+    script_file = (script or {}).get("output_file")
+    check("content_creator --json → output_file", script_file and Path(script_file).exists(),
+          proc.stderr[-300:])
+    if script_file:
+        proc, music = run_agent_json("music", ["--script", script_file], env)
+        duration = (music or {}).get("actual_duration")
+        check("music_maker --json → actual_duration",
+              isinstance(duration, (int, float)) and abs(duration - server.mock_state.song_seconds) < 1,
+              f"actual_duration={duration!r} | {proc.stderr[-300:]}")
+
+    # Draft → --promote cùng session: mỗi profile ghi final_video_{profile} riêng
+    draft_run = run_one_pipeline(1, base_url, work_dir, ["--render-profile", "draft"])
+    draft = draft_run["files"].get("final_video_draft")
+    check("pipeline --render-profile draft → final_video_draft", draft and Path(draft).exists(),
+          f"steps={draft_run['steps']} files={draft_run['files']} | {draft_run['stderr_tail']}")
+    metrics_store = work_dir / "pipeline-01" / "metrics" / "metrics-store.json"
+
+    def videos_total():
+        return load_json(metrics_store).get("counters", {}).get("myshort_videos_total", 0) \
+            if metrics_store.exists() else 0
+
+    check("metrics: myshort_videos_total = 1 sau 1 session", videos_total() == 1,
+          f"myshort_videos_total={videos_total()}")
+    if draft:
+        final_run = run_one_pipeline(1, base_url, work_dir, ["--promote"])
+        final = final_run["files"].get("final_video_final")
+        check("--promote → final_video_final (draft giữ nguyên)",
+              final and final != draft and Path(final).exists()
+              and final_run["files"].get("final_video_draft") == draft,
+              f"steps={final_run['steps']} files={final_run['files']} | {final_run['stderr_tail']}")
+        check("metrics: --promote đếm thêm 1 video", videos_total() == 2,
+              f"myshort_videos_total={videos_total()}")
+
+    failed = [r["check"] for r in results if not r["ok"]]
+    report = {"timestamp": datetime.now().isoformat(), "checks": results,
+              "providers": server.mock_state.snapshot()}
+    report_path = save_json(report, work_dir / "mock-check-report.json")
+    print()
+    if failed:
+        print_error(f"{len(failed)}/{len(results)} check fail — report: {report_path}")
+        sys.exit(1)
+    print_success(f"{len(results)}/{len(results)} check OK — report: {report_path}")
+    return report
+
+def parse_provider_map(values, cast=str):
+    """['llm=lognormal:1,0.4', 'veo=0.1'] → {'llm': ..., 'veo': ...}"""
+    result = {}
+    for item in values or []:
+        provider, _, value = item.partition("=")
+        if provider not in PROVIDERS:
+            raise argparse.ArgumentTypeError(f"Provider không hợp lệ: {provider} ({', '.join(PROVIDERS)})")
+        result[provider] = cast(value)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="🧪 Mock Provider Server — Tavily / LLM / Suno / Veo / Telegram offline"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0, help="Seed cho latency/error (deterministic)")
+    parser.add_argument("--latency", action="append", metavar="PROVIDER=SPEC",
+                       help="VD: llm=lognormal:1,0.4 | veo=uniform:0.2,1 | tavily=fixed:0.1")
+    parser.add_argument("--error-rate", action="append", metavar="PROVIDER=RATE",
+                       help="Tỉ lệ lỗi 503, VD: veo=0.1")
+    parser.add_argument("--rate-limit", action="append", metavar="PROVIDER=RPS",
+                       help="Giới hạn request/giây → 429, VD: llm=2")
+    parser.add_argument("--job-seconds", action="append", metavar="PROVIDER=SECONDS",
+                       help="Thời gian job suno/veo trước khi done (mặc định: suno=3, veo=2)")
+    parser.add_argument("--song-seconds", type=float, default=DEFAULT_SONG_SECONDS,
+                       help="Độ dài bài hát Suno giả lập")
+    parser.add_argument("--run-pipelines", type=int, default=0,
+                       help="Harness: chạy N pipeline đầy đủ qua orchestrator rồi thoát")
+    parser.add_argument("--concurrency", type=int, default=1, help="Số pipeline chạy song song")
+    parser.add_argument("--script-batch", type=int, default=0,
+                       help="Harness: tạo N kịch bản bằng content_creator --topics rồi thoát")
+    parser.add_argument("--pipeline-args", default="",
+                       help="Tham số thêm cho orchestrator / content_creator (vd. \"--batch-api\")")
+    parser.add_argument("--check", action="store_true",
+                       help="Harness: kiểm tra end-to-end (contract --json của agents...) rồi thoát")
+    parser.add_argument("--work-dir", help="Thư mục output của harness")
+    args = parser.parse_args()
+
+    args.latency = parse_provider_map(args.latency)
+    args.error_rate = parse_provider_map(args.error_rate, float)
+    args.rate_limit = parse_provider_map(args.rate_limit, float)
+    args.job_seconds = parse_provider_map(args.job_seconds, float)
+
+    profiles = build_profiles(args)
+    port = 0 if args.run_pipelines or args.script_batch or args.check else args.port
+    server, base_url = start_server(profiles, args.host, port, args.seed, args.song_seconds)
+
+    if not server.mock_state.ffmpeg:
+        print_warning("FFmpeg không có — video Veo giả sẽ là bytes rỗng (Agent 5 sẽ fail)")
+
+    if args.check:
+        try:
+            run_checks(server, base_url, args)
+        finally:
+            server.shutdown()
+        return
+
+    if args.script_batch:
+        try:
+            run_script_batch(server, base_url, args)
+        finally:
+            server.shutdown()
+        return
+
+    if args.run_pipelines:
+        try:
+            run_harness(server, base_url, args)
+        finally:
+            server.shutdown()
+        return
+
+    print_header("Mock Provider Server", "🧪")
+    print(f"  🌐 Listening: {base_url}")
+    print(f"  📊 Stats: {base_url}/_stats\n")
+    print("  Env để trỏ agents vào mock:")
+    for key, value in mock_env(base_url, "~/myshort-mock-output").items():
+        print(f"    export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print_error("Dừng mock server")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
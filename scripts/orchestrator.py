@@ -10,11 +10,18 @@ Usage:
     python3 orchestrator.py --dry-run                          # Test toàn bộ
     python3 orchestrator.py --from-step 3                      # Resume từ step 3
     python3 orchestrator.py --topic "counting animals"         # Chỉ định topic
+    python3 orchestrator.py --audio-first                      # Re-plan scenes theo nhạc trước Veo
+    python3 orchestrator.py --render-profile draft             # Render nháp nhanh để review
+    python3 orchestrator.py --promote --session ID             # Render lại bản draft → final
+    python3 orchestrator.py --profile                          # cProfile orchestrator + từng agent
+    python3 orchestrator.py --session ID                       # Chạy lại: bỏ qua step có inputs không đổi
+    python3 orchestrator.py --session ID --force               # Chạy lại mọi step
 """
 
 import argparse
-import json
+import cProfile
 import os
+import re
 import sys
 import subprocess
 from datetime import datetime
@@ -27,10 +34,18 @@ sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
 from utils import (
     setup_logging, get_config, ensure_output_dirs, save_json, load_json,
     PipelineState, print_header, print_step, print_success,
-    print_warning, print_error, check_dependencies, get_output_dir
+    print_warning, print_error, check_dependencies, get_output_dir, parse_agent_output
+)
+from timeline import replan_script
+from incremental import record_stage, stage_inputs, stale_reason
+from metrics import record_pipeline_metrics
+from profiling import build_report, print_report
+from tracing import (
+    TRACE_FILE_ENV, get_tracer, load_trace_file, run_traced, summarize_trace, format_bytes
 )
 
 logger = setup_logging("Orchestrator")
+tracer = get_tracer("orchestrator")
 
 # ── Skill Paths (khi deploy trên VPS) ──
 SKILLS_BASE = Path.home() / ".openclaw" / "skills"
@@ -98,8 +113,8 @@ def find_agent_script(agent_info):
     
     return None
 
-def run_agent(step_num, agent_args, state, dry_run=False):
-    """Chạy 1 agent bằng subprocess."""
+def run_agent(step_num, agent_args, state, dry_run=False, profile_dir=None):
+    """Chạy 1 agent bằng subprocess (đo CPU/RSS + merge spans của agent vào trace)."""
     agent = AGENTS[step_num]
     script_path = find_agent_script(agent)
     
@@ -112,38 +127,160 @@ def run_agent(step_num, agent_args, state, dry_run=False):
     if dry_run:
         cmd.append("--dry-run")
     cmd.extend(["--json", "--no-telegram"])
+    if profile_dir:
+        cmd.extend(["--profile", str(profile_dir / f"step{step_num}-{agent['skill']}.prof")])
     
     print(f"  🔧 CMD: {' '.join(cmd[:5])}...")
     
-    try:
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=900  # 15 min max
-        )
-        
-        if result.returncode != 0:
-            print_error(f"Agent failed: {result.stderr[:300]}")
-            state.set_step(step_num, "failed")
-            return None
-        
-        # Parse JSON output
-        try:
-            data = json.loads(result.stdout)
-            state.set_step(step_num, "completed")
-            return data
-        except json.JSONDecodeError:
-            # Non-JSON output is OK for some agents
-            print_success(f"Agent completed (non-JSON output)")
-            state.set_step(step_num, "completed")
-            return {"raw_output": result.stdout[:500]}
+    trace_file = state.state_dir / f"trace-{state.session_id}-step{step_num}.json"
+    trace_file.unlink(missing_ok=True)
+    env = {**os.environ, TRACE_FILE_ENV: str(trace_file)}
     
+    tracer.tags["step"] = step_num
+    tracer.spans = [s for s in tracer.spans if s.get("step") != step_num]  # bỏ spans lần chạy trước
+    try:
+        with tracer.span(f"step:{agent['name']}") as span:
+            return _run_agent_process(cmd, env, trace_file, step_num, state, span)
+    finally:
+        save_trace(state)
+
+def _run_agent_process(cmd, env, trace_file, step_num, state, span):
+    agent = AGENTS[step_num]
+    try:
+        result = run_traced(cmd, name=f"agent:{agent['skill']}", timeout=900, env=env)  # 15 min max
     except subprocess.TimeoutExpired:
         print_error(f"Agent timeout (900s)!")
+        span.fail("timeout")
         state.set_step(step_num, "failed")
         return None
     except Exception as e:
         print_error(f"Agent error: {e}")
+        span.fail(e)
+        state.set_step(step_num, "failed")
+        return None
+    finally:
+        # Spans của agent (HTTP, poll, ffmpeg...) → con của step span
+        tracer.merge(load_trace_file(trace_file), parent_id=span.id, step=step_num)
+        trace_file.unlink(missing_ok=True)
+    
+    if result.returncode != 0:
+        print_error(f"Agent failed: {result.stderr[:300]}")
+        span.fail(f"exit {result.returncode}")
         state.set_step(step_num, "failed")
         return None
+    
+    # Parse JSON output (--json: stdout chỉ có kết quả, log của agent ở stderr)
+    state.set_step(step_num, "completed")
+    data = parse_agent_output(result.stdout)
+    if data is None:
+        print_warning(f"Agent completed nhưng stdout không phải JSON: {result.stdout[:200]!r}")
+        return {"raw_output": result.stdout[:500]}
+    return data
+
+def plan_stage(step_num, step_args, state, args, config, artifacts=None):
+    """
+    Khai báo inputs của step + quyết định có cần chạy không (kiểu make).
+    Returns: dict {"step", "inputs", "fresh"} — fresh=True → bỏ qua, dùng output cũ.
+    """
+    inputs = stage_inputs(step_num, step_args, artifacts, config, find_agent_script(AGENTS[step_num]))
+    stage = {"step": step_num, "inputs": inputs, "fresh": False}
+    if args.dry_run or args.force:
+        return stage
+    reason = stale_reason(state, step_num, inputs)
+    if reason is None:
+        stage["fresh"] = True
+        state.state.setdefault("reused_steps", []).append(step_num)
+        print_success(f"Inputs không đổi — dùng lại output (fingerprint "
+                      f"{state.state['fingerprints'][str(step_num)]['fingerprint'][:10]})")
+    elif reason != "chưa có fingerprint":
+        print(f"  🔄 Chạy lại: {reason}")
+    return stage
+
+def finish_stage(stage, state, args, outputs):
+    """Lưu fingerprint + outputs ({tên: đường dẫn}) nếu step chạy thành công."""
+    if args.dry_run or state.get_step(stage["step"]).get("status") != "completed":
+        return
+    recorded = record_stage(state, stage["step"], stage["inputs"], outputs)
+    missing = [name for name, path in outputs.items() if name not in recorded]
+    if missing:
+        print_warning(f"Output không có trên đĩa: {', '.join(missing)} — lần sau step sẽ chạy lại")
+
+def planned_script(state, args):
+    """Script cho Step 4/5: bản đã re-plan theo nhạc (--audio-first) hoặc bản gốc."""
+    if args.audio_first and state.get_file("script_planned"):
+        return state.get_file("script_planned")
+    return state.get_file("script")
+
+def save_trace(state):
+    """Lưu trace (spans đã merge) + tóm tắt vào state của session."""
+    state.state["trace"] = tracer.spans
+    state.state["trace_summary"] = summarize_trace(tracer.spans)
+    state.save()
+
+def save_profile_report(state, profile_dir, profiler, top=30):
+    """Ghi .prof của orchestrator + báo cáo merge (orchestrator + các step) vào session."""
+    profiler.dump_stats(str(profile_dir / "orchestrator.prof"))
+    stage_files = {"orchestrator": [profile_dir / "orchestrator.prof"]}
+    for prof in sorted(profile_dir.glob("step*.prof")):
+        stage_files[prof.stem.replace("-kids-", " ")] = [prof]
+    report = build_report(stage_files, top=top)
+    report["session_id"] = state.session_id
+    report_path = save_json(report, profile_dir / "profile-report.json")
+    state.state["profile"] = {"dir": str(profile_dir), "report": report_path}
+    state.save()
+    return report
+
+def print_trace_summary(summary, top=8):
+    """In thời gian / CPU / RSS từng step + các thao tác tốn thời gian nhất."""
+    steps = summary.get("steps", {})
+    if not steps:
+        return
+    print(f"\n  ⏱️  Timing:")
+    for step_num in sorted(steps, key=int):
+        s = steps[step_num]
+        rss = f", RSS {s['max_rss_kb'] / 1024:.0f} MB" if s["max_rss_kb"] else ""
+        extra = f", retries {s['retries']}" if s["retries"] else ""
+        extra += f", errors {s['errors']}" if s["errors"] else ""
+        print(f"    Step {step_num}: {s['wall_s']:>7.1f}s wall, {s['cpu_s']:.1f}s CPU"
+              f"{rss}, ↓{format_bytes(s['bytes_in'])} ↑{format_bytes(s['bytes_out'])}{extra}")
+    operations = summary.get("operations", [])[:top]
+    if operations:
+        print(f"\n  🔬 Top operations:")
+        for op in operations:
+            print(f"    {op['name']:<28} ×{op['count']:<4} {op['wall_s']:>7.1f}s"
+                  + (f"  (CPU {op['child_cpu_s']:.1f}s)" if op["child_cpu_s"] else ""))
+
+def replan_from_audio(state):
+    """
+    Audio-first: re-plan scenes của script theo độ dài nhạc thật (sau Step 3),
+    trước khi Agent 4 gửi bất kỳ prompt nào cho Veo. Ghi script-*-audio-first.json kèm mapping.
+    """
+    script_path = state.get_file("script")
+    audio_duration = state.get_file("audio_duration")
+    if not script_path or not audio_duration:
+        print_warning("Audio-first: thiếu script hoặc độ dài nhạc — giữ timestamps của LLM")
+        return False
+
+    # Ghi ra file riêng: script gốc (input của Step 3) giữ nguyên → fingerprint ổn định
+    script = load_json(script_path)
+    replanned = replan_script(script, float(audio_duration))
+    planned_path = Path(script_path).with_name(f"{Path(script_path).stem}-audio-first.json")
+    save_json(replanned, planned_path)
+    state.set_file("script_planned", str(planned_path))
+
+    timeline = replanned["timeline"]
+    actions = [m["action"] for m in timeline["mapping"]]
+    print_success(
+        f"Audio-first: {timeline['original_scene_count']} → {timeline['scene_count']} scenes "
+        f"khớp nhạc {float(audio_duration):.1f}s "
+        f"(split: {actions.count('split')}, merged: {actions.count('merged')})"
+    )
+    state.state["audio_first"] = {
+        "audio_duration": float(audio_duration),
+        "scene_count": timeline["scene_count"],
+    }
+    state.save()
+    return True
 
 def run_pipeline(args):
     """Chạy toàn bộ pipeline."""
@@ -153,6 +290,18 @@ def run_pipeline(args):
     state = PipelineState(args.session_id if hasattr(args, 'session_id') else None)
     output_dir = ensure_output_dirs()
     
+    # Profiling: .prof của orchestrator + từng agent lưu cạnh state session
+    profile_dir = state.state_dir / "profiles" / state.session_id if args.profile else None
+    profiler = None
+    if profile_dir:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    # Resume: giữ spans của các step không chạy lại (run_agent thay spans của step chạy lại)
+    tracer.spans = list(state.state.get("trace", []))
+    state.state["reused_steps"] = []
+    
     print(f"  📋 Session: {state.session_id}")
     print(f"  🔄 Mode: {'DRY-RUN' if args.dry_run else 'PRODUCTION'}")
     print(f"  ▶️  Bắt đầu từ Step: {args.from_step}")
@@ -178,19 +327,24 @@ def run_pipeline(args):
         if hasattr(args, 'category') and args.category:
             step_args.extend(["--category", args.category])
         
-        results[1] = run_agent(1, step_args, state, args.dry_run)
-        
-        # Extract trend file from output or find latest
-        trend_path = None
-        if results[1] and results[1].get("output_file"):
-            trend_path = results[1]["output_file"]
+        stage = plan_stage(1, step_args, state, args, config)
+        if stage["fresh"]:
+            results[1] = {"reused": True}
         else:
-            trend_files = sorted((output_dir / "trends").glob("trend-*.json"), reverse=True)
-            if trend_files:
-                trend_path = str(trend_files[0])
-        if trend_path:
-            state.set_file("trend", trend_path)
-            print(f"  📎 Trend: {trend_path}")
+            results[1] = run_agent(1, step_args, state, args.dry_run, profile_dir)
+            
+            # Extract trend file from output or find latest
+            trend_path = None
+            if results[1] and results[1].get("output_file"):
+                trend_path = results[1]["output_file"]
+            else:
+                trend_files = sorted((output_dir / "trends").glob("trend-*.json"), reverse=True)
+                if trend_files:
+                    trend_path = str(trend_files[0])
+            if trend_path:
+                state.set_file("trend", trend_path)
+                print(f"  📎 Trend: {trend_path}")
+            finish_stage(stage, state, args, {"trend": state.get_file("trend")})
     
     # ── Step 2: Content Creator ──
     if args.from_step <= 2:
@@ -199,22 +353,33 @@ def run_pipeline(args):
         print(f"{'═' * 50}\n")
         
         step_args = ["--duration", str(args.duration), "--style", args.style]
+        artifacts = {}
         if args.topic:
             step_args.extend(["--topic", args.topic])
         else:
             trend_path = state.get_file("trend")
             if trend_path:
                 step_args.extend(["--trend", trend_path])
+                artifacts["trend"] = trend_path
         if not args.skip_review:
             step_args.append("--review-prompts")
         
-        results[2] = run_agent(2, step_args, state, args.dry_run)
-        
-        # Find latest script file
-        script_files = sorted((output_dir / "scripts").glob("script-*.json"), reverse=True)
-        if script_files:
-            state.set_file("script", str(script_files[0]))
-            print(f"  📎 Script: {script_files[0]}")
+        stage = plan_stage(2, step_args, state, args, config, artifacts)
+        if stage["fresh"]:
+            results[2] = {"reused": True}
+        else:
+            results[2] = run_agent(2, step_args, state, args.dry_run, profile_dir)
+            
+            # Script file từ agent output, hoặc bản mới nhất (bỏ qua bản re-plan audio-first)
+            script_path = results[2].get("output_file") if results[2] else None
+            if not script_path:
+                script_files = sorted((f for f in (output_dir / "scripts").glob("script-*.json")
+                                       if not f.stem.endswith("-audio-first")), reverse=True)
+                script_path = str(script_files[0]) if script_files else None
+            if script_path:
+                state.set_file("script", script_path)
+                print(f"  📎 Script: {script_path}")
+            finish_stage(stage, state, args, {"script": state.get_file("script")})
     
     # ── Step 3: Music Maker ──
     if args.from_step <= 3:
@@ -227,25 +392,35 @@ def run_pipeline(args):
         if script_path:
             step_args.extend(["--script", script_path])
         
-        results[3] = run_agent(3, step_args, state, args.dry_run)
-        
-        # Extract actual audio path from agent output
-        if results[3]:
-            audio_file = results[3].get("audio_file")
-            if audio_file:
-                state.set_file("audio", audio_file)
-                print(f"  📎 Audio: {audio_file}")
-            # Store actual duration for Agent 4
-            actual_dur = results[3].get("actual_duration")
-            if actual_dur:
-                state.set_file("audio_duration", str(actual_dur))
-        
-        # Fallback: find latest audio file
-        if not state.get_file("audio"):
-            audio_files = sorted((output_dir / "audio").glob("*.mp3"), reverse=True)
-            if audio_files:
-                state.set_file("audio", str(audio_files[0]))
-                print(f"  📎 Audio (fallback): {audio_files[0]}")
+        stage = plan_stage(3, step_args, state, args, config, {"script": script_path})
+        if stage["fresh"]:
+            results[3] = {"reused": True}
+        else:
+            results[3] = run_agent(3, step_args, state, args.dry_run, profile_dir)
+            
+            # Extract actual audio path from agent output
+            if results[3]:
+                audio_file = results[3].get("audio_file")
+                if audio_file:
+                    state.set_file("audio", audio_file)
+                    print(f"  📎 Audio: {audio_file}")
+                # Store actual duration for Agent 4
+                actual_dur = results[3].get("actual_duration")
+                if actual_dur:
+                    state.set_file("audio_duration", str(actual_dur))
+            
+            # Fallback: find latest audio file
+            if not state.get_file("audio"):
+                audio_files = sorted((output_dir / "audio").glob("*.mp3"), reverse=True)
+                if audio_files:
+                    state.set_file("audio", str(audio_files[0]))
+                    print(f"  📎 Audio (fallback): {audio_files[0]}")
+            finish_stage(stage, state, args, {"audio": state.get_file("audio")})
+    
+    # ── Audio-first: re-plan scenes theo nhạc thật trước khi gọi Veo ──
+    if args.audio_first and args.from_step <= 4:
+        with tracer.span("replan:audio-first"):
+            replan_from_audio(state)
     
     # ── Step 4: Video Maker ──
     if args.from_step <= 4:
@@ -254,7 +429,7 @@ def run_pipeline(args):
         print(f"{'═' * 50}\n")
         
         step_args = []
-        script_path = state.get_file("script")
+        script_path = planned_script(state, args)
         if script_path:
             step_args.extend(["--script", script_path])
         
@@ -262,14 +437,23 @@ def run_pipeline(args):
         if audio_path:
             step_args.extend(["--music", audio_path])
         
-        results[4] = run_agent(4, step_args, state, args.dry_run)
-        
-        # Extract clips_dir from agent output
-        if results[4]:
-            clips_dir = results[4].get("clips_dir")
+        stage = plan_stage(4, step_args, state, args, config, {"script": script_path, "audio": audio_path})
+        if stage["fresh"]:
+            results[4] = {"reused": True}
+        else:
+            results[4] = run_agent(4, step_args, state, args.dry_run, profile_dir)
+            
+            # Extract clips_dir from agent output, or find latest
+            clips_dir = results[4].get("clips_dir") if results[4] else None
+            if not clips_dir and not args.dry_run:
+                clips_base = output_dir / "clips"
+                clip_dirs = sorted((d for d in clips_base.iterdir() if d.is_dir()), reverse=True) \
+                    if clips_base.exists() else []
+                clips_dir = str(clip_dirs[0]) if clip_dirs else None
             if clips_dir:
                 state.set_file("clips_dir", clips_dir)
                 print(f"  📎 Clips: {clips_dir}")
+            finish_stage(stage, state, args, {"clips_dir": state.get_file("clips_dir")})
     
     # ── Step 5: Video Aggregator ──
     if args.from_step <= 5:
@@ -292,14 +476,44 @@ def run_pipeline(args):
         if audio_path:
             step_args.extend(["--audio", audio_path])
         
-        script_path = state.get_file("script")
+        script_path = planned_script(state, args)
         if script_path:
             step_args.extend(["--script", script_path])
         
+        if args.render_profile:
+            step_args.extend(["--render-profile", args.render_profile])
+        if args.renditions:
+            step_args.extend(["--renditions", args.renditions])
+        
         if args.send_telegram:
             step_args.append("--send-telegram")
         
-        results[5] = run_agent(5, step_args, state, args.dry_run)
+        stage = plan_stage(5, step_args, state, args, config,
+                           {"clips_dir": clips_dir, "audio": audio_path, "script": script_path})
+        if stage["fresh"]:
+            results[5] = {"reused": True}
+        else:
+            results[5] = run_agent(5, step_args, state, args.dry_run, profile_dir)
+            
+            outputs = {}
+            profile = (results[5] or {}).get("render_profile") or args.render_profile \
+                or config.get("render_profile") or "standard"
+            final_video = (results[5] or {}).get("final_video")
+            if not final_video and state.get_step(5).get("status") == "completed" and not args.dry_run:
+                # Fallback: bản master mới nhất của profile (final-YYYYMMDD-HHMMSS[-profile].mp4)
+                suffix = "" if profile == "standard" else f"-{profile}"
+                finals = sorted(p for p in (output_dir / "final").glob("final-*.mp4")
+                                if re.fullmatch(rf"final-\d{{8}}-\d{{6}}{suffix}\.mp4", p.name))
+                final_video = str(finals[-1]) if finals else None
+            if final_video:
+                state.set_file(f"final_video_{profile}", final_video)
+                outputs[f"final_video_{profile}"] = final_video
+                print(f"  📎 Final ({profile}): {final_video}")
+            finish_stage(stage, state, args, outputs)
+    
+    if profiler:
+        profiler.disable()
+        save_profile_report(state, profile_dir, profiler)
     
     # ── Summary ──
     print(f"\n{'━' * 50}")
@@ -312,8 +526,23 @@ def run_pipeline(args):
         step_state = state.get_step(step_num)
         status = step_state.get("status", "skipped")
         icon = "✅" if status == "completed" else "❌" if status == "failed" else "⏭️"
+        if step_num in state.state.get("reused_steps", []):
+            icon, status = "♻️ ", f"{status} (inputs không đổi, dùng lại)"
         print(f"  {icon} Step {step_num}: {agent['name']} — {status}")
     
+    print_trace_summary(state.state.get("trace_summary", {}))
+    if state.state.get("profile"):
+        print_report(load_json(state.state["profile"]["report"]))
+        print(f"  🔬 Profiles: {state.state['profile']['dir']}")
+    
+    # ── Metrics: cập nhật counters/histograms + export Prometheus textfile ──
+    if not args.dry_run:
+        try:
+            prom_path, _ = record_pipeline_metrics(state, textfile=config.get("metrics_textfile") or None)
+            print(f"\n  📈 Metrics: {prom_path}")
+        except OSError as e:
+            print_warning(f"Không ghi được metrics: {e}")
+    
     print(f"\n  📁 Output: {output_dir}")
     print(f"  📁 State: {state.state_file}")
     print(f"{'━' * 50}\n")
@@ -367,10 +596,28 @@ def main():
     parser.add_argument("--category", choices=["music_dance", "education", "characters", "general"])
     parser.add_argument("--skip-review", action="store_true")
     parser.add_argument("--send-telegram", action="store_true")
+    parser.add_argument("--audio-first", action="store_true",
+                       help="Re-plan scenes theo độ dài nhạc thật trước khi gọi Veo")
+    parser.add_argument("--render-profile", choices=["draft", "standard", "final"],
+                       help="Profile render cho Agent 5 (draft = 480p nhanh để review)")
+    parser.add_argument("--renditions", default="",
+                       help="Bản phụ cho Agent 5: shorts,telegram (xuất cùng 1 lần decode)")
+    parser.add_argument("--promote", action="store_true",
+                       help="Render lại session đã review ở profile final (chỉ chạy Step 5)")
+    parser.add_argument("--profile", action="store_true",
+                       help="cProfile orchestrator + từng agent, báo cáo top hot spot / thời gian chờ")
+    parser.add_argument("--force", action="store_true",
+                       help="Chạy lại mọi step, bỏ qua fingerprint inputs")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--json", action="store_true")
     args = parser.parse_args()
     
+    if args.promote:
+        if not args.session_id:
+            parser.error("--promote cần --session SESSION_ID của bản draft")
+        args.from_step = 5
+        args.render_profile = "final"
+    
     run_pipeline(args)
 
 if __name__ == "__main__":
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+🎞️ MyShort — FFmpeg Runner
+Chạy ffmpeg với `-progress pipe:1` thay vì subprocess.run(capture_output=True).
+
+- Đọc progress từng block → fps / speed / ETA (log ra stderr, callback, span)
+- Stderr chỉ giữ head (banner + Duration) + tail (lỗi) → bộ nhớ cố định
+- Timeout theo stall: chỉ kill khi out_time không tăng trong `stall_timeout`
+  giây (encode dài nhưng vẫn chạy đều không bị kill)
+- Kết quả ghi vào span tracing (CPU / max RSS qua wait4, progress cuối, stall)
+"""
+
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+
+from tracing import get_tracer, wait_child
+
+DEFAULT_STALL_TIMEOUT = float(os.environ.get("FFMPEG_STALL_TIMEOUT", "60"))
+HEAD_LINES = 40
+TAIL_LINES = 60
+LOG_INTERVAL = 10  # giây giữa 2 dòng log progress
+
+DURATION_RE = re.compile(r"Duration: (\d{2}):(\d{2}):(\d{2})\.(\d{2})")
+
+
+def parse_duration(text):
+    """'Duration: 00:01:02.50' → 62.5 (None nếu không có)."""
+    match = DURATION_RE.search(text or "")
+    if not match:
+        return None
+    h, m, s, cs = (int(g) for g in match.groups())
+    return h * 3600 + m * 60 + s + cs / 100.0
+
+
+def _parse_out_time(block):
+    for key in ("out_time_us", "out_time_ms"):  # out_time_ms thực ra cũng là micro giây
+        value = block.get(key, "")
+        if value.lstrip("-").isdigit():
+            return max(int(value), 0) / 1_000_000
+    return None
+
+
+def _parse_speed(value):
+    try:
+        return float((value or "").rstrip("x"))
+    except ValueError:
+        return None
+
+
+class FFmpegProgress:
+    """Trạng thái progress mới nhất (cập nhật mỗi block progress=continue/end)."""
+
+    def __init__(self, duration=None):
+        self.duration = duration
+        self.out_time = 0.0
+        self.fps = None
+        self.speed = None
+        self.frame = 0
+        self.total_size = 0
+        self.done = False
+        self.last_advance = time.monotonic()
+        self.max_gap = 0.0
+
+    def update(self, block):
+        now = time.monotonic()
+        out_time = _parse_out_time(block)
+        if out_time is not None and out_time > self.out_time:
+            self.max_gap = max(self.max_gap, now - self.last_advance)
+            self.out_time = out_time
+            self.last_advance = now
+        self.fps = _parse_speed(block.get("fps")) or self.fps
+        self.speed = _parse_speed(block.get("speed")) or self.speed
+        frame = block.get("frame", "")
+        self.frame = int(frame) if frame.isdigit() else self.frame
+        size = block.get("total_size", "")
+        self.total_size = int(size) if size.isdigit() else self.total_size
+        self.done = block.get("progress") == "end"
+
+    @property
+    def percent(self):
+        if not self.duration:
+            return None
+        return min(self.out_time / self.duration * 100, 100.0)
+
+    @property
+    def eta(self):
+        if not self.duration or not self.speed:
+            return None
+        return max(self.duration - self.out_time, 0) / self.speed
+
+    def as_dict(self):
+        return {
+            "out_time": round(self.out_time, 3),
+            "duration": self.duration,
+            "percent": round(self.percent, 1) if self.percent is not None else None,
+            "fps": self.fps,
+            "speed": self.speed,
+            "frame": self.frame,
+            "total_size": self.total_size,
+            "eta": round(self.eta, 1) if self.eta is not None else None,
+            "max_stall_gap": round(self.max_gap, 2),
+        }
+
+    def describe(self):
+        parts = [f"{self.out_time:.1f}s"]
+        if self.percent is not None:
+            parts[0] += f"/{self.duration:.1f}s ({self.percent:.0f}%)"
+        if self.fps:
+            parts.append(f"fps={self.fps:.0f}")
+        if self.speed:
+            parts.append(f"speed={self.speed:.2f}x")
+        if self.eta is not None:
+            parts.append(f"ETA {self.eta:.0f}s")
+        return " ".join(parts)
+
+
+class _StderrBuffer:
+    """Giữ HEAD_LINES dòng đầu + TAIL_LINES dòng cuối của stderr."""
+
+    def __init__(self, head=HEAD_LINES, tail=TAIL_LINES):
+        self.head = []
+        self.tail = deque(maxlen=tail)
+        self.head_limit = head
+        self.dropped = 0
+
+    def add(self, line):
+        if len(self.head) < self.head_limit:
+            self.head.append(line)
+        else:
+            if len(self.tail) == self.tail.maxlen:
+                self.dropped += 1
+            self.tail.append(line)
+
+    def text(self):
+        middle = [f"... ({self.dropped} dòng bị bỏ) ..."] if self.dropped else []
+        return "".join(self.head + middle + list(self.tail))
+
+
+def run_ffmpeg(cmd, name="ffmpeg", duration=None, stall_timeout=None, timeout=None,
+               on_progress=None, logger=None, tracer=None, **attrs):
+    """
+    Chạy 1 lệnh ffmpeg với progress + stall detection.
+
+    cmd: [ffmpeg_path, ...] (không cần -progress, runner tự thêm)
+    duration: độ dài output dự kiến (giây) để tính % / ETA — None → lấy từ
+              "Duration:" của input đầu tiên
+    stall_timeout: kill nếu không có tiến triển trong N giây (mặc định FFMPEG_STALL_TIMEOUT)
+    timeout: giới hạn tổng (tùy chọn, mặc định không giới hạn)
+    on_progress: callback(progress_dict) mỗi block progress
+
+    Returns: subprocess.CompletedProcess (stdout="", stderr=head+tail).
+    Raises: subprocess.TimeoutExpired khi stall/timeout, FileNotFoundError nếu không có ffmpeg.
+    """
+    tracer = tracer or get_tracer()
+    stall_timeout = stall_timeout or DEFAULT_STALL_TIMEOUT
+    cmd = [str(c) for c in cmd]
+    full_cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + cmd[1:]
+
+    with tracer.span(name, **attrs) as span:
+        proc = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, errors="replace", bufsize=1)
+        progress = FFmpegProgress(duration)
+        stderr = _StderrBuffer()
+        killed = {}
+        finished = threading.Event()
+        start = time.monotonic()
+
+        def _read_stderr():
+            for line in proc.stderr:
+                stderr.add(line)
+                if progress.duration is None and "Duration:" in line:
+                    progress.duration = parse_duration(line)
+            proc.stderr.close()
+
+        def _watchdog():
+            while not finished.wait(1.0):
+                now = time.monotonic()
+                if now - progress.last_advance > stall_timeout:
+                    killed["reason"] = f"stall {stall_timeout:.0f}s"
+                elif timeout and now - start > timeout:
+                    killed["reason"] = f"timeout {timeout:.0f}s"
+                else:
+                    continue
+                proc.kill()
+                return
+
+        reader = threading.Thread(target=_read_stderr, daemon=True)
+        watchdog = threading.Thread(target=_watchdog, daemon=True)
+        reader.start()
+        watchdog.start()
+
+        block = {}
+        last_log = start
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if not key:
+                continue
+            block[key] = value
+            if key != "progress":
+                continue
+            progress.update(block)
+            block = {}
+            if on_progress:
+                on_progress(progress.as_dict())
+            now = time.monotonic()
+            if logger and now - last_log >= LOG_INTERVAL:
+                logger.info(f"⏳ {name}: {progress.describe()}")
+                last_log = now
+        proc.stdout.close()
+
+        usage = wait_child(proc)
+        finished.set()
+        reader.join()
+        span.record_rusage(usage)
+        span.add_bytes(bytes_out=progress.total_size)
+        span.set(returncode=proc.returncode, progress=progress.as_dict(),
+                 elapsed=round(time.monotonic() - start, 3))
+
+        stderr_text = stderr.text()
+        if killed:
+            span.set(killed=killed["reason"])
+            raise subprocess.TimeoutExpired(full_cmd, stall_timeout if "stall" in killed["reason"] else timeout,
+                                            stderr=stderr_text)
+        return subprocess.CompletedProcess(full_cmd, proc.returncode, "", stderr_text)
+
+
+def probe_duration(file_path, ffmpeg_path="ffmpeg", stall_timeout=15):
+    """
+    Đo duration thật của file media (decode hết → chính xác cả với MP3 VBR).
+    Ưu tiên out_time cuối của progress, fallback header "Duration:".
+    """
+    cmd = [ffmpeg_path, "-hide_banner", "-i", str(file_path), "-f", "null", "-"]
+    last = {}
+    result = run_ffmpeg(cmd, name="ffmpeg:probe", stall_timeout=stall_timeout,
+                        on_progress=last.update)
+    decoded = last.get("out_time") if result.returncode == 0 else None
+    return decoded or parse_duration(result.stderr)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+🧮 MyShort — Incremental Pipeline (kiểu make)
+Mỗi step khai báo inputs → fingerprint; chạy lại session thì step nào có
+fingerprint khớp + outputs còn trên đĩa được bỏ qua, chỉ chạy lại chuỗi
+step phía sau bị ảnh hưởng.
+
+Inputs của 1 step:
+- args truyền cho agent (đường dẫn artifact được thay bằng tên artifact)
+- hash nội dung artifact upstream (trend / script / audio / clips_dir)
+- config liên quan (model LLM, render profile, ...)
+- hash code của agent + các module shared/*.py nó import (sửa code → chạy lại)
+
+Outputs chỉ ghi khi file/thư mục có thật trên đĩa; step không có output nào
+không được coi là mới.
+
+Fingerprint + outputs lưu trong PipelineState: state["fingerprints"][step].
+"""
+
+import ast
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+SHARED_DIR = Path(__file__).resolve().parent
+
+# Config ảnh hưởng tới output của từng step
+STAGE_CONFIG = {
+    1: ("tavily_api_url",),
+    2: ("llm_provider", "llm_model"),
+    3: ("suno_api_url",),
+    4: ("google_project", "google_location", "video_resolution"),
+    5: ("ffmpeg_path", "render_profile"),
+}
+
+_hash_memo = {}
+_imports_memo = {}
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA1 nội dung file (memo theo size + mtime trong cùng process)."""
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def hash_path(path):
+    """
+    Hash artifact: file → nội dung; thư mục → (tên, hash) các file bên trong.
+    Returns: hex digest, hoặc None nếu không tồn tại.
+    """
+    if not path:
+        return None
+    path = Path(path)
+    if path.is_file():
+        return hash_file(path)
+    if path.is_dir():
+        digest = hashlib.sha1()
+        for child in sorted(p for p in path.rglob("*") if p.is_file() and not p.name.startswith(".")):
+            digest.update(f"{child.relative_to(path)}:{hash_file(child)}\n".encode())
+        return digest.hexdigest()
+    return None
+
+
+def imported_modules(path):
+    """Tên module top-level mà file .py import (memo theo size + mtime)."""
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _imports_memo:
+        names = set()
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"), str(path))):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.add(node.module.split(".")[0])
+        _imports_memo[memo_key] = names
+    return _imports_memo[memo_key]
+
+
+def hash_code(code_path):
+    """
+    Hash script agent + mọi module shared/*.py nó import (đệ quy).
+    Returns: {"<tên script>" | "shared/<module>.py": hash}, {} nếu không có script.
+    """
+    if not code_path or not Path(code_path).is_file():
+        return {}
+    code_path = Path(code_path)
+    hashes = {code_path.name: hash_file(code_path)}
+    queue = [code_path]
+    while queue:
+        for name in imported_modules(queue.pop()):
+            module = SHARED_DIR / f"{name}.py"
+            key = f"shared/{module.name}"
+            if key not in hashes and module.is_file():
+                hashes[key] = hash_file(module)
+                queue.append(module)
+    return dict(sorted(hashes.items()))
+
+
+def stage_inputs(step_num, args, artifacts=None, config=None, code_path=None):
+    """
+    Khai báo inputs của 1 step.
+    artifacts: {tên: đường dẫn} — file/thư mục upstream mà step đọc
+    Returns: dict inputs (mỗi giá trị đã rút gọn thành hash / giá trị nhỏ)
+    """
+    artifacts = {k: v for k, v in (artifacts or {}).items() if v}
+    by_path = {str(v): k for k, v in artifacts.items()}
+    config = config or {}
+    return {
+        # Đường dẫn đổi (file mới cùng nội dung) không làm step chạy lại
+        "args": [f"@{by_path[a]}" if a in by_path else a for a in map(str, args)],
+        "artifacts": {k: hash_path(v) for k, v in sorted(artifacts.items())},
+        "config": {k: config.get(k) for k in STAGE_CONFIG.get(step_num, ())},
+        "code": hash_code(code_path),
+    }
+
+
+def fingerprint(inputs):
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def diff_inputs(old, new):
+    """Liệt kê input đã đổi, vd. ['artifacts.script', 'args']."""
+    changed = []
+    for section in ("args", "artifacts", "config", "code"):
+        a, b = (old or {}).get(section), new.get(section)
+        if isinstance(b, dict):
+            a = a if isinstance(a, dict) else {}
+            changed += [f"{section}.{k}" for k in sorted(set(a) | set(b)) if a.get(k) != b.get(k)]
+        elif a != b:
+            changed.append(section)
+    return changed
+
+
+def stale_reason(state, step_num, inputs):
+    """
+    None nếu step còn mới (fingerprint khớp, step completed, outputs còn).
+    Ngược lại: lý do phải chạy lại (str).
+    """
+    record = state.state.get("fingerprints", {}).get(str(step_num))
+    if not record:
+        return "chưa có fingerprint"
+    if state.get_step(step_num).get("status") != "completed":
+        return "lần trước chưa hoàn thành"
+    if record.get("fingerprint") != fingerprint(inputs):
+        return "inputs đổi: " + ", ".join(diff_inputs(record.get("inputs"), inputs) or ["?"])
+    if not record.get("outputs"):
+        return "lần trước không ghi được output"
+    missing = [name for name, out in record["outputs"].items() if not Path(out["path"]).exists()]
+    if missing:
+        return "thiếu output: " + ", ".join(missing)
+    return None
+
+
+def record_stage(state, step_num, inputs, outputs):
+    """
+    Ghi fingerprint + outputs ({tên: đường dẫn}) của step vừa chạy xong.
+    Chỉ ghi output có thật trên đĩa; không còn output nào → bỏ fingerprint cũ
+    (lần sau step chạy lại). Returns: dict outputs đã ghi.
+    """
+    recorded = {name: {"path": str(path), "hash": hash_path(path)}
+                for name, path in outputs.items() if path and Path(path).exists()}
+    fingerprints = state.state.setdefault("fingerprints", {})
+    if not recorded:
+        fingerprints.pop(str(step_num), None)
+        state.save()
+        return recorded
+    fingerprints[str(step_num)] = {
+        "fingerprint": fingerprint(inputs),
+        "inputs": inputs,
+        "outputs": recorded,
+        "recorded_at": datetime.now().isoformat(),
+    }
+    state.save()
+    return recorded
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+🧩 MyShort — Incremental JSON Parser
+Parse JSON object lớn từ LLM theo từng chunk stream (SSE): mỗi value hoàn
+chỉnh ở độ sâu ≤ max_depth được emit ngay — vd. "lyrics", "music_direction",
+từng phần tử "scenes[i]" — không đợi model sinh xong toàn bộ response.
+
+- 1 lần quét (linear), nhảy bằng regex tới ký tự cấu trúc kế tiếp
+- Tôn trọng string + escape (dấu { } trong lời bài hát không làm lệch độ sâu)
+- Buffer là bytearray UTF-8: ký tự cấu trúc JSON đều là ASCII nên quét byte an toàn
+- Lấy object ngoài cùng cân bằng đầu tiên (bỏ qua markdown fence / text thừa)
+- Sửa lỗi hay gặp của LLM: dấu phẩy thừa, response bị cắt cụt (đóng string/ngoặc)
+
+Usage:
+    parser = JsonStreamParser(on_value=lambda path, value: print(path, value))
+    for chunk in stream:
+        parser.feed(chunk)
+    script = parser.close()
+
+    script = extract_json(response_text)    # 1 lần, không stream
+"""
+
+import json
+import re
+
+_STRUCT_RE = re.compile(rb'[{}\[\]",:]|[-0-9tfn]')
+_STRING_RE = re.compile(rb'["\\]')
+_LITERAL_END_RE = re.compile(rb'[,}\]\s]')
+
+_TOKEN_RE = re.compile(r'[{}\[\],:"]|[^\s{}\[\],:"]+')
+_STR_END_RE = re.compile(r'["\\]')
+_PARTIAL_ESCAPE_RE = re.compile(r'(?<!\\)((?:\\\\)*)\\(?:u[0-9a-fA-F]{0,3})?$')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _read_string(text, start):
+    """Vị trí sau dấu " đóng của string bắt đầu tại start (None nếu bị cắt cụt)."""
+    pos = start + 1
+    while True:
+        match = _STR_END_RE.search(text, pos)
+        if not match:
+            return None
+        if text[match.start()] == "\\":
+            pos = match.start() + 2
+            continue
+        return match.end()
+
+
+def repair_json(text):
+    """
+    Sửa JSON (bắt đầu bằng object/array gốc) trong 1 lần quét:
+    - Bỏ dấu phẩy thừa trước } ] và dấu phẩy lặp
+    - Bị cắt cụt: đóng string đang mở, key thiếu value → null, đóng các ngoặc còn mở
+    Phần text sau khi object gốc đóng bị bỏ qua.
+    """
+    out = []
+    stack = []
+    state = None          # "key" | "colon" | "value" | "after"
+    pending_comma = False
+    pos, end = 0, len(text)
+
+    def _value_token(token):
+        nonlocal pending_comma
+        if pending_comma:
+            out.append(",")
+            pending_comma = False
+        out.append(token)
+
+    while pos < end:
+        match = _TOKEN_RE.search(text, pos)
+        if not match:
+            break
+        token = match.group(0)
+        pos = match.end()
+
+        if token == '"':
+            close = _read_string(text, match.start())
+            if close is None:  # string bị cắt cụt: bỏ escape dở dang rồi đóng
+                body = _PARTIAL_ESCAPE_RE.sub(r"\1", text[match.start():])
+                _value_token(body + '"')
+                pos = end
+            else:
+                _value_token(text[match.start():close])
+                pos = close
+            is_key = stack and stack[-1] == "{" and state == "key"
+            state = "colon" if is_key else "after"
+        elif token in ("{", "["):
+            _value_token(token)
+            stack.append(token)
+            state = "key" if token == "{" else "value"
+        elif token in ("}", "]"):
+            if not stack:
+                continue
+            pending_comma = False
+            if state == "colon":
+                out.append(":null")
+            elif state == "value" and stack[-1] == "{":
+                out.append("null")
+            out.append(_CLOSERS[stack.pop()])
+            state = "after"
+            if not stack:
+                return "".join(out)
+        elif token == ",":
+            if state == "after":
+                pending_comma = True
+                state = "key" if stack and stack[-1] == "{" else "value"
+        elif token == ":":
+            out.append(":")
+            state = "value"
+        else:
+            if pos >= end:  # literal bị cắt cụt (vd. "tru", "12.")
+                try:
+                    json.loads(token)
+                except json.JSONDecodeError:
+                    token = "null"
+            _value_token(token)
+            state = "after"
+
+    if state == "colon":
+        out.append(":null")
+    elif state == "value" and stack and stack[-1] == "{":
+        out.append("null")
+    out.extend(_CLOSERS[b] for b in reversed(stack))
+    return "".join(out)
+
+
+def _loads(text):
+    """json.loads, lỗi thì thử repair_json. Returns: (ok, value)."""
+    try:
+        return True, json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return True, json.loads(repair_json(text))
+    except json.JSONDecodeError:
+        return False, None
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind, path, start):
+        self.kind = kind          # "{" | "["
+        self.path = path
+        self.start = start
+        self.key = None
+        self.index = 0
+        self.expect_key = kind == "{"
+
+
+class JsonStreamParser:
+    """
+    on_value(path, value): path là tuple key/index, vd. ("scenes", 3), ("lyrics",).
+    Callback có thể raise để dừng stream sớm (vd. vi phạm an toàn) — exception
+    được truyền thẳng ra feed().
+    """
+
+    def __init__(self, on_value=None, max_depth=2):
+        self.on_value = on_value
+        self.max_depth = max_depth
+        self.buf = bytearray()
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.string_start = None
+        self.literal_start = None
+        self.value_start = None   # vị trí bắt đầu value string/literal đang đọc
+        self.root = None
+        self.root_start = None
+        self.emitted = 0
+        self.repaired = False
+
+    # ── Public ──
+
+    def feed(self, chunk):
+        """Thêm 1 chunk text; emit các value vừa hoàn chỉnh."""
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        self.buf += chunk
+        self._scan()
+
+    def close(self, repair=True):
+        """
+        Kết thúc stream. Returns: object gốc.
+        Stream bị cắt cụt (chưa đóng đủ ngoặc) → repair_json phần đã nhận (repair=True).
+        """
+        if self.root is None and repair and self.root_start is not None:
+            ok, value = _loads(self.buf[self.root_start:].decode("utf-8", errors="replace"))
+            if ok and isinstance(value, dict):
+                self.root = value
+                self.repaired = True
+        return self.root
+
+    @property
+    def done(self):
+        return self.root is not None
+
+    @property
+    def text(self):
+        return self.buf.decode("utf-8", errors="replace")
+
+    # ── Scanner ──
+
+    def _value_path(self):
+        if not self.stack:
+            return ()
+        frame = self.stack[-1]
+        return frame.path + ((frame.key,) if frame.kind == "{" else (frame.index,))
+
+    def _emit(self, path, start, end):
+        if len(path) > self.max_depth and path:
+            return
+        ok, value = _loads(self.buf[start:end].decode("utf-8", errors="replace"))
+        if not path:
+            if not ok:
+                # "{...}" không phải JSON (vd. text trước object thật) → tìm object kế tiếp
+                self.root_start = None
+                return
+            self.root = value
+        elif not ok:
+            return
+        if self.on_value:
+            self.emitted += 1
+            self.on_value(path, value)
+
+    def _scan(self):
+        buf = self.buf
+        end = len(buf)
+        while self.pos < end and self.root is None:
+            if self.in_string:
+                match = _STRING_RE.search(buf, self.pos)
+                if not match:
+                    self.pos = end
+                    return
+                i = match.start()
+                if buf[i] == 0x5C:  # backslash: bỏ qua ký tự kế tiếp
+                    if i + 1 >= end:
+                        self.pos = i  # chờ chunk sau
+                        return
+                    self.pos = i + 2
+                    continue
+                self.in_string = False
+                self.pos = i + 1
+                self._string_done(self.string_start, i + 1)
+                continue
+
+            if self.literal_start is not None:
+                match = _LITERAL_END_RE.search(buf, self.pos)
+                if not match:
+                    self.pos = end
+                    return
+                start, self.literal_start = self.literal_start, None
+                self.pos = match.start()
+                self._emit(self._value_path(), start, match.start())
+                continue
+
+            if not self.stack:
+                # Ngoài object gốc: chỉ tìm "{" (bỏ qua fence / text giải thích của LLM)
+                i = buf.find(b"{", self.pos)
+                if i < 0:
+                    self.pos = end
+                    return
+                self.pos = i + 1
+                self.root_start = i
+                self.stack.append(_Frame("{", (), i))
+                continue
+
+            match = _STRUCT_RE.search(buf, self.pos)
+            if not match:
+                self.pos = end
+                return
+            i = match.start()
+            c = buf[i]
+            self.pos = i + 1
+            frame = self.stack[-1] if self.stack else None
+
+            if c == 0x22:  # "
+                self.in_string = True
+                self.string_start = i
+            elif c in (0x7B, 0x5B):  # { [
+                path = self._value_path()
+                self.stack.append(_Frame("{" if c == 0x7B else "[", path, i))
+            elif c in (0x7D, 0x5D):  # } ]
+                self.stack.pop()
+                self._emit(frame.path, frame.start, i + 1)
+            elif c == 0x3A:  # :
+                if frame and frame.kind == "{":
+                    frame.expect_key = False
+            elif c == 0x2C:  # ,
+                if frame:
+                    if frame.kind == "{":
+                        frame.expect_key = True
+                    else:
+                        frame.index += 1
+            else:  # bắt đầu number / true / false / null
+                self.literal_start = i
+
+    def _string_done(self, start, end):
+        frame = self.stack[-1] if self.stack else None
+        if frame is None:
+            return
+        if frame.kind == "{" and frame.expect_key:
+            try:
+                frame.key = json.loads(self.buf[start:end].decode("utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                frame.key = None
+            return
+        self._emit(self._value_path(), start, end)
+
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(text):
+    """
+    Lấy object JSON ngoài cùng đầu tiên trong response LLM (1 lần quét),
+    có sửa dấu phẩy thừa / tail bị cắt cụt. Returns: dict hoặc None.
+    """
+    # Đường nhanh (C): response sạch, có thể kèm fence/text phía sau
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+        return value
+    except json.JSONDecodeError:
+        pass
+    parser = JsonStreamParser(max_depth=0)
+    parser.feed(text)
+    return parser.close()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+🔀 MyShort — LLM Router
+Gọi LLM qua nhiều route (provider:model, vd. gemini:gemini-2.5-flash, openai:gpt-4o-mini):
+
+- Hedging: route đang chạy chưa trả lời sau p95 latency của nó → chạy thêm route
+  kế tiếp; lấy kết quả hợp lệ đầu tiên, hủy (cancel event) các request còn lại
+- Failover: route lỗi / trả về None → chuyển ngay sang route kế tiếp
+- Circuit breaker mỗi route: FAILURE_THRESHOLD lỗi liên tiếp → bỏ qua route trong
+  COOLDOWN giây, sau đó cho thử lại (half-open: lỗi tiếp → mở lại ngay)
+- Tiered: đếm số bản nháp model nhanh phải chuyển lên model mạnh (escalation rate)
+- Thống kê ok/lỗi/thắng/hedge theo route; latency (p50/p95, dùng cho hedge) theo
+  route + loại lời gọi (kịch bản đầy đủ / dàn ý / batch scenes / sửa an toàn — độ dài
+  output khác hẳn nhau). Lưu qua nhiều lần chạy: OUTPUT_DIR/metrics/llm-routes.json
+  (khóa flock khi nhiều agent chạy song song)
+
+Usage:
+    router = get_router()
+    result = router.call(routes, lambda route, cancel: call_provider(route, cancel), kind="script")
+    python3 llm_router.py              # Xem thống kê route
+    python3 llm_router.py --self-test  # Kiểm tra hedge delay theo kind (state tạm)
+"""
+
+import fcntl
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import get_metrics_dir
+
+DEFAULT_HEDGE_SECONDS = 45   # chưa đủ mẫu latency → chờ bấy nhiêu giây rồi mới hedge
+MIN_SAMPLES = 5
+WINDOW = 200                 # số mẫu latency gần nhất giữ lại mỗi route
+FAILURE_THRESHOLD = 3
+COOLDOWN = 300
+DEFAULT_KIND = "call"
+
+
+def route_key(route):
+    """{"provider": "gemini", "model": "gemini-2.5-flash"} → "gemini:gemini-2.5-flash"."""
+    return f"{route['provider']}:{route['model']}"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+class LLMRouter:
+    """Hedging + failover + circuit breaker; state dùng chung giữa các thread và process."""
+
+    def __init__(self, path=None, hedge_seconds=DEFAULT_HEDGE_SECONDS,
+                 failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.path = Path(path or get_metrics_dir() / "llm-routes.json")
+        self.hedge_seconds = hedge_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    # ── State ──
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"routes": {}}
+
+    @contextmanager
+    def _update(self):
+        """Đọc → sửa → ghi state dưới lock (thread) + flock (process)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.path.with_name(".llm-routes.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = self._load()
+                yield data
+                tmp = self.path.with_name(f".{self.path.name}.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _route_state(data, key):
+        state = data["routes"].setdefault(key, {
+            "latencies": {}, "ok": 0, "errors": 0, "wins": 0, "hedged": 0,
+            "consecutive_failures": 0, "open_until": 0,
+        })
+        if not isinstance(state.get("latencies"), dict):
+            state["latencies"] = {}   # file cũ: 1 list trộn mọi loại lời gọi → bỏ
+        return state
+
+    @staticmethod
+    def _latencies(state, kind):
+        latencies = state.get("latencies")
+        return latencies.get(kind or DEFAULT_KIND, []) if isinstance(latencies, dict) else []
+
+    def record(self, key, ok, latency=None, won=False, kind=None):
+        with self._update() as data:
+            state = self._route_state(data, key)
+            if ok:
+                state["ok"] += 1
+                state["wins"] += int(won)
+                state["consecutive_failures"] = 0
+                state["open_until"] = 0
+                if latency is not None:
+                    kind = kind or DEFAULT_KIND
+                    state["latencies"][kind] = (self._latencies(state, kind) + [round(latency, 3)])[-WINDOW:]
+            else:
+                state["errors"] += 1
+                state["consecutive_failures"] += 1
+                if state["consecutive_failures"] >= self.failure_threshold:
+                    state["open_until"] = time.time() + self.cooldown
+
+    def record_tier(self, reason=None):
+        """1 bản nháp model nhanh: reason=None → dùng được, ngược lại lý do escalate."""
+        with self._update() as data:
+            tiers = data.setdefault("tiers", {"drafts": 0, "escalated": 0, "reasons": {}})
+            tiers["drafts"] += 1
+            if reason:
+                tiers["escalated"] += 1
+                tiers["reasons"][reason] = tiers["reasons"].get(reason, 0) + 1
+
+    def tier_stats(self):
+        """{drafts, escalated, rate, reasons}"""
+        tiers = self._load().get("tiers", {"drafts": 0, "escalated": 0, "reasons": {}})
+        rate = tiers["escalated"] / tiers["drafts"] if tiers["drafts"] else None
+        return {**tiers, "rate": round(rate, 3) if rate is not None else None}
+
+    def _mark_hedged(self, key):
+        with self._update() as data:
+            self._route_state(data, key)["hedged"] += 1
+
+    def hedge_delay(self, key, data=None, kind=None):
+        """p95 latency của route cho loại lời gọi này (chưa đủ mẫu → hedge_seconds)."""
+        state = (data or self._load())["routes"].get(key, {})
+        latencies = self._latencies(state, kind)
+        if len(latencies) < MIN_SAMPLES:
+            return self.hedge_seconds
+        return percentile(latencies, 95)
+
+    def available(self, routes):
+        """Route có breaker đóng (giữ thứ tự); tất cả đều mở → route sắp mở lại sớm nhất."""
+        data = self._load()
+        now = time.time()
+        states = {route_key(r): data["routes"].get(route_key(r), {}) for r in routes}
+        closed = [r for r in routes if states[route_key(r)].get("open_until", 0) <= now]
+        if closed:
+            return closed
+        return sorted(routes, key=lambda r: states[route_key(r)].get("open_until", 0))[:1]
+
+    def stats(self):
+        """{route: {ok, errors, wins, hedged, breaker, latency: {kind: {p50, p95, samples}}}}"""
+        now = time.time()
+        out = {}
+        for key, state in self._load()["routes"].items():
+            latencies = state.get("latencies") if isinstance(state.get("latencies"), dict) else {}
+            out[key] = {
+                **{k: state.get(k, 0) for k in ("ok", "errors", "wins", "hedged")},
+                "breaker": "open" if state.get("open_until", 0) > now else "closed",
+                "latency": {kind: {"p50": percentile(values, 50), "p95": percentile(values, 95),
+                                   "samples": len(values)}
+                            for kind, values in sorted(latencies.items())},
+            }
+        return out
+
+    # ── Call ──
+
+    def call(self, routes, attempt, is_valid=None, passthrough=(), hedge=True, on_event=None, kind=None):
+        """
+        attempt(route, cancel_event) → kết quả (chạy trong thread riêng mỗi route).
+        is_valid(result): kết quả chấp nhận được (mặc định: khác None)
+        passthrough: exception về nội dung (không phải lỗi provider) → raise ngay cho caller,
+                     hủy các route còn lại, không failover, không tính vào breaker
+        on_event(event, route_key): "start" / "hedge" / "failover" / "win" / "error"
+        kind: loại lời gọi ("script" / "outline" / "scenes" / "repair") — latency + hedge delay
+              thống kê riêng theo route + kind
+
+        Returns: kết quả hợp lệ đầu tiên. Mọi route đều hỏng → raise lỗi cuối (hoặc None).
+        """
+        if not routes:
+            raise ValueError("LLMRouter.call: không có route nào (kiểm tra LLM_ROUTES / LLM_FAST_ROUTES)")
+        is_valid = is_valid or (lambda result: result is not None)
+        on_event = on_event or (lambda event, key: None)
+        pending = list(self.available(routes))
+        data = self._load()
+        results = queue.Queue()
+        cancels = {}
+        running = 0
+        hedge_at = None
+        last_error = None
+
+        def launch(event):
+            nonlocal running, hedge_at
+            route = pending.pop(0)
+            key = route_key(route)
+            cancel = threading.Event()
+            cancels[key] = cancel
+            started = time.monotonic()
+
+            def run():
+                try:
+                    value, error = attempt(route, cancel), None
+                except BaseException as e:
+                    value, error = None, e
+                results.put((key, value, error, time.monotonic() - started))
+
+            threading.Thread(target=run, name=f"llm-{key}", daemon=True).start()
+            running += 1
+            hedge_at = time.monotonic() + self.hedge_delay(key, data, kind) if hedge and pending else None
+            on_event(event, key)
+            if event == "hedge":
+                self._mark_hedged(key)
+
+        launch("start")
+        while running:
+            timeout = max(hedge_at - time.monotonic(), 0) if hedge_at else None
+            try:
+                key, value, error, elapsed = results.get(timeout=timeout)
+            except queue.Empty:
+                launch("hedge")
+                continue
+            running -= 1
+
+            if error is None and is_valid(value):
+                self.record(key, ok=True, latency=elapsed, won=True, kind=kind)
+                for other, cancel in cancels.items():
+                    if other != key:
+                        cancel.set()
+                on_event("win", key)
+                return value
+
+            if isinstance(error, passthrough):
+                # Lỗi nội dung (vd. UnsafeContent): route khác cũng không cứu được → trả cho caller
+                for cancel in cancels.values():
+                    cancel.set()
+                on_event("error", key)
+                raise error
+
+            if error is not None:
+                last_error = error
+            self.record(key, ok=False)
+            on_event("error", key)
+            if pending and not running:
+                launch("failover")
+
+        if last_error is not None:
+            raise last_error
+        return None
+
+
+_router = None
+
+
+def get_router():
+    """Router dùng chung trong process."""
+    global _router
+    if _router is None:
+        _router = LLMRouter(hedge_seconds=float(os.environ.get("LLM_HEDGE_SECONDS", DEFAULT_HEDGE_SECONDS)))
+    return _router
+
+
+def _self_test():
+    """Mẫu latency đã ghi theo kind phải quyết định hedge delay, kể cả bên trong call()."""
+    import tempfile
+    fast, slow = {"provider": "mock", "model": "fast"}, {"provider": "mock", "model": "slow"}
+    with tempfile.TemporaryDirectory() as tmp:
+        router = LLMRouter(path=Path(tmp) / "llm-routes.json", hedge_seconds=45)
+        key = route_key(slow)
+        assert router.hedge_delay(key, kind="script") == 45
+        for latency in (0.1, 0.1, 0.2, 0.2, 0.3):
+            router.record(key, ok=True, latency=latency, kind="script")
+        assert router.hedge_delay(key, kind="script") == 0.3, router.hedge_delay(key, kind="script")
+        assert router.hedge_delay(key, kind="outline") == 45   # kind khác: chưa đủ mẫu
+
+        # slow treo → phải hedge sang fast sau ~p95 của (slow, "script"), không phải 45s
+        events = []
+        attempt = lambda route, cancel: None if route is slow and cancel.wait(10) else route["model"]
+        started = time.monotonic()
+        result = router.call([slow, fast], attempt, kind="script",
+                             on_event=lambda event, k: events.append((event, k)))
+        elapsed = time.monotonic() - started
+        assert result == "fast" and ("hedge", route_key(fast)) in events, (result, events)
+        assert elapsed < 5, f"hedge sau {elapsed:.1f}s — không dùng latency của kind 'script'"
+        assert len(LLMRouter._latencies(router._load()["routes"][route_key(fast)], "script")) == 1
+    print("✅ llm_router self-test OK")
+
+
+if __name__ == "__main__":
+    if "--self-test" in sys.argv:
+        _self_test()
+        sys.exit(0)
+    stats = get_router().stats()
+    tiers = get_router().tier_stats()
+    if "--json" in sys.argv:
+        print(json.dumps({"routes": stats, "tiers": tiers}, ensure_ascii=False, indent=2))
+        sys.exit(0)
+    print(f"  {'route / kind':<36}{'p50':>8}{'p95':>8}{'ok':>6}{'err':>6}{'win':>6}{'hedge':>7}  breaker")
+    fmt = lambda v: f"{v:.1f}s" if v is not None else "-"
+    for key, s in sorted(stats.items()):
+        print(f"  {key:<36}{'':>8}{'':>8}{s['ok']:>6}{s['errors']:>6}"
+              f"{s['wins']:>6}{s['hedged']:>7}  {s['breaker']}")
+        for kind, lat in s["latency"].items():
+            print(f"    └ {kind:<32}{fmt(lat['p50']):>8}{fmt(lat['p95']):>8}   ({lat['samples']} mẫu)")
+    if tiers["drafts"]:
+        reasons = ", ".join(f"{k}={v}" for k, v in sorted(tiers["reasons"].items())) or "-"
+        print(f"\n  ⬆️  Tiered: {tiers['escalated']}/{tiers['drafts']} bản nháp lên model mạnh "
+              f"({tiers['rate'] * 100:.0f}%) — {reasons}")
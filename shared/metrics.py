@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+📈 MyShort — Metrics
+Counters + histograms tích lũy qua nhiều lần chạy pipeline (chạy định kỳ
+bằng start.sh), tính từ trace của session (tracing.py).
+
+Xuất ra:
+- Prometheus textfile (node_exporter --collector.textfile.directory)
+- JSON snapshot (dashboard / so sánh regression)
+
+Store: OUTPUT_DIR/metrics/metrics-store.json (khóa bằng flock khi nhiều
+pipeline chạy song song).
+"""
+
+import fcntl
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+STAGE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+PROVIDER_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# name → (type, help)
+METRICS = {
+    "myshort_pipeline_runs_total": ("counter", "Số lần chạy pipeline theo kết quả"),
+    "myshort_videos_total": ("counter", "Số video final đã render"),
+    "myshort_videos_today": ("gauge", "Số video render trong ngày hiện tại"),
+    "myshort_videos_last_24h": ("gauge", "Số video render trong 24 giờ gần nhất"),
+    "myshort_stage_duration_seconds": ("histogram", "Thời gian chạy từng step của pipeline"),
+    "myshort_stage_cpu_seconds_total": ("counter", "CPU (agent + process con) từng step"),
+    "myshort_provider_request_duration_seconds": ("histogram", "Latency request tới provider"),
+    "myshort_provider_requests_total": ("counter", "Số request tới provider theo kết quả"),
+    "myshort_veo_seconds_generated_total": ("counter", "Tổng số giây video Veo đã generate"),
+    "myshort_encode_cpu_seconds_total": ("counter", "CPU time của các lệnh ffmpeg"),
+    "myshort_bytes_written_total": ("counter", "Bytes output ghi ra đĩa theo step"),
+    "myshort_last_run_timestamp_seconds": ("gauge", "Thời điểm pipeline chạy xong gần nhất"),
+}
+
+# Tên span HTTP → provider
+PROVIDER_PREFIXES = {
+    "http:tavily": "tavily",
+    "http:suno": "suno",
+    "http:audio-download": "suno",
+    "http:veo": "veo",
+    "http:telegram": "telegram",
+}
+
+STEP_FILES = {1: ("trend",), 2: ("script",), 3: ("audio",), 4: ("clips_dir",)}
+
+# Bản master của Agent 5: final-YYYYMMDD-HHMMSS[-profile][-rendition].mp4 → 1 video / timestamp
+FINAL_VIDEO_RE = re.compile(r"final-(\d{8}-\d{6})")
+
+
+def _output_dir():
+    return Path(os.path.expanduser(os.environ.get("OUTPUT_DIR", "~/myshort-output")))
+
+
+def get_metrics_dir():
+    """METRICS_DIR hoặc OUTPUT_DIR/metrics."""
+    custom = os.environ.get("METRICS_DIR")
+    if custom:
+        return Path(os.path.expanduser(custom))
+    return _output_dir() / "metrics"
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{labels[k]}"' for k in sorted(labels))
+    return f"{name}{{{inner}}}"
+
+
+def _atomic_write(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class MetricsStore:
+    """Store JSON tích lũy: counters, gauges, histograms (key = name{labels})."""
+
+    def __init__(self, metrics_dir=None):
+        self.dir = Path(metrics_dir or get_metrics_dir())
+        self.path = self.dir / "metrics-store.json"
+        self.data = {"counters": {}, "gauges": {}, "histograms": {}, "videos_by_day": {},
+                     "video_times": []}
+
+    @contextmanager
+    def locked(self):
+        """Đọc store dưới flock, ghi lại khi xong (an toàn với pipeline song song)."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / ".metrics.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield self
+                _atomic_write(self.path, json.dumps(self.data, ensure_ascii=False, indent=2))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load(self):
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data.update(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                pass
+        return self
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.data["counters"][key] = round(self.data["counters"].get(key, 0) + value, 6)
+
+    def set(self, name, value, **labels):
+        self.data["gauges"][_key(name, labels)] = value
+
+    def observe(self, name, value, buckets, **labels):
+        key = _key(name, labels)
+        hist = self.data["histograms"].setdefault(
+            key, {"buckets": {str(b): 0 for b in buckets}, "sum": 0.0, "count": 0})
+        for b in buckets:
+            if value <= b:
+                hist["buckets"][str(b)] += 1
+        hist["sum"] = round(hist["sum"] + value, 6)
+        hist["count"] += 1
+
+    def record_videos(self, count, when=None):
+        """videos/day: đếm theo ngày + mốc thời gian (giữ 7 ngày) cho gauge 24h."""
+        when = when or datetime.now()
+        day = when.strftime("%Y-%m-%d")
+        self.data["videos_by_day"][day] = self.data["videos_by_day"].get(day, 0) + count
+        cutoff = (when - timedelta(days=7)).isoformat()
+        times = [t for t in self.data["video_times"] if t >= cutoff]
+        times.extend([when.isoformat()] * count)
+        self.data["video_times"] = times
+        self.inc("myshort_videos_total", count)
+
+    def refresh_gauges(self, now=None):
+        now = now or datetime.now()
+        self.set("myshort_videos_today", self.data["videos_by_day"].get(now.strftime("%Y-%m-%d"), 0))
+        since = (now - timedelta(hours=24)).isoformat()
+        self.set("myshort_videos_last_24h", sum(1 for t in self.data["video_times"] if t >= since))
+
+    # ── Export ──
+
+    def render_prometheus(self):
+        """Text exposition format (0.0.4)."""
+        lines = []
+        samples = {}
+        for kind in ("counters", "gauges"):
+            for key, value in self.data[kind].items():
+                samples.setdefault(key.split("{")[0], []).append(f"{key} {value}")
+        for key, hist in self.data["histograms"].items():
+            name, _, labels = key.partition("{")
+            labels = labels.rstrip("}")
+            sep = "," if labels else ""
+            out = samples.setdefault(name, [])
+            for le in sorted(hist["buckets"], key=float):
+                out.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {hist["buckets"][le]}')
+            out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist["count"]}')
+            suffix = f"{{{labels}}}" if labels else ""
+            out.append(f"{name}_sum{suffix} {hist['sum']}")
+            out.append(f"{name}_count{suffix} {hist['count']}")
+
+        for name in sorted(samples):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples[name])
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """JSON snapshot: counters/gauges + histograms kèm avg."""
+        histograms = {}
+        for key, hist in self.data["histograms"].items():
+            histograms[key] = {**hist, "avg": round(hist["sum"] / hist["count"], 4) if hist["count"] else 0}
+        return {
+            "generated_at": datetime.now().isoformat(),
+            "counters": self.data["counters"],
+            "gauges": self.data["gauges"],
+            "histograms": histograms,
+            "videos_by_day": dict(sorted(self.data["videos_by_day"].items())[-30:]),
+        }
+
+    def export(self, textfile=None):
+        """Ghi myshort.prom + metrics-snapshot.json. Returns: (prom_path, json_path)."""
+        prom_path = Path(textfile) if textfile else self.dir / "myshort.prom"
+        json_path = self.dir / "metrics-snapshot.json"
+        _atomic_write(prom_path, self.render_prometheus())
+        _atomic_write(json_path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2))
+        return str(prom_path), str(json_path)
+
+
+def _provider_of(span):
+    name = span.get("name", "")
+    if name == "http:llm":
+        return span.get("attrs", {}).get("provider", "llm")
+    for prefix, provider in PROVIDER_PREFIXES.items():
+        if name.startswith(prefix):
+            return provider
+    return None
+
+
+def _path_bytes(path):
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.glob("*.mp4"))
+    return path.stat().st_size if path.exists() else 0
+
+
+def final_videos(state):
+    """
+    Video final của session: final_video_* trong state (đã tồn tại trên đĩa); state
+    thiếu (step 5 không trả JSON) → file final-*.mp4 trong OUTPUT_DIR/final ghi ra
+    từ lúc step 5 bắt đầu. Mỗi lần render (timestamp) tính 1 video, renditions không tính.
+    """
+    finals = [v for k, v in state.state.get("files", {}).items()
+              if k.startswith("final_video_") and v and Path(v).exists()]
+    if finals:
+        return finals
+    starts = [s["start"] for s in state.state.get("trace", [])
+              if s.get("name", "").startswith("step:") and str(s.get("step")) == "5" and s.get("start")]
+    if not starts:
+        return []
+    since = datetime.fromisoformat(max(starts)).timestamp()
+    masters = {}
+    for path in sorted((_output_dir() / "final").glob("final-*.mp4"), key=lambda p: len(p.name)):
+        match = FINAL_VIDEO_RE.match(path.name)
+        if match and path.stat().st_mtime >= since:
+            masters.setdefault(match.group(1), str(path))
+    return sorted(masters.values())
+
+
+def record_pipeline_metrics(state, metrics_dir=None, textfile=None):
+    """
+    Cập nhật metrics từ 1 session đã chạy xong (trace + files trong PipelineState)
+    rồi export textfile + JSON snapshot.
+
+    Returns: (prom_path, json_path)
+    """
+    spans = state.state.get("trace", [])
+    steps = state.state.get("steps", {})
+    files = state.state.get("files", {})
+    run_id = state.state.get("metrics_recorded_at")
+
+    store = MetricsStore(metrics_dir)
+    with store.locked():
+        statuses = [s.get("status") for s in steps.values()]
+        status = "completed" if statuses and all(s == "completed" for s in statuses) else "failed"
+        store.inc("myshort_pipeline_runs_total", status=status)
+
+        for span in spans:
+            # Chỉ tính spans mới (resume: spans cũ đã được ghi ở lần trước)
+            if run_id and span.get("start", "") <= run_id:
+                continue
+            name = span.get("name", "")
+            if name.startswith("step:"):
+                stage = name[5:]
+                store.observe("myshort_stage_duration_seconds", span.get("wall_s", 0),
+                              STAGE_BUCKETS, stage=stage, status=span.get("status", "ok"))
+                store.inc("myshort_stage_cpu_seconds_total", span.get("child_cpu_s", 0), stage=stage)
+            elif name.startswith("ffmpeg:") and "max_rss_kb" in span:
+                store.inc("myshort_encode_cpu_seconds_total", span.get("child_cpu_s", 0),
+                          operation=name[7:])
+            elif name == "veo:clip" and span.get("status") == "ok":
+                store.inc("myshort_veo_seconds_generated_total", span.get("attrs", {}).get("seconds", 0))
+
+            provider = _provider_of(span)
+            if provider:
+                store.observe("myshort_provider_request_duration_seconds", span.get("wall_s", 0),
+                              PROVIDER_BUCKETS, provider=provider)
+                store.inc("myshort_provider_requests_total", provider=provider,
+                          status=span.get("status", "ok"))
+
+        # Mỗi file output chỉ tính 1 lần (resume / --promote chạy lại cùng session)
+        recorded = set(state.state.get("metrics_files", []))
+        for step_num, keys in STEP_FILES.items():
+            if steps.get(str(step_num), {}).get("status") == "completed":
+                new = [files[k] for k in keys if files.get(k) and files[k] not in recorded]
+                written = sum(_path_bytes(p) for p in new)
+                if written:
+                    store.inc("myshort_bytes_written_total", written, step=str(step_num))
+                recorded.update(new)
+
+        finals = [v for v in final_videos(state) if v not in recorded]
+        if steps.get("5", {}).get("status") == "completed" and finals:
+            store.inc("myshort_bytes_written_total", sum(_path_bytes(v) for v in finals), step="5")
+            store.record_videos(len(finals))
+            recorded.update(finals)
+
+        store.set("myshort_last_run_timestamp_seconds", round(datetime.now().timestamp(), 3))
+        store.refresh_gauges()
+        paths = store.export(textfile)
+
+    state.state["metrics_recorded_at"] = datetime.now().isoformat()
+    state.state["metrics_files"] = sorted(recorded)
+    state.save()
+    return paths
+
+
+if __name__ == "__main__":
+    # Xem nhanh snapshot hiện tại
+    store = MetricsStore().load()
+    store.refresh_gauges()
+    if len(sys.argv) > 1 and sys.argv[1] == "--prom":
+        print(store.render_prometheus())
+    else:
+        print(json.dumps(store.snapshot(), ensure_ascii=False, indent=2))
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+🔬 MyShort — Profiling
+Chạy agent / orchestrator dưới cProfile (--profile) và tổng hợp báo cáo.
+
+- Mỗi process ghi 1 file .prof (orchestrator: 1 file / step, lưu cạnh state session)
+- Báo cáo merge: top-N hot spot Python của mình + thời gian bị block
+  (chờ HTTP, chờ process con, sleep khi poll, lock/thread)
+- Key hàm được chuẩn hóa (không có đường dẫn tuyệt đối) → so sánh được giữa các lần chạy
+
+Usage:
+    python3 profiling.py report.json                   # In lại báo cáo
+    python3 profiling.py report.json baseline.json     # So sánh với lần chạy trước
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+# Builtin "lá" mà thời gian tottime = thời gian bị block, không phải Python của mình
+WAIT_CATEGORIES = {
+    "http": ("_socket.socket", "_ssl._SSLSocket", "getaddrinfo", "select.select"),
+    "subprocess": ("posix.wait4", "posix.waitpid", "posix.read", "_posixsubprocess.fork_exec",
+                   "select.poll", "'communicate'"),
+    "sleep": ("time.sleep",),
+    "lock": ("'acquire' of '_thread.lock'", "'acquire' of '_thread.RLock'"),
+}
+
+
+def profile_target(argv=None):
+    """
+    Đọc --profile [PATH] từ argv (agent vẫn khai báo flag trong argparse).
+    Returns: None (không profile) | "auto" | đường dẫn .prof
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg.startswith("--profile="):
+            return arg.split("=", 1)[1] or "auto"
+        if arg == "--profile":
+            nxt = argv[i + 1] if i + 1 < len(argv) else None
+            return nxt if nxt and not nxt.startswith("-") else "auto"
+    return None
+
+
+def default_profile_path(service):
+    output = Path(os.path.expanduser(os.environ.get("OUTPUT_DIR", "~/myshort-output")))
+    return output / "profiles" / f"{service}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof"
+
+
+def run_profiled(main, service, top=15):
+    """
+    Entry point của script: chạy main() dưới cProfile nếu có --profile.
+    Chạy độc lập (không có PATH) → in top-N ra stderr (stdout dành cho --json).
+    """
+    target = profile_target()
+    if not target:
+        return main()
+
+    path = default_profile_path(service) if target == "auto" else Path(target)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return main()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
+        if target == "auto":
+            report = build_report({service: [path]}, top=top)
+            print_report(report, file=sys.stderr)
+            print(f"  🔬 Profile: {path}", file=sys.stderr)
+
+
+def func_key(func):
+    """(filename, line, name) → key ổn định giữa các máy / lần chạy."""
+    filename, line, name = func
+    if filename == "~":
+        return name
+    path = filename.replace("\\", "/")
+    for marker in ("/site-packages/", "/dist-packages/"):
+        if marker in path:
+            return f"{path.split(marker, 1)[1]}:{line}({name})"
+    try:
+        path = str(Path(filename).resolve().relative_to(PROJECT_DIR.resolve()))
+    except ValueError:
+        # stdlib / skill đã deploy → giữ 2 cấp cuối
+        path = "/".join(Path(filename).parts[-2:])
+    return f"{path}:{line}({name})"
+
+
+def _category(key):
+    for category, patterns in WAIT_CATEGORIES.items():
+        if any(p in key for p in patterns):
+            return category
+    return None
+
+
+def summarize_stats(stats):
+    """Phân rã tottime: Python của mình vs thời gian block theo loại."""
+    breakdown = {"python": 0.0, **{c: 0.0 for c in WAIT_CATEGORIES}}
+    for func, (_, _, tottime, _, _) in stats.stats.items():
+        breakdown[_category(func_key(func)) or "python"] += tottime
+    total = sum(breakdown.values())
+    return {"total_s": round(total, 3), **{k: round(v, 3) for k, v in breakdown.items()}}
+
+
+def build_report(stage_files, top=20):
+    """
+    stage_files: {stage: [file .prof, ...]}
+    Returns: {"stages": {stage: breakdown}, "total": breakdown, "hotspots": [...], "waits": [...]}
+    """
+    stages = {}
+    merged = None
+    for stage, files in stage_files.items():
+        files = [str(f) for f in files if Path(f).exists()]
+        if not files:
+            continue
+        stats = pstats.Stats(*files)
+        stages[stage] = summarize_stats(stats)
+        if merged is None:
+            merged = pstats.Stats(*files)
+        else:
+            merged.add(*files)
+    if merged is None:
+        return {"stages": {}, "total": {}, "hotspots": [], "waits": []}
+
+    rows = []
+    for func, (cc, nc, tottime, cumtime, _) in merged.stats.items():
+        key = func_key(func)
+        rows.append({"function": key, "calls": nc, "tottime_s": round(tottime, 4),
+                     "cumtime_s": round(cumtime, 4), "category": _category(key) or "python"})
+    hotspots = sorted((r for r in rows if r["category"] == "python"),
+                      key=lambda r: r["tottime_s"], reverse=True)[:top]
+    waits = sorted((r for r in rows if r["category"] != "python"),
+                   key=lambda r: r["tottime_s"], reverse=True)[:top]
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "stages": stages,
+        "total": summarize_stats(merged),
+        "hotspots": hotspots,
+        "waits": waits,
+    }
+
+
+def print_report(report, top=10, file=None):
+    file = file or sys.stdout
+    print("\n  🔬 Profile (tottime):", file=file)
+    header = f"    {'Stage':<24} {'total':>8} {'python':>8} {'http':>8} {'subproc':>8} {'sleep':>8} {'lock':>7}"
+    print(header, file=file)
+    for stage, b in list(report.get("stages", {}).items()) + [("TOTAL", report.get("total", {}))]:
+        if not b:
+            continue
+        print(f"    {stage:<24} {b['total_s']:>7.1f}s {b['python']:>7.2f}s {b['http']:>7.1f}s "
+              f"{b['subprocess']:>7.1f}s {b['sleep']:>7.1f}s {b['lock']:>6.1f}s", file=file)
+    if report.get("hotspots"):
+        print(f"\n    🔥 Top {min(top, len(report['hotspots']))} Python hot spots:", file=file)
+        for row in report["hotspots"][:top]:
+            print(f"      {row['tottime_s']:>8.3f}s  ×{row['calls']:<7} {row['function']}", file=file)
+
+
+def compare_reports(current, baseline, top=10):
+    """So sánh 2 báo cáo: delta theo stage + hot spot thay đổi nhiều nhất."""
+    print("\n  📊 So sánh với baseline:")
+    for stage, b in current.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        print(f"    {stage:<24} python {old['python']:.2f}s → {b['python']:.2f}s "
+              f"({b['python'] - old['python']:+.2f}s) | total {old['total_s']:.1f}s → {b['total_s']:.1f}s")
+    old_rows = {r["function"]: r["tottime_s"] for r in baseline.get("hotspots", [])}
+    new_rows = {r["function"]: r["tottime_s"] for r in current.get("hotspots", [])}
+    deltas = sorted(((f, new_rows.get(f, 0) - old_rows.get(f, 0)) for f in set(old_rows) | set(new_rows)),
+                    key=lambda x: abs(x[1]), reverse=True)[:top]
+    for function, delta in deltas:
+        print(f"      {delta:+8.3f}s  {function}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        current = json.load(f)
+    print_report(current)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r", encoding="utf-8") as f:
+            compare_reports(current, json.load(f))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+🩺 MyShort — Script Validator
+Kiểm tra + tự sửa kịch bản LLM ngay sau khi sinh (không gọi thêm API):
+
+- Schema: thiếu field → điền mặc định, sai kiểu → ép kiểu (lyrics list → str, bpm "120 BPM" → 120)
+- Timing: timestamps chồng lấn / hở / sai format → re-flow liên tục, tổng = đúng độ dài video
+- Scene < 4s → gộp vào scene kề; scene > 8s → tách thành nhiều scene ≤ 8s (1 scene = 1 clip Veo)
+
+Kịch bản đã đúng thì giữ nguyên (idempotent). Các chỉnh sửa được ghi vào
+script["validation"]["fixes"].
+"""
+
+import copy
+import re
+
+from timeline import VEO_MAX_CLIP_SECONDS, VEO_MIN_CLIP_SECONDS, parse_timestamp
+
+SCENE_DEFAULTS = {
+    "characters": ["cute cartoon character"],
+    "action": "gentle movement",
+    "background": "colorful setting",
+    "colors": "bright, vibrant",
+    "camera_movement": "static",
+    "mood": "happy",
+}
+MUSIC_DEFAULTS = {
+    "genre": "Cocomelon-style kids pop",
+    "bpm": 120,
+    "key": "C major",
+    "mood": "happy, cheerful",
+    "instruments": ["ukulele", "xylophone", "claps"],
+    "vocal_style": "cheerful child-like voice, clear pronunciation",
+}
+
+
+def _timestamp(start, end):
+    return f"{start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}"
+
+
+def _as_text(value):
+    if isinstance(value, list):
+        return "\n".join(str(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def _fix_schema(script, topic, fixes):
+    for key, default in (("theme", topic or script.get("title")), ("title", topic or script.get("theme")),
+                         ("title_vi", script.get("title") or topic)):
+        if not script.get(key) and default:
+            script[key] = default
+            fixes.append(f"thiếu {key}")
+
+    lyrics = script.get("lyrics")
+    if not isinstance(lyrics, dict):
+        lyrics = {"verse1": _as_text(lyrics)} if lyrics else {}
+        fixes.append("lyrics không phải object")
+    for section, text in list(lyrics.items()):
+        if not isinstance(text, str):
+            lyrics[section] = _as_text(text)
+            fixes.append(f"lyrics.{section} không phải string")
+    script["lyrics"] = lyrics
+
+    music = script.get("music_direction")
+    if not isinstance(music, dict):
+        music = {}
+    for key, default in MUSIC_DEFAULTS.items():
+        if not music.get(key):
+            music[key] = default
+            fixes.append(f"thiếu music_direction.{key}")
+    if not isinstance(music["bpm"], int):
+        match = re.search(r"\d+(\.\d+)?", str(music["bpm"]))
+        music["bpm"] = int(float(match.group(0))) if match else MUSIC_DEFAULTS["bpm"]
+        fixes.append("music_direction.bpm không phải số")
+    script["music_direction"] = music
+
+    seo = script.get("seo") if isinstance(script.get("seo"), dict) else {}
+    seo.setdefault("tags", [])
+    seo.setdefault("description", script["title"])
+    script["seo"] = seo
+
+    scenes = [s for s in script.get("scenes") or [] if isinstance(s, dict)]
+    if len(scenes) != len(script.get("scenes") or []):
+        fixes.append("bỏ scene không phải object")
+    section = next(iter(lyrics), "verse1")
+    for i, scene in enumerate(scenes):
+        missing = [k for k in SCENE_DEFAULTS if not scene.get(k)]
+        for key in missing:
+            scene[key] = copy.deepcopy(SCENE_DEFAULTS[key])
+        if isinstance(scene["characters"], str):
+            scene["characters"] = [scene["characters"]]
+        if not scene.get("description"):
+            scene["description"] = f"{scene['action']}, {scene['background']}"
+            missing.append("description")
+        section = scene.get("lyrics_section") or section
+        if not scene.get("lyrics_section"):
+            scene["lyrics_section"] = section
+            missing.append("lyrics_section")
+        if missing:
+            fixes.append(f"scene {i + 1} thiếu {', '.join(missing)}")
+    script["scenes"] = scenes
+
+
+def _reflow(scenes, total, min_scene, max_scene, fixes):
+    """Timestamps → số giây nguyên mỗi scene (tổng = total), gộp scene ngắn, tách scene dài."""
+    spans = [parse_timestamp(str(s.get("timestamp", ""))) for s in scenes]
+    valid = [end - start for start, end in filter(None, spans)]
+    fallback = sorted(valid)[len(valid) // 2] if valid else max_scene
+    weights = [span[1] - span[0] if span else fallback for span in spans]
+    if not all(spans):
+        fixes.append(f"{spans.count(None)} timestamp sai format")
+
+    cursor = 0.0
+    for span in spans:
+        if span and abs(span[0] - cursor) > 0.5:
+            fixes.append("timestamps chồng lấn / bị hở")
+            break
+        cursor = span[1] if span else cursor
+    if abs(sum(weights) - total) > 0.5:
+        fixes.append(f"tổng {sum(weights):.0f}s ≠ {total}s")
+
+    # Thiếu scene (tổng > số scene × max_scene) → tách đôi scene dài nhất tới khi đủ chỗ
+    scale = total / sum(weights)
+    items = [[scene, w * scale] for scene, w in zip(scenes, weights)]
+    while len(items) * max_scene < total:
+        i = max(range(len(items)), key=lambda k: items[k][1])
+        scene, seconds = items[i]
+        fixes.append(f"tách scene {scene.get('id', '?')} ({seconds:.0f}s → 2 scenes)")
+        items[i:i + 1] = [[scene, seconds / 2], [copy.deepcopy(scene), seconds / 2]]
+
+    # Scene vượt max_scene (vd. 60s / 8 scenes lệch nhau) → dồn phần vượt sang scene còn chỗ
+    excess = sum(max(d - max_scene, 0) for _, d in items)
+    if excess:
+        room = sum(max(max_scene - d, 0) for _, d in items)
+        for item in items:
+            item[1] = max_scene if item[1] >= max_scene else item[1] + excess * (max_scene - item[1]) / room
+
+    # Cumulative rounding → giây nguyên, tổng đúng bằng total
+    # (round(x + 8) = round(x) + 8 → scene ≤ max_scene vẫn ≤ max_scene sau khi làm tròn)
+    durations, acc, prev = [], 0.0, 0
+    for _, d in items:
+        acc += d
+        durations.append(round(acc) - prev)
+        prev = round(acc)
+    durations[-1] += total - sum(durations)
+
+    # Gộp scene < min_scene vào scene trước (scene đầu → scene sau)
+    merged = []
+    for (scene, _), seconds in zip(items, durations):
+        if merged and (seconds < min_scene or merged[-1][1] < min_scene):
+            merged[-1][1] += seconds
+            fixes.append(f"gộp scene {scene.get('id', '?')} ({seconds}s)")
+        else:
+            merged.append([scene, seconds])
+
+    # Tách scene > max_scene thành k phần gần bằng nhau (mỗi phần ≥ min_scene)
+    result = []
+    for scene, seconds in merged:
+        parts = max(-(-seconds // max_scene), 1)
+        if parts > 1:
+            fixes.append(f"tách scene {scene.get('id', '?')} ({seconds}s → {parts} scenes)")
+        for k in range(parts):
+            result.append((scene if k == 0 else copy.deepcopy(scene),
+                           seconds // parts + (1 if k < seconds % parts else 0)))
+    return result
+
+
+def validate_script(script, total_seconds, topic="", min_scene=VEO_MIN_CLIP_SECONDS,
+                    max_scene=VEO_MAX_CLIP_SECONDS):
+    """
+    Sửa kịch bản tại chỗ cho đúng schema + timing.
+    total_seconds: độ dài video mục tiêu (giây nguyên)
+    Returns: (script, fixes) — fixes rỗng nếu kịch bản đã hợp lệ.
+    """
+    fixes = []
+    _fix_schema(script, topic, fixes)
+    scenes = script["scenes"]
+    if not scenes:
+        fixes.append("không có scene")
+        return script, fixes
+
+    flowed = _reflow(scenes, int(total_seconds), min_scene, max_scene, fixes)
+    start = 0
+    script["scenes"] = []
+    for i, (scene, seconds) in enumerate(flowed):
+        timestamp = _timestamp(start, start + seconds)
+        if scene.get("id") != i + 1 and "đánh lại id scene" not in fixes:
+            fixes.append("đánh lại id scene")
+        scene["id"] = i + 1
+        scene["timestamp"] = timestamp
+        script["scenes"].append(scene)
+        start += seconds
+
+    if fixes:
+        script["validation"] = {"fixes": fixes, "scene_count": len(script["scenes"])}
+    return script, fixes
+
+
+if __name__ == "__main__":
+    # Quick self-test
+    raw = {"title": "t", "lyrics": {"intro": ["a", "b"]}, "scenes": [
+        {"id": 1, "timestamp": "0:00-0:20", "description": "long"},
+        {"id": 2, "timestamp": "0:18-0:21", "description": "overlap + short"},
+        {"id": 3, "timestamp": "bad", "description": "no time"},
+        {"id": 4, "timestamp": "0:40-0:46", "description": "ok"},
+    ]}
+    fixed, fixes = validate_script(raw, 60)
+    durations = [e - s for s, e in (parse_timestamp(x["timestamp"]) for x in fixed["scenes"])]
+    assert sum(durations) == 60 and all(VEO_MIN_CLIP_SECONDS <= d <= VEO_MAX_CLIP_SECONDS for d in durations)
+    again, more = validate_script(fixed, 60)
+    assert not more, more
+    print(f"  {durations}\n  {fixes}\n\n✅ Script validator OK")
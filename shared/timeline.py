@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+🎼 MyShort — Timeline Planner
+Chia thời lượng bài hát thật (đo từ file Suno) thành các sub-clip Veo.
+
+- Mỗi sub-clip nằm trong giới hạn Veo (4-8 giây)
+- Tổng thời lượng các sub-clip = CHÍNH XÁC độ dài audio
+- Điểm cắt rơi vào phách (beat) / ô nhịp (bar) theo BPM trong music_direction
+"""
+
+import math
+
+# ── Veo bounds ──
+VEO_MIN_CLIP_SECONDS = 4
+VEO_MAX_CLIP_SECONDS = 8
+
+DEFAULT_BPM = 120
+BEATS_PER_BAR = 4
+
+
+def parse_time(time_str):
+    """Parse 'M:SS' (hoặc 'M:SS.s') thành giây."""
+    parts = time_str.strip().split(":")
+    try:
+        if len(parts) == 2:
+            return int(parts[0]) * 60 + float(parts[1])
+        if len(parts) == 1 and parts[0]:
+            return float(parts[0])
+    except ValueError:
+        pass
+    return 0
+
+
+def format_time(seconds):
+    """Format giây thành 'M:SS' (giữ 1 chữ số thập phân nếu lẻ)."""
+    minutes = int(seconds // 60)
+    rest = seconds - minutes * 60
+    if abs(rest - round(rest)) < 0.05:
+        rest = int(round(rest))
+        if rest == 60:
+            minutes, rest = minutes + 1, 0
+        return f"{minutes}:{rest:02d}"
+    return f"{minutes}:{rest:04.1f}"
+
+
+def parse_timestamp(timestamp):
+    """Parse 'M:SS-M:SS' thành (start, end) giây. Trả về None nếu sai format."""
+    if not timestamp or "-" not in timestamp:
+        return None
+    start_str, _, end_str = timestamp.partition("-")
+    start, end = parse_time(start_str), parse_time(end_str)
+    if end <= start:
+        return None
+    return start, end
+
+
+def get_bpm(script, default=DEFAULT_BPM):
+    """Lấy BPM từ music_direction (chấp nhận '120', '120 BPM', 120)."""
+    bpm = (script or {}).get("music_direction", {}).get("bpm", default)
+    try:
+        bpm = float(str(bpm).lower().replace("bpm", "").strip())
+    except ValueError:
+        return default
+    return bpm if 40 <= bpm <= 240 else default
+
+
+def beat_length(bpm):
+    """Độ dài 1 phách (giây)."""
+    return 60.0 / (bpm or DEFAULT_BPM)
+
+
+def veo_request_seconds(duration):
+    """Số giây nguyên gửi cho Veo (Veo chỉ nhận số nguyên trong giới hạn)."""
+    seconds = math.ceil(round(duration, 3))
+    return max(VEO_MIN_CLIP_SECONDS, min(seconds, VEO_MAX_CLIP_SECONDS))
+
+
+def _snap_to_grid(target, lo, hi, beat):
+    """Điểm cắt trong [lo, hi] gần target nhất, ưu tiên bar → beat → không snap."""
+    if beat:
+        for grid in (beat * BEATS_PER_BAR, beat):
+            first = math.ceil((lo - 1e-6) / grid)
+            last = math.floor((hi + 1e-6) / grid)
+            if first <= last:
+                k = min(max(round(target / grid), first), last)
+                return k * grid
+    return min(max(target, lo), hi)
+
+
+def plan_durations(total, bpm=None, start=0.0,
+                   min_clip=VEO_MIN_CLIP_SECONDS, max_clip=VEO_MAX_CLIP_SECONDS):
+    """
+    Chia `total` giây thành list durations, mỗi phần trong [min_clip, max_clip],
+    tổng = total, điểm cắt bám lưới beat (tính từ đầu bài, `start` là offset).
+
+    VD: total=20s, 120 BPM → [6.0, 6.0, 8.0] (cắt đúng ô nhịp 2s)
+    Nếu total < min_clip → 1 clip duy nhất (Veo render min, Agent 5 trim).
+    """
+    total = round(float(total), 3)
+    if total <= max_clip:
+        return [total]
+
+    beat = beat_length(bpm) if bpm else None
+    count = math.ceil(total / max_clip)
+    end = start + total
+
+    cuts = []
+    prev = start
+    for k in range(1, count):
+        clips_left = count - k + 1
+        target = prev + (end - prev) / clips_left
+        # Khoảng hợp lệ: clip này trong [min, max] và phần còn lại vẫn chia được
+        lo = max(prev + min_clip, end - (clips_left - 1) * max_clip)
+        hi = min(prev + max_clip, end - (clips_left - 1) * min_clip)
+        prev = round(_snap_to_grid(target, lo, hi, beat), 3)
+        cuts.append(prev)
+
+    points = [start] + cuts + [end]
+    durations = [round(b - a, 3) for a, b in zip(points, points[1:])]
+    # Bù sai số làm tròn vào clip cuối → tổng luôn đúng bằng total
+    durations[-1] = round(total - sum(durations[:-1]), 3)
+    return durations
+
+
+def plan_scene_timeline(scenes, total_duration, bpm=None,
+                        min_clip=VEO_MIN_CLIP_SECONDS, max_clip=VEO_MAX_CLIP_SECONDS):
+    """
+    Lập timeline sub-clip cho toàn bộ scenes theo độ dài audio thật.
+
+    1. Scale timestamps của LLM cho khớp total_duration
+    2. Snap ranh giới scene vào beat, đảm bảo mỗi scene ≥ min_clip
+    3. Chia từng scene bằng plan_durations()
+
+    Returns: list[dict] — mỗi phần tử: {scene_index, sub_id, sub_total,
+             sub_start, sub_duration}
+    """
+    if not scenes or not total_duration:
+        return []
+
+    # 1. Ranh giới gốc (fallback: chia đều nếu timestamp hỏng)
+    spans = [parse_timestamp(s.get("timestamp", "")) for s in scenes]
+    if all(spans):
+        origin = spans[0][0]
+        script_end = max(end for _, end in spans)
+        scale = total_duration / max(script_end - origin, 1e-6)
+        bounds = [(end - origin) * scale for _, end in spans]
+    else:
+        step = total_duration / len(scenes)
+        bounds = [step * (i + 1) for i in range(len(scenes))]
+    bounds[-1] = total_duration
+
+    # 2. Snap vào beat + đảm bảo độ dài tối thiểu
+    beat = beat_length(bpm) if bpm else None
+    snapped = []
+    prev = 0.0
+    for i, b in enumerate(bounds[:-1]):
+        cut = round(b / beat) * beat if beat else b
+        cut = max(cut, prev + min_clip)
+        scenes_left = len(bounds) - i - 1
+        cut = min(cut, total_duration - scenes_left * min_clip)
+        if cut - prev < min_clip - 1e-6:
+            # Không đủ chỗ → gộp scene này vào scene sau
+            snapped.append(None)
+            continue
+        prev = round(cut, 3)
+        snapped.append(prev)
+    snapped.append(total_duration)
+
+    timeline = []
+    seg_start = 0.0
+    for scene_index, cut in enumerate(snapped):
+        if cut is None:
+            continue
+        durations = plan_durations(cut - seg_start, bpm, seg_start, min_clip, max_clip)
+        sub_start = seg_start
+        for sub_id, dur in enumerate(durations, 1):
+            timeline.append({
+                "scene_index": scene_index,
+                "sub_id": sub_id,
+                "sub_total": len(durations),
+                "sub_start": round(sub_start, 3),
+                "sub_duration": dur,
+            })
+            sub_start += dur
+        seg_start = cut
+
+    # Tổng phải đúng bằng audio
+    drift = round(total_duration - sum(t["sub_duration"] for t in timeline), 3)
+    if timeline and drift:
+        timeline[-1]["sub_duration"] = round(timeline[-1]["sub_duration"] + drift, 3)
+    return timeline
+
+
+def replan_script(script, audio_duration, bpm=None):
+    """
+    Audio-first: viết lại scenes của kịch bản theo độ dài nhạc thật.
+
+    - Scale timestamps cho khớp audio_duration
+    - Gộp scene quá ngắn (< 4s sau scale) vào scene kế tiếp
+    - Tách scene dài thành nhiều scene ≤ 8s (mỗi scene = đúng 1 clip Veo)
+
+    Mapping scene mới → scene gốc được ghi vào script["timeline"].
+    Chạy lại trên script đã re-plan sẽ bắt đầu từ scenes gốc.
+    """
+    previous = script.get("timeline", {})
+    source_scenes = previous.get("source_scenes") or script.get("scenes", [])
+    bpm = bpm or get_bpm(script)
+    timeline = plan_scene_timeline(source_scenes, audio_duration, bpm)
+
+    # Scene bị gộp → scene giữ lại kế tiếp
+    kept = {t["scene_index"] for t in timeline}
+    sources, pending = {}, []
+    for idx in range(len(source_scenes)):
+        pending.append(idx)
+        if idx in kept:
+            sources[idx], pending = pending, []
+
+    scenes, mapping = [], []
+    for t in timeline:
+        scene = source_scenes[t["scene_index"]]
+        start, duration = t["sub_start"], t["sub_duration"]
+        new_id = len(scenes) + 1
+        scenes.append({
+            **scene,
+            "id": new_id,
+            "timestamp": f"{format_time(start)}-{format_time(start + duration)}",
+            "start": start,
+            "duration": duration,
+            "part": [t["sub_id"], t["sub_total"]],
+        })
+        source_ids = [source_scenes[i].get("id", i + 1) for i in sources[t["scene_index"]]]
+        if len(source_ids) > 1:
+            action = "merged"
+        elif t["sub_total"] > 1:
+            action = "split"
+        else:
+            action = "scaled"
+        mapping.append({
+            "id": new_id,
+            "source_ids": source_ids,
+            "action": action,
+            "original_timestamp": scene.get("timestamp", ""),
+            "timestamp": scenes[-1]["timestamp"],
+        })
+
+    return {
+        **script,
+        "scenes": scenes,
+        "timeline": {
+            "mode": "audio-first",
+            "audio_duration": round(audio_duration, 3),
+            "bpm": bpm,
+            "original_scene_count": len(source_scenes),
+            "scene_count": len(scenes),
+            "mapping": mapping,
+            "source_scenes": source_scenes,
+        },
+    }
+
+
+def is_replanned(script):
+    """Script đã được re-plan theo audio (mỗi scene = 1 clip Veo)?"""
+    return (script or {}).get("timeline", {}).get("mode") == "audio-first"
+
+
+if __name__ == "__main__":
+    # Quick self-test
+    for total in (3.5, 8, 20, 61.7, 183.4):
+        d = plan_durations(total, bpm=115)
+        assert abs(sum(d) - total) < 1e-6, (total, d)
+        assert all(VEO_MIN_CLIP_SECONDS - 1e-6 <= x <= VEO_MAX_CLIP_SECONDS + 1e-6 for x in d) or total < 4
+        print(f"  {total:>6}s → {d}")
+    print("\n✅ Timeline planner OK")
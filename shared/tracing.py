@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+⏱️ MyShort — Tracing
+Ghi spans cho từng stage và thao tác con (HTTP request, poll, ffmpeg).
+
+- Mỗi span: wall time, CPU của process, CPU + max RSS của process con
+  (đo chính xác từng lệnh bằng os.wait4), bytes vào/ra, số lần retry
+- Agent chạy dưới orchestrator ghi spans ra file (env MYSHORT_TRACE_FILE)
+  khi thoát → orchestrator merge vào 1 trace duy nhất trong PipelineState
+"""
+
+import atexit
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+TRACE_FILE_ENV = "MYSHORT_TRACE_FILE"
+
+
+def _cpu_times():
+    """(CPU process hiện tại, CPU các process con đã reap) — giây."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+class Span:
+    """1 thao tác được đo. Dùng qua Tracer.span() (context manager)."""
+
+    def __init__(self, name, service, parent_id=None, attrs=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.data = {
+            "id": self.id,
+            "parent": parent_id,
+            "name": name,
+            "service": service,
+            "start": datetime.now().isoformat(),
+            "status": "ok",
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "retries": 0,
+            "attrs": dict(attrs or {}),
+        }
+        self._t0 = time.perf_counter()
+        self._cpu0, self._child0 = _cpu_times()
+        self._child_rusage = None
+
+    def set(self, **attrs):
+        self.data["attrs"].update(attrs)
+
+    def add_bytes(self, bytes_in=0, bytes_out=0):
+        self.data["bytes_in"] += int(bytes_in or 0)
+        self.data["bytes_out"] += int(bytes_out or 0)
+
+    def retry(self, count=1):
+        self.data["retries"] += count
+
+    def fail(self, error):
+        self.data["status"] = "error"
+        self.data["error"] = str(error)[:300]
+
+    def record_rusage(self, usage):
+        """Rusage của đúng 1 process con (từ os.wait4)."""
+        self._child_rusage = usage
+
+    def finish(self):
+        cpu, child = _cpu_times()
+        self.data["wall_s"] = round(time.perf_counter() - self._t0, 4)
+        self.data["cpu_s"] = round(cpu - self._cpu0, 4)
+        if self._child_rusage is not None:
+            self.data["child_cpu_s"] = round(self._child_rusage.ru_utime + self._child_rusage.ru_stime, 4)
+            self.data["max_rss_kb"] = self._child_rusage.ru_maxrss
+        else:
+            self.data["child_cpu_s"] = round(child - self._child0, 4)
+        return self.data
+
+
+class Tracer:
+    """Thu thập spans của 1 process. Nested spans tự gắn parent theo thread."""
+
+    def __init__(self, service, trace_file=None):
+        self.service = service
+        self.trace_file = trace_file
+        self.spans = []
+        self.tags = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attrs):
+        """
+        with tracer.span("veo:poll", scene=3) as span:
+            ...
+            span.add_bytes(bytes_in=len(data))
+        """
+        stack = self._stack()
+        parent_id = parent or (stack[-1].id if stack else None)
+        span = Span(name, self.service, parent_id, attrs)
+        span.data.update(self.tags)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            stack.pop()
+            data = span.finish()
+            with self._lock:
+                self.spans.append(data)
+
+    def merge(self, spans, parent_id=None, **tags):
+        """Gộp spans từ agent con: root spans được gắn vào parent_id."""
+        with self._lock:
+            for data in spans:
+                if data.get("parent") is None:
+                    data["parent"] = parent_id
+                data.update(tags)
+                self.spans.append(data)
+
+    def flush(self):
+        """Ghi spans ra trace_file (agent chạy dưới orchestrator)."""
+        if not self.trace_file:
+            return None
+        with self._lock:
+            spans = list(self.spans)
+        path = Path(self.trace_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"service": self.service, "spans": spans}, f, ensure_ascii=False)
+        return str(path)
+
+
+_tracer = None
+
+
+def get_tracer(service=None):
+    """Tracer dùng chung trong process. Tự flush khi thoát nếu có MYSHORT_TRACE_FILE."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(service or Path(sys.argv[0]).stem, os.environ.get(TRACE_FILE_ENV))
+        if _tracer.trace_file:
+            atexit.register(_tracer.flush)
+    elif service and _tracer.service != service and not _tracer.spans:
+        _tracer.service = service
+    return _tracer
+
+
+def load_trace_file(path):
+    """Đọc spans agent con đã ghi. Returns: list (rỗng nếu không có)."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("spans", [])
+    except (OSError, json.JSONDecodeError):
+        return []
+
+
+def _drain(stream, sink, key):
+    sink[key] = stream.read()
+    stream.close()
+
+
+def wait_child(proc):
+    """Reap process con bằng os.wait4 → rusage của đúng process đó (None nếu OS không hỗ trợ)."""
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return usage
+
+
+def run_traced(cmd, name=None, timeout=None, text=True, env=None, tracer=None, **attrs):
+    """
+    Thay subprocess.run(cmd, capture_output=True): chạy lệnh trong 1 span và
+    lấy CPU/max RSS của đúng process con bằng os.wait4.
+
+    Returns: subprocess.CompletedProcess. Raises: subprocess.TimeoutExpired,
+             FileNotFoundError (giống subprocess.run).
+    """
+    tracer = tracer or get_tracer()
+    name = name or f"exec:{Path(str(cmd[0])).name}"
+    with tracer.span(name, **attrs) as span:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=text, env=env)
+        if not hasattr(os, "wait4"):
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+            span.set(returncode=proc.returncode)
+            return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+        output = {}
+        readers = [threading.Thread(target=_drain, args=(proc.stdout, output, "stdout"), daemon=True),
+                   threading.Thread(target=_drain, args=(proc.stderr, output, "stderr"), daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        timed_out = threading.Event()
+
+        def _kill():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, _kill) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            usage = wait_child(proc)
+        finally:
+            if timer:
+                timer.cancel()
+        for reader in readers:
+            reader.join()
+        span.record_rusage(usage)
+        span.set(returncode=proc.returncode)
+
+        stdout, stderr = output.get("stdout"), output.get("stderr")
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def trace_response(span, response, bytes_out=0):
+    """Ghi status + bytes của 1 HTTP response (requests, không stream) vào span."""
+    span.set(status_code=response.status_code)
+    length = response.headers.get("Content-Length")
+    span.add_bytes(bytes_in=int(length) if length and length.isdigit() else len(response.content or b""),
+                   bytes_out=bytes_out)
+    if response.status_code >= 400:
+        span.data["status"] = "error"
+    return response
+
+
+def summarize_trace(spans):
+    """
+    Tổng hợp trace theo step và theo tên thao tác.
+
+    Returns: {"steps": {step: {name, wall_s, cpu_s, max_rss_kb, bytes_in, bytes_out,
+              retries, errors}}, "operations": [{name, count, wall_s, ...}] (giảm dần)}
+    """
+    steps = {}
+    for span in spans:
+        if span.get("name", "").startswith("step:"):
+            # CPU của step = CPU toàn bộ cây process con (agent + ffmpeg) đã reap
+            steps[str(span.get("step"))] = {
+                "name": span["name"][5:],
+                "wall_s": span.get("wall_s", 0),
+                "cpu_s": span.get("child_cpu_s", 0),
+                "max_rss_kb": 0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "retries": 0,
+                "errors": 0,
+                "status": span.get("status", "ok"),
+            }
+
+    operations = {}
+    for span in spans:
+        name = span.get("name", "")
+        if name.startswith("step:"):
+            continue
+        step = steps.get(str(span.get("step")))
+        if step is not None:
+            step["max_rss_kb"] = max(step["max_rss_kb"], span.get("max_rss_kb", 0))
+            step["bytes_in"] += span.get("bytes_in", 0)
+            step["bytes_out"] += span.get("bytes_out", 0)
+            step["retries"] += span.get("retries", 0)
+            step["errors"] += span.get("status") == "error"
+        if name.startswith("agent:"):
+            continue
+
+        op = operations.setdefault(name, {"name": name, "count": 0, "wall_s": 0.0,
+                                          "child_cpu_s": 0.0, "bytes_in": 0, "bytes_out": 0,
+                                          "retries": 0, "errors": 0})
+        op["count"] += 1
+        op["wall_s"] += span.get("wall_s", 0)
+        # Chỉ span exec (wait4) có CPU riêng của process con — tránh cộng trùng
+        if "max_rss_kb" in span:
+            op["child_cpu_s"] += span.get("child_cpu_s", 0)
+        op["bytes_in"] += span.get("bytes_in", 0)
+        op["bytes_out"] += span.get("bytes_out", 0)
+        op["retries"] += span.get("retries", 0)
+        op["errors"] += span.get("status") == "error"
+
+    for op in operations.values():
+        op["wall_s"] = round(op["wall_s"], 3)
+        op["child_cpu_s"] = round(op["child_cpu_s"], 3)
+    ranked = sorted(operations.values(), key=lambda o: o["wall_s"], reverse=True)
+    return {"steps": steps, "operations": ranked, "span_count": len(spans)}
+
+
+def format_bytes(n):
+    """1536 → '1.5 KB'."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
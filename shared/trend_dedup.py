@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+🧬 MyShort — Trend Dedup
+Gộp kết quả search gần trùng (cùng 1 bài hát viral, tiêu đề hơi khác nhau giữa
+các query / website) để top-N không bị chiếm bởi bản sao:
+
+- Shingle: cặp từ liên tiếp (token + stem của trend_scoring) trên title + snippet
+- MinHash 1 hoán vị (one-permutation hashing + densification): mỗi shingle
+  hash đúng 1 lần → chữ ký NUM_PERM giá trị
+- LSH: chia chữ ký thành BANDS dải, kết quả chung 1 dải → ứng viên; ứng viên được
+  xác nhận bằng Jaccard thật của tập shingle ≥ threshold (union-find)
+- Mỗi dải chỉ so với phần tử đầu của bucket → gần tuyến tính theo số kết quả
+
+Usage:
+    clusters = near_duplicate_clusters(texts, threshold=0.5)
+    trends = collapse_trends(trends)          # giữ bản điểm cao nhất, gộp url/keywords
+    python3 trend_dedup.py                    # Self-test + benchmark
+"""
+
+import random
+import sys
+import time
+import zlib
+
+from trend_scoring import tokenize
+
+NUM_PERM = 64
+BANDS = 16
+DEFAULT_THRESHOLD = 0.5
+
+_BIN_BITS = 6                      # 2^6 = NUM_PERM bins
+_VALUE_MASK = (1 << (64 - _BIN_BITS)) - 1
+_MASK64 = (1 << 64) - 1
+_EMPTY = _VALUE_MASK + 1
+
+
+def shingles(text, size=2):
+    """Tập hash 64-bit các cụm `size` từ liên tiếp (text ngắn hơn → cả text là 1 shingle)."""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    # crc32 → trộn lên 64 bit (Fibonacci hashing) cho bit cao phân bố đều
+    return {(zlib.crc32(g.encode()) * 0x9E3779B97F4A7C15 + 0x632BE59BD9B4E019) & _MASK64 for g in grams}
+
+
+def signature(hashes):
+    """MinHash 1 hoán vị: 6 bit cao chọn bin, min phần còn lại; bin rỗng mượn bin kế tiếp."""
+    sig = [_EMPTY] * NUM_PERM
+    for h in hashes:
+        b = h >> (64 - _BIN_BITS)
+        v = h & _VALUE_MASK
+        if v < sig[b]:
+            sig[b] = v
+    if not hashes:
+        return sig
+    dense = sig[:]
+    for b in range(NUM_PERM):
+        if sig[b] == _EMPTY:
+            step = 1
+            while sig[(b + step) % NUM_PERM] == _EMPTY:
+                step += 1
+            dense[b] = sig[(b + step) % NUM_PERM] + step * _EMPTY   # khác mọi giá trị bin thật
+    return dense
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def near_duplicate_clusters(texts, threshold=DEFAULT_THRESHOLD, bands=BANDS):
+    """
+    Returns: [[index, ...], ...] — mỗi cụm gần trùng (Jaccard shingle ≥ threshold),
+    phần tử trong cụm + các cụm theo thứ tự xuất hiện.
+    """
+    sets = [shingles(t) for t in texts]
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERM // bands
+    buckets = {}
+    for i, hashes in enumerate(sets):
+        if not hashes:
+            continue
+        sig = signature(hashes)
+        for band in range(bands):
+            key = (band, *sig[band * rows:(band + 1) * rows])
+            anchor = buckets.setdefault(key, i)
+            if anchor != i and find(anchor) != find(i) and jaccard(sets[anchor], hashes) >= threshold:
+                parent[find(i)] = find(anchor)
+
+    clusters = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return sorted(clusters.values(), key=lambda c: c[0])
+
+
+def collapse_trends(trends, threshold=DEFAULT_THRESHOLD):
+    """
+    Gộp trend gần trùng: giữ bản relevance cao nhất (bằng điểm → bản xuất hiện trước),
+    thêm "urls" (mọi url, bản giữ lại đứng đầu), keywords hợp nhất, "duplicates".
+    Returns: list trend mới, sắp theo relevance giảm dần.
+    """
+    texts = [f"{t.get('name', '')} {t.get('snippet', '')}" for t in trends]
+    merged = []
+    for cluster in near_duplicate_clusters(texts, threshold):
+        members = sorted(cluster, key=lambda i: (-trends[i].get("relevance", 0), i))
+        best = dict(trends[members[0]])
+        urls, keywords = [], []
+        for i in members:
+            url = trends[i].get("url")
+            if url and url not in urls:
+                urls.append(url)
+            keywords += [k for k in trends[i].get("keywords", []) if k not in keywords]
+        best["urls"] = urls
+        best["keywords"] = keywords
+        best["duplicates"] = len(members) - 1
+        merged.append(best)
+    merged.sort(key=lambda t: t.get("relevance", 0), reverse=True)
+    return merged
+
+
+if __name__ == "__main__":
+    # Quick self-test + benchmark
+    titles = [
+        ("Baby Shark Dance | Sing and Dance! | Animal Songs | PINKFONG Songs for Children",
+         "Baby Shark Dance, the most viewed video on YouTube, sing and dance with Pinkfong."),
+        ("Baby Shark Dance - Sing and Dance! Animal Songs | Pinkfong Songs for Children",
+         "Baby Shark Dance is the most viewed video on YouTube — sing and dance with Pinkfong!"),
+        ("Wheels on the Bus | CoComelon Nursery Rhymes & Kids Songs",
+         "Sing along with the wheels on the bus, a classic nursery rhyme for toddlers."),
+    ]
+    trends = [{"name": t, "snippet": s, "url": f"https://example.com/{i}", "relevance": 60 + i,
+               "keywords": [f"k{i}"]} for i, (t, s) in enumerate(titles)]
+    out = collapse_trends(trends)
+    assert len(out) == 2, out
+    shark = next(t for t in out if "Shark" in t["name"])
+    assert shark["urls"] == ["https://example.com/1", "https://example.com/0"], shark
+    assert shark["keywords"] == ["k1", "k0"] and shark["duplicates"] == 1
+
+    # Benchmark: mỗi "bài hát" 5 biến thể (đổi 1 từ, thêm 2 từ trang trí)
+    rng = random.Random(0)
+    vocab = [f"w{i}" for i in range(3000)]
+    decorations = ["official", "video", "hd", "lyrics", "kids", "new"]
+
+    def variants(count):
+        texts = []
+        for _ in range(count // 5):
+            song = [rng.choice(vocab) for _ in range(14)]
+            for _ in range(5):
+                words = list(song)
+                words[rng.randrange(len(words))] = rng.choice(vocab)
+                texts.append(" ".join(words + rng.sample(decorations, 2)))
+        return texts
+
+    # Recall của LSH so với so từng cặp (brute force)
+    sample = variants(400)
+    sets = [shingles(t) for t in sample]
+    pairs = [(i, j) for i in range(len(sets)) for j in range(i + 1, len(sets))
+             if jaccard(sets[i], sets[j]) >= DEFAULT_THRESHOLD]
+    cluster_of = {i: k for k, c in enumerate(near_duplicate_clusters(sample)) for i in c}
+    recall = sum(cluster_of[i] == cluster_of[j] for i, j in pairs) / len(pairs)
+    assert recall >= 0.95, recall
+    print(f"  recall so với brute force: {recall * 100:.1f}% ({len(pairs)} cặp)")
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    texts = variants(n)
+    start = time.perf_counter()
+    clusters = near_duplicate_clusters(texts)
+    elapsed = time.perf_counter() - start
+    print(f"  {len(texts)} kết quả → {len(clusters)} cụm trong {elapsed * 1000:.0f}ms")
+    print("\n✅ Trend dedup OK")
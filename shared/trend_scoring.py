@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+📊 MyShort — Trend Scoring
+Chấm điểm relevance + trích từ khóa cho toàn bộ kết quả search 1 lần (batch):
+
+- Mọi từ vựng (viral / kids / keywords / category) biên dịch thành 1 bảng cụm từ
+  theo token: so khớp cả từ ("top" không còn khớp "stop"), stem nhẹ để
+  "learning" / "songs" / "dancing" vẫn khớp "learn" / "song" / "dance"
+- Ma trận term-count (kết quả × cụm từ) → điểm = base + có mặt × trọng số nhóm
+  (NumPy nếu có, không có → Python thuần, cùng kết quả)
+- Từ vựng + trọng số cấu hình trong shared/trend_scoring.json
+  (hoặc file riêng qua TREND_SCORING_FILE)
+
+Usage:
+    scorer = get_scorer()
+    scores, keywords = scorer.score(texts, "music_dance")
+    python3 trend_scoring.py            # Self-test + benchmark
+"""
+
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils import RESOURCES_DIR, load_json
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_stems = {}
+
+
+def stem(token):
+    """Stem rất nhẹ (số nhiều / -ing / -ed / e cuối), áp dụng cho cả text lẫn từ vựng."""
+    if len(token) > 4 and token.endswith("ies"):
+        token = token[:-3] + "y"
+    elif len(token) > 5 and token.endswith("ing"):
+        token = token[:-3]
+    elif len(token) > 4 and token.endswith("ed"):
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    out = []
+    for token in _WORD_RE.findall(text.lower()):
+        stemmed = _stems.get(token)
+        if stemmed is None:
+            stemmed = stem(token)
+            if len(_stems) < 100000:
+                _stems[token] = stemmed
+        out.append(stemmed)
+    return out
+
+
+def load_scoring_config(path=None):
+    path = Path(path or os.environ.get("TREND_SCORING_FILE") or RESOURCES_DIR / "trend_scoring.json")
+    config = load_json(path)
+    if not isinstance(config.get("groups"), dict):
+        raise ValueError(f"{path}: thiếu 'groups'")
+    return config
+
+
+class TrendScorer:
+    """Từ vựng đã biên dịch: cụm từ (tuple stem) → cột của ma trận term-count."""
+
+    def __init__(self, config=None, use_numpy=True):
+        config = config or load_scoring_config()
+        self.base = config.get("base", 50)
+        self.max = config.get("max", 100)
+        self.category_weight = config.get("category_weight", 10)
+        self.max_keywords = config.get("max_keywords", 5)
+        self.category_terms = config.get("categories", {})
+        self.numpy = use_numpy and np is not None
+
+        self.terms = {}          # tuple stem → cột
+        self.weights = []        # trọng số cộng dồn của các nhóm chứa cụm từ
+        self.extract = []        # [(cột, từ khóa gốc)] theo thứ tự trong nhóm extract
+        for group in config["groups"].values():
+            for term in group.get("terms", []):
+                col = self._column(term)
+                self.weights[col] += group.get("weight", 0)
+                if group.get("extract") and col not in (c for c, _ in self.extract):
+                    self.extract.append((col, term))
+        self._categories = {}
+        self._index()
+
+    def _index(self):
+        """Token đầu → [(độ dài, cụm từ, cột)] (cụm từ 1 token tra thẳng self.single)."""
+        self.single = {k[0]: col for k, col in self.terms.items() if len(k) == 1}
+        self.phrases = {}
+        for key, col in self.terms.items():
+            if len(key) > 1:
+                self.phrases.setdefault(key[0], []).append((len(key), key, col))
+
+    def _column(self, term):
+        key = tuple(tokenize(term))
+        if key not in self.terms:
+            self.terms[key] = len(self.terms)
+            self.weights.append(0)
+        return self.terms[key]
+
+    def _category_columns(self, category):
+        """Cột các cụm từ của category (mặc định: tên category, "_" → " ")."""
+        if category not in self._categories:
+            phrases = self.category_terms.get(category) or ([category.replace("_", " ")] if category else [])
+            self._categories[category] = [self._column(p) for p in phrases]
+            self._index()
+        return self._categories[category]
+
+    # ── Matching ──
+
+    def match(self, text):
+        """Cột của mọi cụm từ xuất hiện trong text (lặp lại = đếm nhiều lần)."""
+        tokens = tokenize(text)
+        single, phrases = self.single, self.phrases
+        found = []
+        for i, token in enumerate(tokens):
+            col = single.get(token)
+            if col is not None:
+                found.append(col)
+            for length, key, col in phrases.get(token, ()):
+                if tuple(tokens[i:i + length]) == key:
+                    found.append(col)
+        return found
+
+    def count_matrix(self, texts):
+        """Ma trận term-count (len(texts) × số cụm từ): numpy array hoặc list các dict {cột: số lần}."""
+        matches = [self.match(t) for t in texts]
+        if not self.numpy:
+            counts = []
+            for cols in matches:
+                row = {}
+                for col in cols:
+                    row[col] = row.get(col, 0) + 1
+                counts.append(row)
+            return counts
+        width = len(self.terms)
+        rows = np.repeat(np.arange(len(texts)) * width, [len(m) for m in matches])
+        cols = np.array([c for m in matches for c in m], dtype=np.intp)
+        counts = np.bincount(rows + cols, minlength=len(texts) * width)
+        return counts.reshape(len(texts), width).astype(np.int32)
+
+    # ── Scoring ──
+
+    def score(self, texts, categories):
+        """
+        texts: ["title snippet", ...]; categories: 1 category cho tất cả hoặc list cùng độ dài
+        Returns: (scores [int 0-max], keywords [[str, ...]])
+        """
+        if isinstance(categories, str):
+            categories = [categories] * len(texts)
+        category_cols = {c: self._category_columns(c) for c in set(categories)}
+        counts = self.count_matrix(texts)
+        if self.numpy:
+            return self._score_numpy(counts, categories, category_cols)
+
+        scores, keywords = [], []
+        for row, category in zip(counts, categories):
+            score = self.base + sum(self.weights[col] for col in row)
+            if any(col in row for col in category_cols[category]):
+                score += self.category_weight
+            scores.append(min(score, self.max))
+            keywords.append([term for col, term in self.extract if col in row][:self.max_keywords])
+        return scores, keywords
+
+    def _score_numpy(self, counts, categories, category_cols):
+        present = counts > 0
+        scores = self.base + present @ np.asarray(self.weights, dtype=np.int32)
+        index = {c: i for i, c in enumerate(category_cols)}
+        labels = np.array([index[c] for c in categories], dtype=np.intp)
+        for category, cols in category_cols.items():
+            rows = np.flatnonzero(labels == index[category])
+            scores[rows] += self.category_weight * present[np.ix_(rows, cols)].any(axis=1)
+        scores = np.minimum(scores, self.max)
+
+        # Từ khóa: (hàng, cột) có mặt theo thứ tự nhóm extract → gom theo hàng
+        names = [term for _, term in self.extract]
+        keywords = [[] for _ in range(len(categories))]
+        for row, j in zip(*(a.tolist() for a in np.nonzero(present[:, [c for c, _ in self.extract]]))):
+            if len(keywords[row]) < self.max_keywords:
+                keywords[row].append(names[j])
+        return scores.tolist(), keywords
+
+
+_scorer = None
+
+
+def get_scorer():
+    """Scorer dùng chung trong process (từ vựng biên dịch 1 lần)."""
+    global _scorer
+    if _scorer is None:
+        _scorer = TrendScorer()
+    return _scorer
+
+
+if __name__ == "__main__":
+    # Quick self-test + benchmark
+    scorer = TrendScorer(use_numpy=False)
+    (stop,), _ = scorer.score(["Stop sign song for kids"], "general")
+    (top,), (kw,) = scorer.score(["Top 10 nursery rhymes: kids learning counting and dancing"], "general")
+    assert stop == 55, stop                       # chỉ "kids"
+    assert top == 50 + 10 + 5 * 3, top            # top + kids, nursery, learn
+    assert kw == ["nursery rhyme", "dance", "learn", "count"], kw
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    texts = [f"Viral kids song #{i} — toddlers learn colors with baby shark, top {i % 7} "
+             f"cartoon dance hits, million views this week" for i in range(n)]
+    categories = [("music_dance", "education", "characters", "general")[i % 4] for i in range(n)]
+    for use_numpy in ((False, True) if np is not None else (False,)):
+        engine = TrendScorer(use_numpy=use_numpy)
+        start = time.perf_counter()
+        result = engine.score(texts, categories)
+        elapsed = time.perf_counter() - start
+        print(f"  {'numpy' if use_numpy else 'python':<8}{n} kết quả: {elapsed * 1000:.1f}ms")
+        if use_numpy:
+            assert result == baseline
+        baseline = result
+    print("\n✅ Trend scoring OK")
@@ -78,6 +78,23 @@ def load_env(env_path=None):
             return str(path)
     return None
 
+def parse_llm_routes(spec, provider, model, api_key):
+    """
+    LLM_ROUTES="gemini:gemini-2.5-flash,openai:gpt-4o-mini" → [{provider, model, api_key}].
+    Key riêng mỗi provider: LLM_API_KEY_<PROVIDER> (không có → LLM_API_KEY).
+    Rỗng → 1 route từ LLM_PROVIDER / LLM_MODEL.
+    """
+    routes = []
+    for item in (spec or "").split(","):
+        name, _, route_model = item.strip().partition(":")
+        if name:
+            routes.append({
+                "provider": name,
+                "model": route_model or model,
+                "api_key": os.environ.get(f"LLM_API_KEY_{name.upper()}", api_key),
+            })
+    return routes or [{"provider": provider, "model": model, "api_key": api_key}]
+
 def get_config():
     """Lấy toàn bộ config từ env."""
     load_env()
@@ -86,25 +103,53 @@ def get_config():
         "llm_provider": os.environ.get("LLM_PROVIDER", "gemini"),
         "llm_model": os.environ.get("LLM_MODEL", "gemini-2.5-flash"),
         "llm_api_key": os.environ.get("LLM_API_KEY", ""),
+        "llm_stream": os.environ.get("LLM_STREAM", "1") != "0",
+        "llm_record_dir": os.environ.get("LLM_RECORD_DIR", ""),
+        "llm_routes": parse_llm_routes(os.environ.get("LLM_ROUTES", ""),
+                                       os.environ.get("LLM_PROVIDER", "gemini"),
+                                       os.environ.get("LLM_MODEL", "gemini-2.5-flash"),
+                                       os.environ.get("LLM_API_KEY", "")),
+        # Tiered: model nhanh/rẻ viết trước, chỉ lên LLM_ROUTES khi bản nháp hỏng (JSON/schema/an toàn)
+        "llm_fast_routes": parse_llm_routes(os.environ["LLM_FAST_ROUTES"],
+                                            os.environ.get("LLM_PROVIDER", "gemini"),
+                                            os.environ.get("LLM_MODEL", "gemini-2.5-flash"),
+                                            os.environ.get("LLM_API_KEY", ""))
+                           if os.environ.get("LLM_FAST_ROUTES") else [],
+        "llm_hedge": os.environ.get("LLM_HEDGE", "1") != "0",
+        "llm_concurrency": int(os.environ.get("LLM_CONCURRENCY", "4") or 4),
+        "llm_batch_poll_interval": float(os.environ.get("LLM_BATCH_POLL_INTERVAL", "30")),
+        "script_batch_scenes": int(os.environ.get("SCRIPT_BATCH_SCENES", "12") or 0),
+        "google_api_url": os.environ.get("GOOGLE_API_URL", "https://generativelanguage.googleapis.com"),
+        "openai_api_url": os.environ.get("OPENAI_API_URL", "https://api.openai.com/v1"),
         # Suno
         "suno_api_key": os.environ.get("SUNO_API_KEY", ""),
         "suno_api_url": os.environ.get("SUNO_API_URL", "https://studio-api.suno.ai"),
         "suno_timeout": int(os.environ.get("SUNO_TIMEOUT", "300")),
+        "suno_poll_interval": float(os.environ.get("SUNO_POLL_INTERVAL", "10")),
         # Google Veo
         "google_project": os.environ.get("GOOGLE_CLOUD_PROJECT", ""),
         "google_location": os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1"),
         "google_credentials": os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", ""),
         "google_veo_api_key": os.environ.get("GOOGLE_VEO_API_KEY", ""),
         "veo_timeout": int(os.environ.get("VEO_TIMEOUT", "600")),
+        "veo_poll_interval": float(os.environ.get("VEO_POLL_INTERVAL", "15")),
         # Telegram
         "telegram_token": os.environ.get("TELEGRAM_TOKEN", ""),
         "telegram_chat_id": os.environ.get("TELEGRAM_CHAT_ID", ""),
+        "telegram_api_url": os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org"),
         # Search
         "tavily_api_key": os.environ.get("TAVILY_API_KEY", ""),
+        "tavily_api_url": os.environ.get("TAVILY_API_URL", "https://api.tavily.com"),
+        # Gộp trend gần trùng khi Jaccard (cặp từ của title + snippet) ≥ ngưỡng
+        "trend_dedup_threshold": float(os.environ.get("TREND_DEDUP_THRESHOLD", "0.5")),
         # Output
         "output_dir": str(get_output_dir()),
         "ffmpeg_path": os.environ.get("FFMPEG_PATH", "ffmpeg"),
         "video_resolution": os.environ.get("VIDEO_RESOLUTION", "1080p"),
+        "render_profile": os.environ.get("RENDER_PROFILE", "standard"),
+        "render_workers": int(os.environ.get("RENDER_WORKERS", "0")),  # 0 = theo số core
+        # Metrics (Prometheus textfile cho node_exporter, mặc định OUTPUT_DIR/metrics/myshort.prom)
+        "metrics_textfile": os.environ.get("METRICS_TEXTFILE", ""),
     }
 
 # ── JSON I/O ──
@@ -127,21 +172,53 @@ def load_safety_keywords():
     safety_file = RESOURCES_DIR / "safety_keywords.json"
     if safety_file.exists():
         return load_json(safety_file)
-    return {"allowed_themes": [], "blocked_keywords": [], "age_appropriate": {}}
+    return {"allowed_themes": [], "blocked_keywords": [], "allowed_words": [], "age_appropriate": {}}
+
+_blocked_patterns = {}
+
+def _keyword_regex(keyword):
+    """
+    Regex cho 1 từ/cụm từ cấm, khớp theo gốc từ: từ cuối được nối thêm \\w* ở hàm gọi
+    → "kill" khớp "killer"/"killed", "murder" khớp "murdered". Đuôi -y đổi được thành -i
+    ("bully" → "bullied", "scary" → "scariest").
+    """
+    words = keyword.lower().split()
+    last = words[-1]
+    stem = re.escape(last[:-1]) + "[yi]" if last.endswith("y") and len(last) > 3 else re.escape(last)
+    return r"\s+".join([*map(re.escape, words[:-1]), stem])
+
+def _blocked_pattern(blocked, allowed=()):
+    """
+    Regex biên dịch 1 lần: (pattern từ cấm, keyword theo thứ tự group, pattern từ được phép).
+    Chỉ khớp ở ĐẦU từ (\\b) → "kill" không khớp "skills"; các từ vô hại trùng gốc
+    ("hello" ↔ "hell", "warm" ↔ "war") được bỏ qua qua danh sách allowed_words.
+    """
+    key = (tuple(blocked), tuple(allowed))
+    if key not in _blocked_patterns:
+        keywords = sorted({k for k in blocked if k.strip()}, key=len, reverse=True)
+        pattern = re.compile(r"\b(?:" + "|".join(f"({_keyword_regex(k)})" for k in keywords) + r")\w*",
+                             re.IGNORECASE) if keywords else None
+        phrases = sorted({r"\s+".join(map(re.escape, w.lower().split())) for w in allowed if w.strip()},
+                         key=len, reverse=True)
+        allow = re.compile(r"\b(?:" + "|".join(phrases) + r")\b", re.IGNORECASE) if phrases else None
+        _blocked_patterns[key] = (pattern, keywords, allow)
+    return _blocked_patterns[key]
 
 def check_content_safety(text):
     """
-    Kiểm tra nội dung có an toàn cho trẻ em không.
+    Kiểm tra nội dung có an toàn cho trẻ em không (khớp theo gốc từ, trừ allowed_words).
     Returns: (is_safe: bool, violations: list)
     """
     safety = load_safety_keywords()
     blocked = safety.get("blocked_keywords", [])
-    text_lower = text.lower()
+    pattern, keywords, allow = _blocked_pattern(blocked, safety.get("allowed_words", []))
     
-    violations = []
-    for keyword in blocked:
-        if keyword.lower() in text_lower:
-            violations.append(keyword)
+    allowed_spans = [m.span() for m in allow.finditer(text)] if allow else []
+    found = set()
+    for m in (pattern.finditer(text) if pattern else ()):
+        if not any(start <= m.start() < end for start, end in allowed_spans):
+            found.add(keywords[m.lastindex - 1])
+    violations = [keyword for keyword in blocked if keyword in found]
     
     return len(violations) == 0, violations
 
@@ -259,6 +336,48 @@ def print_warning(message):
 def print_error(message):
     print(f"  ❌ {message}", file=sys.stderr)
 
+# ── --json contract (agent ↔ orchestrator) ──
+
+_json_stdout = None
+
+def json_mode():
+    """
+    --json: stdout chỉ chứa đúng 1 JSON kết quả (emit_json); header / step / summary
+    của agent chuyển sang stderr để orchestrator json.loads(stdout) được.
+    """
+    global _json_stdout
+    if _json_stdout is None:
+        _json_stdout = sys.stdout
+        sys.stdout = sys.stderr
+
+def emit_json(data):
+    """In JSON kết quả ra stdout thật (kể cả khi đang ở json_mode)."""
+    out = _json_stdout or sys.stdout
+    out.write(json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+    out.flush()
+
+def parse_agent_output(stdout):
+    """
+    JSON kết quả từ stdout của agent --json. Agent cũ / bản deploy chưa cập nhật
+    còn in text trước JSON → lấy document JSON cuối cùng bắt đầu ở đầu dòng.
+    Returns: dict hoặc None.
+    """
+    text = (stdout or "").strip()
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, dict) else None
+    except json.JSONDecodeError:
+        pass
+    decoder = json.JSONDecoder()
+    for match in reversed(list(re.finditer(r"^\{", text, re.M))):
+        try:
+            data, end = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and not text[end:].strip():
+            return data
+    return None
+
 
 # ── Telegram ──
 
@@ -288,7 +407,8 @@ def send_telegram(message, config=None, parse_mode="Markdown"):
     if len(message) > 4000:
         message = message[:3950] + "\n\n... _(truncated)_"
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+    api_url = config.get("telegram_api_url", "https://api.telegram.org").rstrip("/")
+    url = f"{api_url}/bot{token}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": message,
@@ -328,6 +448,28 @@ if __name__ == "__main__":
     
     is_safe, violations = check_content_safety("violent fight scene with blood")
     print_success(f"Safety check (unsafe content): safe={is_safe}, violations={violations}")
+    assert violations == ["violent", "fight", "blood"], violations
+    
+    # Gốc từ: các dạng biến đổi vẫn bị chặn
+    for text, expected in [
+        ("the killer killed him", ["kill"]),
+        ("he was murdered", ["murder"]),
+        ("a bullied kid", ["bully"]),
+        ("terrorist bombing", ["terror", "bomb"]),
+        ("poisonous snake", ["poison"]),
+        ("fighters fought", ["fight", "fought"]),
+        ("drunk alcoholic", ["drunk", "alcohol"]),
+        ("No guns or Stranger  Danger here", ["gun", "stranger danger"]),
+    ]:
+        is_safe, violations = check_content_safety(text)
+        assert violations == expected, (text, violations)
+    
+    # Đầu từ + allowed_words: "skills" / "hello" / "warm" không phải "kill" / "hell" / "war"
+    for text in ["Hello friends! Learn new skills on a warm, sunny day",
+                 "A shell, a swordfish and a killer whale meet before the deadline"]:
+        is_safe, violations = check_content_safety(text)
+        assert is_safe, (text, violations)
+    print_success("Safety check (gốc từ): killed/murdered/bullied bị chặn, hello/skills/warm an toàn")
     
     # Check output dirs
     base = ensure_output_dirs()
@@ -30,10 +30,15 @@ from utils import (
     setup_logging, get_config, ensure_output_dirs, save_json,
     load_safety_keywords, print_header, print_step, print_success,
     print_warning, print_error, safe_filename, get_output_dir,
-    send_telegram
+    send_telegram, json_mode, emit_json
 )
+from tracing import get_tracer, trace_response
+from profiling import run_profiled
+from trend_scoring import get_scorer
+from trend_dedup import collapse_trends
 
 logger = setup_logging("TrendResearcher")
+tracer = get_tracer("trend_researcher")
 
 # ── Search Queries ──
 TREND_QUERIES = {
@@ -73,7 +78,7 @@ def run_search(query, max_results=5, search_type="text"):
         logger.warning("TAVILY_API_KEY chưa set — bỏ qua query: " + query)
         return []
 
-    url = "https://api.tavily.com/search"
+    url = f"{config.get('tavily_api_url', 'https://api.tavily.com').rstrip('/')}/search"
     payload = {
         "api_key": api_key,
         "query": query,
@@ -87,7 +92,9 @@ def run_search(query, max_results=5, search_type="text"):
 
     try:
         import requests
-        response = requests.post(url, json=payload, timeout=15)
+        with tracer.span("http:tavily", query=query[:60]) as span:
+            response = requests.post(url, json=payload, timeout=15)
+            trace_response(span, response)
         response.raise_for_status()
         data = response.json()
 
@@ -105,7 +112,7 @@ def run_search(query, max_results=5, search_type="text"):
         return []
 
 def analyze_trends(search_results, category, age_range):
-    """Phân tích kết quả tìm kiếm thành xu hướng cấu trúc."""
+    """Phân tích kết quả tìm kiếm thành xu hướng cấu trúc (chấm điểm cả batch 1 lần)."""
     trends = []
     safety = load_safety_keywords()
     blocked = [kw.lower() for kw in safety.get("blocked_keywords", [])]
@@ -126,60 +133,31 @@ def analyze_trends(search_results, category, age_range):
             logger.debug(f"Blocked unsafe content: {title[:50]}")
             continue
         
-        trend = {
+        trends.append({
             "name": title[:100] if title else "Unknown Trend",
             "category": category,
             "target_age": age_range,
             "url": url,
             "snippet": snippet[:200] if snippet else "",
-            "keywords": extract_keywords(title, snippet),
-            "relevance": calculate_relevance(title, snippet, category),
-        }
-        trends.append(trend)
+            "_text": f"{title} {snippet}",
+        })
+    
+    scores, keywords = get_scorer().score([t.pop("_text") for t in trends], category)
+    for trend, score, words in zip(trends, scores, keywords):
+        trend["keywords"] = words
+        trend["relevance"] = score
     
     # Sort by relevance
     trends.sort(key=lambda t: t["relevance"], reverse=True)
     return trends
 
 def extract_keywords(title, snippet):
-    """Trích xuất từ khóa chính từ title và snippet."""
-    import re
-    text = f"{title} {snippet}".lower()
-    # Từ khóa phổ biến trong lĩnh vực kids content
-    kids_keywords = [
-        "nursery rhyme", "kids song", "children", "toddler", "baby",
-        "dance", "sing", "learn", "count", "color", "shape", "alphabet",
-        "cartoon", "animation", "cocomelon", "pinkfong", "baby shark",
-        "educational", "fun", "play", "game", "story", "fairy tale",
-        "animal", "dinosaur", "vehicle", "truck", "train",
-        "rainbow", "music", "lullaby", "bedtime"
-    ]
-    
-    found = [kw for kw in kids_keywords if kw in text]
-    return found[:5]  # Top 5 keywords
+    """Trích xuất từ khóa chính từ title và snippet (tối đa max_keywords, mặc định 5)."""
+    return get_scorer().score([f"{title} {snippet}"], "")[1][0]
 
 def calculate_relevance(title, snippet, category):
     """Tính điểm relevance (0-100) dựa trên nội dung."""
-    score = 50  # Base score
-    text = f"{title} {snippet}".lower()
-    
-    # Boost for viral indicators
-    viral_words = ["viral", "trending", "popular", "million views", "top", "best", "hit"]
-    for word in viral_words:
-        if word in text:
-            score += 10
-    
-    # Boost for kids-specific content
-    kids_words = ["kids", "children", "toddler", "baby", "nursery", "learn"]
-    for word in kids_words:
-        if word in text:
-            score += 5
-    
-    # Boost for category match
-    if category.replace("_", " ") in text:
-        score += 10
-    
-    return min(score, 100)
+    return get_scorer().score([f"{title} {snippet}"], category)[0][0]
 
 def research_trends(categories=None, max_per_category=5, age_range="2-8", dry_run=False):
     """Quy trình chính: nghiên cứu xu hướng."""
@@ -189,6 +167,7 @@ def research_trends(categories=None, max_per_category=5, age_range="2-8", dry_ru
         categories = list(TREND_QUERIES.keys())
     
     all_trends = []
+    threshold = get_config().get("trend_dedup_threshold", 0.5)
     total_queries = sum(len(TREND_QUERIES.get(cat, [])) for cat in categories)
     query_count = 0
     
@@ -203,6 +182,7 @@ def research_trends(categories=None, max_per_category=5, age_range="2-8", dry_ru
         print(f"\n  📁 Category: {category}")
         
         category_trends = []
+        category_results = []
         for query_template in queries:
             query = query_template.format(year=year)
             query_count += 1
@@ -221,27 +201,25 @@ def research_trends(categories=None, max_per_category=5, age_range="2-8", dry_ru
                 })
                 continue
             
-            results = run_search(query, max_results=max_per_category)
-            trends = analyze_trends(results, category, age_range)
-            category_trends.extend(trends)
+            category_results.extend(run_search(query, max_results=max_per_category))
         
-        # Deduplicate and take top N
-        seen = set()
-        unique = []
-        for t in category_trends:
-            key = t["name"][:50].lower()
-            if key not in seen:
-                seen.add(key)
-                unique.append(t)
+        # Chấm điểm toàn bộ kết quả của category 1 lần
+        if category_results:
+            category_trends.extend(analyze_trends(category_results, category, age_range))
+        
+        # Gộp kết quả gần trùng (cùng bài, tiêu đề hơi khác) rồi lấy top N
+        unique = collapse_trends(category_trends, threshold)
+        duplicates = len(category_trends) - len(unique)
         
         all_trends.extend(unique[:max_per_category])
-        print_success(f"  Tìm được {len(unique)} xu hướng trong {category}")
+        print_success(f"  Tìm được {len(unique)} xu hướng trong {category}"
+                      + (f" (gộp {duplicates} kết quả trùng)" if duplicates else ""))
+    
+    # Cùng 1 xu hướng có thể lọt top của nhiều category
+    all_trends = collapse_trends(all_trends, threshold)
     
     # Pick recommended topic
-    recommended = None
-    if all_trends:
-        all_trends.sort(key=lambda t: t["relevance"], reverse=True)
-        recommended = all_trends[0]
+    recommended = all_trends[0] if all_trends else None
     
     return {
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -269,7 +247,11 @@ def main():
     parser.add_argument("--output", help="Đường dẫn file output (mặc định: auto)")
     parser.add_argument("--json", action="store_true",
                        help="In kết quả ra stdout dạng JSON")
+    parser.add_argument("--profile", nargs="?", const="auto", metavar="PATH",
+                       help="Chạy dưới cProfile, lưu .prof (mặc định: OUTPUT_DIR/profiles/)")
     args = parser.parse_args()
+    if args.json:
+        json_mode()
     
     categories = [args.category] if args.category else None
     
@@ -281,17 +263,17 @@ def main():
         dry_run=args.dry_run,
     )
     
+    # Save to file (cả khi --json: bước sau đọc file, stdout chỉ báo đường dẫn)
+    output_dir = ensure_output_dirs()
+    output_path = args.output or str(
+        output_dir / "trends" / f"trend-{datetime.now().strftime('%Y%m%d')}.json"
+    )
+    save_json(result, output_path)
+    
     # Output
     if args.json:
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        emit_json({**result, "output_file": output_path})
     else:
-        # Save to file
-        output_dir = ensure_output_dirs()
-        output_path = args.output or str(
-            output_dir / "trends" / f"trend-{datetime.now().strftime('%Y%m%d')}.json"
-        )
-        save_json(result, output_path)
-        
         # Summary
         print(f"\n{'━' * 50}")
         print(f"📊 KẾT QUẢ: {result['total_trends']} xu hướng tìm được")
@@ -322,7 +304,8 @@ def main():
         url = t.get('url', '')
         snippet = t.get('snippet', '')[:100]
         msg_lines.append(f"{i+1}. [{cat}] *{name}*")
-        msg_lines.append(f"   Score: {score} | {kwords}")
+        sources = f" | {len(t['urls'])} nguồn" if len(t.get('urls', [])) > 1 else ""
+        msg_lines.append(f"   Score: {score} | {kwords}{sources}")
         if url:
             msg_lines.append(f"   🔗 {url}")
         if snippet:
@@ -340,4 +323,4 @@ def main():
     print_success("Đã gửi kết quả qua Telegram")
 
 if __name__ == "__main__":
-    main()
+    run_profiled(main, "trend_researcher")
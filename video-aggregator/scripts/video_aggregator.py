@@ -4,9 +4,9 @@
 Kỹ thuật viên hậu kỳ — Ghép video + audio, gửi qua Telegram.
 
 Sử dụng FFmpeg để:
-- Ghép video clips theo thứ tự
+- Encode song song từng clip thành segment (fade ở segment đầu/cuối)
+- Nối segments bằng stream copy
 - Overlay audio lên video
-- Thêm transitions
 - Export MP4 1080p
 - Gửi qua Telegram Bot API
 
@@ -14,14 +14,16 @@ Usage:
     python3 video_aggregator.py --audio audio.mp3 --clips-dir clips/    # Ghép + gửi TG
     python3 video_aggregator.py --clips-dir clips/ --dry-run            # Test FFmpeg
     python3 video_aggregator.py --send-only final.mp4                   # Chỉ gửi TG
+    python3 video_aggregator.py --clips-dir clips/ --render-profile draft  # Bản nháp nhanh
+    python3 video_aggregator.py --clips-dir clips/ --workers 8          # 8 segments song song
 """
 
 import argparse
 import json
 import os
-import re
 import subprocess
 import sys
+import tempfile
 import time
 from datetime import datetime
 from pathlib import Path
@@ -31,10 +33,54 @@ sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
 from utils import (
     setup_logging, get_config, ensure_output_dirs, save_json, load_json,
     print_header, print_step, print_success, print_warning, print_error,
-    safe_filename, get_output_dir
+    safe_filename, get_output_dir, json_mode, emit_json
 )
+from tracing import get_tracer
+from ffmpeg_runner import probe_duration, run_ffmpeg
+from profiling import run_profiled
 
 logger = setup_logging("VideoAggregator")
+tracer = get_tracer("video_aggregator")
+
+# ── Render Profiles ──
+# draft: review nhịp/timing nhanh | standard: mặc định | final: bản publish
+RENDER_PROFILES = {
+    "draft": {
+        "resolution": "854:480", "fps": 24,
+        "normalize_preset": "ultrafast", "preset": "ultrafast", "crf": 30,
+    },
+    "standard": {
+        "resolution": "1920:1080", "fps": 30,
+        "normalize_preset": "fast", "preset": "medium", "crf": 23,
+    },
+    "final": {
+        "resolution": "1920:1080", "fps": 30,
+        "normalize_preset": "medium", "preset": "slow", "crf": 20,
+    },
+}
+DEFAULT_RENDER_PROFILE = "standard"
+
+# ── Renditions (xuất thêm từ cùng 1 lần decode của bản master) ──
+RENDITIONS = {
+    "shorts": {
+        "label": "YouTube Shorts 9:16",
+        "vertical": True,
+    },
+    "telegram": {
+        "label": "Telegram preview",
+        "height": 480,
+        "video_bitrate": "1200k",
+        "audio_bitrate": "96k",
+    },
+}
+
+def get_render_profile(name=None):
+    """Lấy render profile theo tên (fallback: standard)."""
+    if name not in RENDER_PROFILES:
+        if name:
+            logger.warning(f"Render profile '{name}' không tồn tại → dùng {DEFAULT_RENDER_PROFILE}")
+        name = DEFAULT_RENDER_PROFILE
+    return {"name": name, **RENDER_PROFILES[name]}
 
 def find_clips(clips_dir):
     """Tìm tất cả video clips trong thư mục, sắp xếp theo tên."""
@@ -49,9 +95,24 @@ def find_clips(clips_dir):
     ])
     return clips
 
-def create_concat_file(clips, output_dir):
+def load_clip_timeline(clips_dir):
+    """
+    Đọc timeline.json do Agent 4 ghi (duration đã lập cho từng clip).
+    Returns: dict {tên file clip: duration giây}, rỗng nếu không có.
+    """
+    timeline_file = Path(clips_dir) / "timeline.json" if clips_dir else None
+    if not timeline_file or not timeline_file.exists():
+        return {}
+    try:
+        timeline = load_json(timeline_file)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"timeline.json lỗi, bỏ qua: {e}")
+        return {}
+    return {c["file"]: c["duration"] for c in timeline.get("clips", []) if c.get("duration")}
+
+def create_concat_file(clips, output_dir, name="concat-list.txt"):
     """Tạo file concat list cho FFmpeg."""
-    concat_file = Path(output_dir) / "concat-list.txt"
+    concat_file = Path(output_dir) / name
     with open(concat_file, "w", encoding="utf-8") as f:
         for clip in clips:
             # FFmpeg cần escape single quotes
@@ -62,101 +123,412 @@ def create_concat_file(clips, output_dir):
 def get_media_duration(file_path, ffmpeg_path="ffmpeg"):
     """Đo duration (giây) của file media bằng FFmpeg."""
     try:
-        cmd = [ffmpeg_path, "-i", str(file_path), "-hide_banner", "-f", "null", "-"]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        match = re.search(r"Duration: (\d{2}):(\d{2}):(\d{2})\.(\d{2})", result.stderr)
-        if match:
-            h, m, s, cs = int(match.group(1)), int(match.group(2)), int(match.group(3)), int(match.group(4))
-            return h * 3600 + m * 60 + s + cs / 100.0
+        return probe_duration(file_path, ffmpeg_path)
     except Exception as e:
         logger.warning(f"Cannot measure duration: {e}")
     return None
 
-def normalize_clips(clips, output_dir, ffmpeg_path="ffmpeg", target_fps=30, target_res="1920:1080"):
+def get_render_workers(workers=None, jobs=None):
+    """
+    Số lệnh ffmpeg chạy song song + số thread mỗi lệnh.
+    workers: 0/None → tự chọn theo số core (RENDER_WORKERS trong .env)
+    Returns: (workers, threads_per_worker)
+    """
+    cores = os.cpu_count() or 1
+    workers = workers or max(cores // 2, 1)
+    if jobs:
+        workers = min(workers, jobs)
+    workers = max(workers, 1)
+    return workers, max(cores // workers, 1)
+
+def get_segment_durations(clips, ffmpeg_path="ffmpeg", durations=None, workers=1,
+                          hashes=None, probe_cache=None):
     """
-    Normalize tất cả clips về cùng codec/fps/resolution trước khi concat.
-    Tránh lỗi FFmpeg khi concat clips khác format.
+    Duration thật của từng segment: min(duration đã lập trong timeline, duration clip).
+    Clip không có trong timeline + clip cuối (cần mốc fade out) → đo bằng FFmpeg (song song).
+    probe_cache: {hash clip: duration} — clip đã đo ở lần render trước thì không decode lại
+    (được cập nhật tại chỗ).
     """
-    normalized = []
-    norm_dir = Path(output_dir) / "normalized"
-    norm_dir.mkdir(parents=True, exist_ok=True)
+    from concurrent.futures import ThreadPoolExecutor
 
+    durations = durations or {}
+    probe_cache = probe_cache if probe_cache is not None else {}
+    hashes = hashes or [None] * len(clips)
+    last = len(clips) - 1
+    probed = {i: probe_cache[hashes[i]] for i in range(len(clips)) if hashes[i] in probe_cache}
+    to_probe = [i for i, clip in enumerate(clips)
+                if (clip.name not in durations or i == last) and i not in probed]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, value in zip(to_probe, pool.map(lambda i: get_media_duration(clips[i], ffmpeg_path), to_probe)):
+            probed[i] = value
+            if value and hashes[i]:
+                probe_cache[hashes[i]] = value
+
+    result = []
     for i, clip in enumerate(clips):
-        out_path = norm_dir / f"norm-{i:03d}.mp4"
-        cmd = [
-            ffmpeg_path, "-y",
-            "-i", str(clip),
-            "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-            "-r", str(target_fps),
-            "-vf", f"scale={target_res}:force_original_aspect_ratio=decrease,pad={target_res}:(ow-iw)/2:(oh-ih)/2:color=black",
-            "-pix_fmt", "yuv420p",
-            "-an",  # Remove any existing audio
-            "-movflags", "+faststart",
-            str(out_path)
-        ]
+        values = [v for v in (durations.get(clip.name), probed.get(i)) if v]
+        result.append(min(values) if values else None)
+    return result
 
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-            if result.returncode == 0:
-                normalized.append(out_path)
-            else:
-                logger.warning(f"Normalize failed for {clip}: {result.stderr[:200]}")
-                normalized.append(clip)  # fallback to original
-        except Exception as e:
-            logger.warning(f"Normalize error: {e}")
-            normalized.append(clip)
-
-    return normalized
-
-def merge_clips(clips, output_path, ffmpeg_path="ffmpeg"):
-    """Ghép tất cả clips thành 1 video."""
-    if not clips:
-        print_error("Không có clips để ghép!")
+def file_hash(file_path, chunk_size=1024 * 1024):
+    """SHA1 nội dung file (clip Veo tạo lại cùng tên vẫn ra hash khác)."""
+    import hashlib
+
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_temp_path(directory, name):
+    """
+    File tạm duy nhất (mkstemp) trong cùng thư mục với file đích: .tmp-<ngẫu nhiên>-<name>
+    → encode vào đây rồi os.replace (atomic). Giữ đuôi của name để ffmpeg chọn muxer.
+    """
+    fd, path = tempfile.mkstemp(prefix=".tmp-", suffix=f"-{name}", dir=directory)
+    os.close(fd)
+    return Path(path)
+
+class SegmentCache:
+    """
+    Cache segment đã encode, key = (hash clip, vị trí, render profile).
+    Vị trí = vai trò trong timeline (only/first/middle/last) vì chỉ segment
+    đầu/cuối có fade/pad — thêm/bớt clip ở giữa không làm mất cache.
+    Thay 1 clip → chỉ encode lại đúng segment đó, phần còn lại nối bằng stream copy.
+    """
+
+    INDEX_FILE = "index.json"
+    MAX_AGE_DAYS = 7
+
+    def __init__(self, cache_dir):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / self.INDEX_FILE
+        self.durations = {}
+        if self.index_path.exists():
+            try:
+                self.durations = load_json(self.index_path).get("durations", {})
+            except (OSError, json.JSONDecodeError):
+                pass
+
+    @staticmethod
+    def position(index, count):
+        if count == 1:
+            return "only"
+        return "first" if index == 0 else "last" if index == count - 1 else "middle"
+
+    @staticmethod
+    def key(clip_hash, position, profile, **params):
+        """params: duration / fade / pad — ảnh hưởng trực tiếp tới nội dung segment."""
+        import hashlib
+
+        spec = {"clip": clip_hash, "position": position,
+                "profile": {k: v for k, v in sorted(profile.items())},
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in sorted(params.items())}}
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:20]
+
+    def path(self, key):
+        return self.dir / f"seg-{key}.mp4"
+
+    def get(self, key):
+        path = self.path(key)
+        if path.exists() and path.stat().st_size > 0:
+            os.utime(path)  # đánh dấu vừa dùng (prune theo mtime)
+            return path
+        return None
+
+    def tmp_path(self, key):
+        """File tạm riêng cho mỗi lần encode (nhiều worker / process cùng key không ghi đè nhau)."""
+        return make_temp_path(self.dir, f"{key}.mp4")
+
+    def put(self, key, tmp_path):
+        os.replace(tmp_path, self.path(key))
+        return self.path(key)
+
+    def save_index(self):
+        save_json({"durations": self.durations}, str(self.index_path))
+
+    def prune(self, max_age_days=None):
+        """Xóa segment không được dùng trong N ngày."""
+        cutoff = time.time() - (max_age_days or self.MAX_AGE_DAYS) * 86400
+        removed = 0
+        for path in self.dir.glob("seg-*.mp4"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        for path in self.dir.glob(".tmp-*.mp4"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+        return removed
+
+def encode_segment(clip, output_path, ffmpeg_path="ffmpeg", profile=None, duration=None,
+                   fade_in=0, fade_out=0, pad_tail=0, threads=None, index=0, parent=None):
+    """
+    Encode 1 clip thành 1 segment của bản final (normalize + encode trong 1 lệnh).
+    Mọi segment dùng CÙNG codec/fps/resolution/timescale → concat bằng stream copy được.
+    fade_in / fade_out: chỉ segment đầu / cuối; pad_tail: kéo dài frame cuối (khớp audio).
+    """
+    profile = profile or get_render_profile()
+    res = profile["resolution"]
+    filters = [
+        f"scale={res}:force_original_aspect_ratio=decrease",
+        f"pad={res}:(ow-iw)/2:(oh-ih)/2:color=black",
+        "setsar=1",
+        f"fps={profile['fps']}",
+    ]
+    total = (duration + pad_tail) if duration else None
+    if pad_tail > 0:
+        filters.append(f"tpad=stop_mode=clone:stop_duration={pad_tail:.3f}")
+    if fade_in:
+        filters.append(f"fade=t=in:st=0:d={fade_in}")
+    if fade_out and total:
+        filters.append(f"fade=t=out:st={round(max(total - fade_out, 0), 3)}:d={fade_out}")
+
+    cmd = [
+        ffmpeg_path, "-y",
+        "-i", str(clip),
+        "-vf", ",".join(filters),
+        "-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"]),
+        "-pix_fmt", "yuv420p",
+        "-video_track_timescale", "90000",
+        "-an",
+    ]
+    if threads:
+        cmd.extend(["-threads", str(threads)])
+    if total:
+        cmd.extend(["-t", f"{total:.3f}"])
+    cmd.append(str(output_path))
+
+    try:
+        result = run_ffmpeg(cmd, name="ffmpeg:segment", duration=total, logger=logger,
+                            parent=parent, clip=index)
+        if result.returncode != 0:
+            logger.warning(f"Segment {index} failed ({clip}): {result.stderr[-300:]}")
+            return False
+        return True
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        logger.warning(f"Segment {index} error: {e}")
         return False
-    
-    output_dir = Path(output_path).parent
-    concat_file = create_concat_file(clips, output_dir)
-    
+
+def encode_segments(clips, cache_dir, ffmpeg_path="ffmpeg", profile=None, durations=None,
+                    fade_sec=0.5, min_duration=None, workers=None, stats=None):
+    """
+    Encode song song từng clip thành segment (chia timeline tại ranh giới clip).
+    Mỗi worker chạy 1 process ffmpeg với cores/workers thread → tận dụng hết core.
+    Segment đã có trong SegmentCache (cache_dir) được dùng lại, không encode.
+    min_duration: tổng độ dài tối thiểu (vd. duration audio) → pad frame cuối segment cuối.
+    stats: dict (tùy chọn) nhận {"cached": n, "encoded": m}.
+
+    Returns: list đường dẫn segment (theo thứ tự), hoặc None nếu có segment lỗi.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    profile = profile or get_render_profile()
+    cache = SegmentCache(cache_dir)
+    cache.prune()
+    workers, threads = get_render_workers(workers, len(clips))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(file_hash, clips))
+    seg_durations = get_segment_durations(clips, ffmpeg_path, durations, workers,
+                                          hashes=hashes, probe_cache=cache.durations)
+    cache.save_index()
+    known = [d for d in seg_durations if d]
+    pad_tail = 0
+    if min_duration and len(known) == len(clips) and min_duration - sum(known) > 2:
+        pad_tail = min_duration - sum(known)
+        print(f"    🔧 Pad segment cuối +{pad_tail:.1f}s (video ngắn hơn audio)")
+
+    last = len(clips) - 1
+    jobs = []
+    for i in range(len(clips)):
+        job = {
+            "duration": seg_durations[i],
+            "fade_in": fade_sec if i == 0 else 0,
+            "fade_out": fade_sec if i == last else 0,
+            "pad_tail": round(pad_tail, 3) if i == last else 0,
+        }
+        job["key"] = SegmentCache.key(hashes[i], SegmentCache.position(i, len(clips)), profile, **job)
+        jobs.append(job)
+
+    segments = [cache.get(job["key"]) for job in jobs]
+    todo = [i for i, seg in enumerate(segments) if seg is None]
+    if len(todo) < len(clips):
+        print(f"    ♻️  Dùng lại {len(clips) - len(todo)}/{len(clips)} segments từ cache")
+    if todo:
+        print(f"    ⚙️  Encode {len(todo)} segments | {min(workers, len(todo))} workers × {threads} threads")
+    if stats is not None:
+        stats.update(cached=len(clips) - len(todo), encoded=len(todo))
+
+    with tracer.span("render:segments", segments=len(clips), cached=len(clips) - len(todo),
+                     workers=workers, threads=threads) as span:
+        def _encode(i):
+            job = jobs[i]
+            tmp = cache.tmp_path(job["key"])
+            ok = encode_segment(
+                clips[i], tmp, ffmpeg_path, profile, duration=job["duration"],
+                fade_in=job["fade_in"], fade_out=job["fade_out"], pad_tail=job["pad_tail"],
+                threads=threads, index=i, parent=span.id,
+            )
+            if not ok:
+                tmp.unlink(missing_ok=True)
+                return None
+            return cache.put(job["key"], tmp)
+
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+                for i, seg in zip(todo, pool.map(_encode, todo)):
+                    segments[i] = seg
+        failed = [i for i, seg in enumerate(segments) if seg is None]
+        span.set(failed=failed)
+
+    if failed:
+        print_error(f"Segment lỗi: {', '.join(str(i) for i in failed)}")
+        return None
+    return segments
+
+def concat_segments(segments, output_path, ffmpeg_path="ffmpeg"):
+    """Nối segments bằng concat demuxer + stream copy (không encode lại)."""
+    output_path = Path(output_path)
+    concat_file = create_concat_file(segments, output_path.parent, f"{output_path.stem}-concat.txt")
     cmd = [
-        ffmpeg_path,
-        "-y",                           # Overwrite output
-        "-f", "concat",
-        "-safe", "0",
+        ffmpeg_path, "-y",
+        "-f", "concat", "-safe", "0",
         "-i", concat_file,
-        "-c:v", "libx264",             # H.264 encoding
-        "-preset", "medium",
-        "-crf", "23",                   # Quality (lower = better)
-        "-pix_fmt", "yuv420p",          # Compatible pixel format
-        "-movflags", "+faststart",      # Enable streaming
-        output_path
+        "-c", "copy",
+        "-movflags", "+faststart",
+        str(output_path),
     ]
-    
-    logger.info(f"FFmpeg concat: {' '.join(cmd)}")
-    
+    logger.info(f"FFmpeg concat (copy): {len(segments)} segments → {output_path}")
     try:
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=300
-        )
+        result = run_ffmpeg(cmd, name="ffmpeg:concat-copy", logger=logger, segments=len(segments))
         if result.returncode != 0:
-            print_error(f"FFmpeg concat failed: {result.stderr[:500]}")
+            print_error(f"FFmpeg concat failed: {result.stderr[-500:]}")
             return False
         return True
-    except subprocess.TimeoutExpired:
-        print_error("FFmpeg timeout (300s)!")
+    except subprocess.TimeoutExpired as e:
+        print_error(f"FFmpeg bị treo (không tiến triển {e.timeout:.0f}s)!")
         return False
     except FileNotFoundError:
-        print_error(f"FFmpeg không tìm thấy: {ffmpeg_path}. Cài: sudo apt install ffmpeg")
+        print_error(f"FFmpeg không tìm thấy: {ffmpeg_path}")
         return False
 
-def overlay_audio(video_path, audio_path, output_path, ffmpeg_path="ffmpeg"):
+# ── Audio track (loudnorm + AAC, encode 1 lần / file nhạc) ──
+LOUDNORM_TARGET = {"I": -14.0, "TP": -1.5, "LRA": 11.0}  # ~ chuẩn loudness YouTube
+AUDIO_BITRATE = "192k"
+AUDIO_FADE_SEC = 3
+
+def measure_loudness(audio_path, ffmpeg_path="ffmpeg"):
+    """Pass 1 của loudnorm: đo loudness thật. Returns: dict measured_* hoặc None."""
+    import re
+
+    target = ":".join(f"{k}={v}" for k, v in LOUDNORM_TARGET.items())
+    cmd = [ffmpeg_path, "-hide_banner", "-i", str(audio_path),
+           "-af", f"loudnorm={target}:print_format=json", "-vn", "-f", "null", "-"]
+    try:
+        result = run_ffmpeg(cmd, name="ffmpeg:loudnorm-measure", logger=logger)
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        logger.warning(f"Loudnorm measure error: {e}")
+        return None
+    match = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", result.stderr or "")
+    if result.returncode != 0 or not match:
+        logger.warning(f"Loudnorm measure failed: {(result.stderr or '')[-200:]}")
+        return None
+    data = json.loads(match.group(0))
+    return {
+        "measured_I": data["input_i"], "measured_TP": data["input_tp"],
+        "measured_LRA": data["input_lra"], "measured_thresh": data["input_thresh"],
+        "offset": data["target_offset"],
+    }
+
+def prepare_audio_track(audio_path, ffmpeg_path="ffmpeg", fade_out=False, cache_dir=None):
+    """
+    Transcode + loudness-normalize file nhạc thành AAC 1 lần, cache theo hash nội dung
+    (cả kết quả đo loudnorm) → mọi lệnh mux dùng -c:a copy.
+    fade_out: biến thể fade AUDIO_FADE_SEC giây cuối (strategy fade_audio), cũng được cache.
+
+    Returns: {"file", "duration", "cached"} hoặc None nếu thất bại.
+    """
+    cache_dir = Path(cache_dir or get_output_dir() / "final" / "audio-cache")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index_path = cache_dir / "index.json"
+    try:
+        index = load_json(index_path) if index_path.exists() else {}
+    except (OSError, json.JSONDecodeError):
+        index = {}
+
+    import hashlib
+
+    target = ":".join(f"{k}={v}" for k, v in LOUDNORM_TARGET.items())
+    key = hashlib.sha1(f"{file_hash(audio_path)}|{target}|{AUDIO_BITRATE}".encode()).hexdigest()[:20]
+    entry = index.setdefault(key, {"source": str(audio_path)})
+    base = cache_dir / f"audio-{key}.m4a"
+    track = cache_dir / f"audio-{key}-fade{AUDIO_FADE_SEC}.m4a" if fade_out else base
+
+    # Chỉ dùng cache khi bản encode dùng loudnorm 2-pass (đã đo được)
+    if track.exists() and entry.get("duration") and entry.get("loudnorm"):
+        return {"file": str(track), "duration": entry["duration"], "cached": True}
+
+    def _encode(cmd, name, output):
+        tmp = output.with_name(f".tmp-{os.getpid()}-{output.name}")
+        try:
+            result = run_ffmpeg(cmd + [str(tmp)], name=name, duration=entry.get("duration"), logger=logger)
+        except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+            logger.warning(f"{name} error: {e}")
+            tmp.unlink(missing_ok=True)
+            return False
+        if result.returncode != 0:
+            logger.warning(f"{name} failed: {result.stderr[-200:]}")
+            tmp.unlink(missing_ok=True)
+            return False
+        os.replace(tmp, output)
+        return True
+
+    encoded = False
+    if not base.exists() or not entry.get("loudnorm"):
+        # Đo lỗi → không ghi vào index: lần sau đo + encode lại thay vì dùng mãi bản 1-pass
+        measured = entry.get("loudnorm") or measure_loudness(audio_path, ffmpeg_path)
+        if measured:
+            entry["loudnorm"] = measured
+        else:
+            entry.pop("loudnorm", None)
+        af = f"loudnorm={target}"
+        if measured:
+            af += ":" + ":".join(f"{k}={v}" for k, v in measured.items()) + ":linear=true"
+        print(f"    🎚️  Chuẩn hóa loudness → AAC {AUDIO_BITRATE} (1 lần, cache theo hash)")
+        cmd = [ffmpeg_path, "-y", "-i", str(audio_path), "-vn", "-af", af,
+               "-ar", "48000", "-c:a", "aac", "-b:a", AUDIO_BITRATE]
+        if not _encode(cmd, "ffmpeg:audio-encode", base):
+            return None
+        entry["duration"] = get_media_duration(base, ffmpeg_path)
+        encoded = True
+
+    if fade_out and (encoded or not track.exists()):
+        fade_start = max((entry.get("duration") or 0) - AUDIO_FADE_SEC, 0)
+        cmd = [ffmpeg_path, "-y", "-i", str(base), "-af", f"afade=t=out:st={fade_start}:d={AUDIO_FADE_SEC}",
+               "-c:a", "aac", "-b:a", AUDIO_BITRATE]
+        if not _encode(cmd, "ffmpeg:audio-fade", track):
+            return None
+
+    save_json(index, str(index_path))
+    return {"file": str(track), "duration": entry.get("duration"), "cached": False}
+
+def overlay_audio(video_path, audio_path, output_path, ffmpeg_path="ffmpeg", preset="fast", crf=23):
     """
     Overlay audio lên video với xử lý mismatch thông minh:
     - Nếu video ngắn hơn audio: pad video bằng frame cuối
     - Nếu audio ngắn hơn video: fade out audio, giữ nguyên video
     - Nếu khớp: merge bình thường
+    Audio lấy từ track AAC đã chuẩn hóa (prepare_audio_track) → luôn -c:a copy;
+    video stream copy → bước này chỉ là remux.
     """
     video_dur = get_media_duration(video_path, ffmpeg_path)
-    audio_dur = get_media_duration(audio_path, ffmpeg_path)
+    track = prepare_audio_track(audio_path, ffmpeg_path)
+    if track:
+        audio_dur = track["duration"]
+    else:
+        print_warning("Không chuẩn bị được track AAC — encode audio trực tiếp")
+        audio_dur = get_media_duration(audio_path, ffmpeg_path)
 
     if video_dur and audio_dur:
         diff = video_dur - audio_dur
@@ -174,33 +546,45 @@ def overlay_audio(video_path, audio_path, output_path, ffmpeg_path="ffmpeg"):
     else:
         strategy = "shortest"
 
+    if strategy == "fade_audio" and audio_dur:
+        print(f"    🔧 Strategy: fade audio out at {max(audio_dur - AUDIO_FADE_SEC, 0):.0f}s")
+        faded = prepare_audio_track(audio_path, ffmpeg_path, fade_out=True) if track else None
+        if faded:
+            track = faded
+            audio_args = []
+        else:
+            # Fallback: encode audio trực tiếp kèm afade
+            track = None
+            audio_args = ["-af", f"afade=t=out:st={max(audio_dur - AUDIO_FADE_SEC, 0)}:d={AUDIO_FADE_SEC}"]
+    else:
+        audio_args = []
+    audio_input = track["file"] if track else audio_path
+    audio_args += ["-c:a", "copy"] if track else ["-c:a", "aac", "-b:a", AUDIO_BITRATE]
+
     if strategy == "pad_video" and video_dur and audio_dur:
         # Pad video to match audio duration
         print(f"    🔧 Strategy: pad video ({video_dur:.0f}s → {audio_dur:.0f}s)")
         cmd = [
             ffmpeg_path, "-y",
             "-i", video_path,
-            "-i", audio_path,
+            "-i", audio_input,
             "-filter_complex",
             f"[0:v]tpad=stop_mode=clone:stop_duration={audio_dur - video_dur}[v]",
             "-map", "[v]", "-map", "1:a:0",
-            "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-            "-c:a", "aac", "-b:a", "192k",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            *audio_args,
             "-shortest",
             "-movflags", "+faststart",
             output_path
         ]
     elif strategy == "fade_audio" and audio_dur:
         # Fade out audio at the end, keep full video silent after audio ends
-        fade_start = max(audio_dur - 3, 0)  # 3 second fade
-        print(f"    🔧 Strategy: fade audio out at {fade_start:.0f}s")
         cmd = [
             ffmpeg_path, "-y",
             "-i", video_path,
-            "-i", audio_path,
+            "-i", audio_input,
             "-c:v", "copy",
-            "-af", f"afade=t=out:st={fade_start}:d=3",
-            "-c:a", "aac", "-b:a", "192k",
+            *audio_args,
             "-map", "0:v:0", "-map", "1:a:0",
             "-movflags", "+faststart",
             output_path
@@ -211,9 +595,9 @@ def overlay_audio(video_path, audio_path, output_path, ffmpeg_path="ffmpeg"):
         cmd = [
             ffmpeg_path, "-y",
             "-i", video_path,
-            "-i", audio_path,
+            "-i", audio_input,
             "-c:v", "copy",
-            "-c:a", "aac", "-b:a", "192k",
+            *audio_args,
             "-map", "0:v:0", "-map", "1:a:0",
             "-shortest",
             "-movflags", "+faststart",
@@ -223,60 +607,214 @@ def overlay_audio(video_path, audio_path, output_path, ffmpeg_path="ffmpeg"):
     logger.info(f"FFmpeg overlay: {' '.join(cmd[:10])}...")
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        result = run_ffmpeg(cmd, name="ffmpeg:overlay-audio", duration=video_dur, logger=logger)
         if result.returncode != 0:
-            print_error(f"FFmpeg overlay failed: {result.stderr[:500]}")
+            print_error(f"FFmpeg overlay failed: {result.stderr[-500:]}")
             return False
         return True
-    except subprocess.TimeoutExpired:
-        print_error("FFmpeg timeout (300s)!")
+    except subprocess.TimeoutExpired as e:
+        print_error(f"FFmpeg bị treo (không tiến triển {e.timeout:.0f}s)!")
         return False
     except FileNotFoundError:
         print_error(f"FFmpeg không tìm thấy: {ffmpeg_path}")
         return False
 
-def add_transitions(video_path, output_path, transition_type="fade", duration_sec=0.5, ffmpeg_path="ffmpeg"):
-    """Thêm hiệu ứng fade in/out."""
-    # Get video duration
-    probe_cmd = [
-        ffmpeg_path, "-i", video_path,
-        "-hide_banner", "-f", "null", "-"
-    ]
-    
-    try:
-        probe = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=30)
-        # Extract duration from stderr
-        import re
-        match = re.search(r"Duration: (\d{2}):(\d{2}):(\d{2})\.\d{2}", probe.stderr)
-        if match:
-            total_seconds = int(match.group(1)) * 3600 + int(match.group(2)) * 60 + int(match.group(3))
+def build_renditions(names, output_path, profile):
+    """
+    Chuẩn bị danh sách renditions (filter + codec args) cho encode_renditions.
+    Returns: list[dict] {name, label, file, resolution, filter, codec_args}
+    """
+    width, height = (int(x) for x in profile["resolution"].split(":"))
+    base = Path(output_path)
+    renditions = []
+    for name in names:
+        spec = RENDITIONS.get(name)
+        if not spec:
+            logger.warning(f"Rendition '{name}' không tồn tại — bỏ qua")
+            continue
+        if spec.get("vertical"):
+            # Crop giữa khung 16:9 → 9:16, scale về kích thước dọc cùng profile
+            size = f"{height}:{width}"
+            vf = f"crop=ih*9/16:ih,scale={size},setsar=1"
+            codec_args = ["-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"]),
+                          "-c:a", "copy"]
         else:
-            total_seconds = 180  # Default 3 min
-    except Exception:
-        total_seconds = 180
-    
-    fade_out_start = max(total_seconds - duration_sec, 0)
-    
-    cmd = [
-        ffmpeg_path,
-        "-y",
-        "-i", video_path,
-        "-vf", f"fade=t=in:st=0:d={duration_sec},fade=t=out:st={fade_out_start}:d={duration_sec}",
-        "-c:a", "copy",
-        output_path
-    ]
-    
+            rend_height = min(spec["height"], height)
+            size = f"-2:{rend_height}"
+            vf = f"scale={size},setsar=1"
+            bitrate = spec["video_bitrate"]
+            codec_args = ["-c:v", "libx264", "-preset", "veryfast",
+                          "-b:v", bitrate, "-maxrate", bitrate,
+                          "-bufsize", f"{int(bitrate.rstrip('k')) * 2}k",
+                          "-c:a", "aac", "-b:a", spec["audio_bitrate"]]
+        renditions.append({
+            "name": name,
+            "label": spec["label"],
+            "file": str(base.with_name(f"{base.stem}-{name}{base.suffix}")),
+            "resolution": size,
+            "filter": vf,
+            "codec_args": codec_args,
+        })
+    return renditions
+
+def encode_renditions(video_path, renditions, ffmpeg_path="ffmpeg", duration=None):
+    """
+    Xuất renditions từ master đã hoàn chỉnh (fade có sẵn trong segments):
+    1 decode → split → từng rendition, master không bị encode lại.
+    """
+    if not renditions:
+        return True
+    labels = "".join(f"[v{i}]" for i in range(len(renditions)))
+    graph = [f"[0:v]split={len(renditions)}{labels}"]
+    outputs = []
+    for i, rend in enumerate(renditions):
+        graph.append(f"[v{i}]{rend['filter']}[o{i}]")
+        outputs += [
+            "-map", f"[o{i}]", "-map", "0:a?",
+            *rend["codec_args"],
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart", rend["file"],
+        ]
+    cmd = [ffmpeg_path, "-y", "-i", video_path, "-filter_complex", ";".join(graph)] + outputs
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        result = run_ffmpeg(cmd, name="ffmpeg:renditions", duration=duration, logger=logger,
+                            renditions=len(renditions))
         return result.returncode == 0
     except Exception as e:
-        print_warning(f"Transition failed (non-critical): {e}")
+        print_warning(f"Renditions failed (non-critical): {e}")
         return False
 
+TELEGRAM_MAX_MB = 50        # Bot API upload limit
+TELEGRAM_TARGET_MB = 47     # Chừa margin cho container overhead
+TELEGRAM_AUDIO_KBPS = 96
+
+def fit_for_telegram(video_path, ffmpeg_path="ffmpeg", target_mb=TELEGRAM_TARGET_MB):
+    """
+    Encode lại video cho vừa giới hạn Telegram (two-pass, bitrate tính từ duration).
+    Kết quả được cache theo (path, size, mtime, target) → gửi lại không encode lại.
+    Returns: đường dẫn file vừa giới hạn, hoặc None nếu thất bại.
+    """
+    import hashlib
+
+    src = Path(video_path)
+    stat = src.stat()
+    if stat.st_size <= target_mb * 1024 * 1024:
+        return str(src)
+
+    cache_dir = get_output_dir() / "final" / "telegram-cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha1(
+        f"{src.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{target_mb}".encode()
+    ).hexdigest()[:16]
+    cached = cache_dir / f"{src.stem}-tg-{key}.mp4"
+    if cached.exists() and cached.stat().st_size <= TELEGRAM_MAX_MB * 1024 * 1024:
+        print(f"    ♻️  Dùng bản Telegram đã encode: {cached}")
+        return str(cached)
+
+    duration = get_media_duration(src, ffmpeg_path)
+    if not duration:
+        print_error("Không đo được duration — không tính được bitrate cho Telegram")
+        return None
+
+    passlog = str(cache_dir / f"pass-{key}")
+    # Pass 2 ghi ra file tạm → chỉ os.replace vào cache khi encode xong + vừa giới hạn
+    tmp = make_temp_path(cache_dir, cached.name)
+    try:
+        for attempt, factor in enumerate((1.0, 0.85), 1):
+            total_kbps = target_mb * 1024 * 8 * 1.024 / duration * factor
+            video_kbps = int(total_kbps - TELEGRAM_AUDIO_KBPS)
+            if video_kbps < 150:
+                print_error(f"Video quá dài ({duration:.0f}s) để vừa {target_mb}MB")
+                return None
+            # Bitrate thấp → hạ độ phân giải để giữ chất lượng
+            height = 720 if video_kbps >= 1200 else 480
+            print(f"    🗜️  Encode cho Telegram: {video_kbps}k video, {height}p (lần {attempt})")
+            common = [
+                "-vf", f"scale=-2:'min({height},ih)'",
+                "-c:v", "libx264", "-preset", "veryfast",
+                "-b:v", f"{video_kbps}k", "-maxrate", f"{int(video_kbps * 1.5)}k",
+                "-bufsize", f"{video_kbps * 2}k",
+                "-pix_fmt", "yuv420p", "-passlogfile", passlog,
+            ]
+            pass1 = [ffmpeg_path, "-y", "-i", str(src), *common, "-pass", "1", "-an", "-f", "null", os.devnull]
+            pass2 = [ffmpeg_path, "-y", "-i", str(src), *common, "-pass", "2",
+                     "-c:a", "aac", "-b:a", f"{TELEGRAM_AUDIO_KBPS}k",
+                     "-movflags", "+faststart", str(tmp)]
+            try:
+                for cmd in (pass1, pass2):
+                    result = run_ffmpeg(cmd, name="ffmpeg:telegram-fit", duration=duration, logger=logger)
+                    if result.returncode != 0:
+                        print_error(f"FFmpeg Telegram encode failed: {result.stderr[-300:]}")
+                        return None
+            except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+                print_error(f"FFmpeg Telegram encode error: {e}")
+                return None
+            finally:
+                for log in cache_dir.glob(f"pass-{key}*"):
+                    log.unlink(missing_ok=True)
+
+            size_mb = tmp.stat().st_size / (1024 * 1024)
+            if size_mb <= TELEGRAM_MAX_MB:
+                os.replace(tmp, cached)
+                print_success(f"Telegram copy: {size_mb:.1f}MB → {cached}")
+                return str(cached)
+            print_warning(f"Vẫn quá lớn ({size_mb:.1f}MB) — encode lại với bitrate thấp hơn")
+    finally:
+        tmp.unlink(missing_ok=True)
+    return None
+
+class MultipartStream:
+    """
+    Body multipart/form-data dạng stream: đọc file theo chunk thay vì load
+    toàn bộ vào RAM, in tiến độ upload. Có __len__ → requests gửi Content-Length.
+    """
+
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, fields, file_field, file_path, content_type="video/mp4"):
+        import uuid
+
+        self.boundary = f"myshort-{uuid.uuid4().hex}"
+        self.file_path = Path(file_path)
+        self.file_size = self.file_path.stat().st_size
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{self.file_path.name}"\r\nContent-Type: {content_type}\r\n\r\n'
+        ).encode()
+        self.head = head
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        sent, next_report = 0, 10
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                yield chunk
+                percent = sent * 100 // max(self.file_size, 1)
+                if percent >= next_report:
+                    print(f"    📤 {percent}% ({sent / (1024 * 1024):.1f}MB)")
+                    next_report = percent - percent % 10 + 10
+        yield self.tail
+
 def send_telegram(video_path, title, description, config):
     """Gửi video qua Telegram Bot API."""
     token = config["telegram_token"]
     chat_id = config["telegram_chat_id"]
+    api_url = config.get("telegram_api_url", "https://api.telegram.org").rstrip("/")
     
     if not token or not chat_id:
         print_error("TELEGRAM_TOKEN hoặc TELEGRAM_CHAT_ID chưa cấu hình!")
@@ -289,39 +827,49 @@ def send_telegram(video_path, title, description, config):
         return False
     
     # Check file size (Telegram limit: 50MB for bot API)
-    file_size = Path(video_path).stat().st_size
-    file_size_mb = file_size / (1024 * 1024)
+    file_size_mb = Path(video_path).stat().st_size / (1024 * 1024)
     
-    if file_size_mb > 50:
-        print_warning(f"File quá lớn ({file_size_mb:.1f}MB > 50MB limit). Gửi link thay vì file.")
-        # Send text message with file path
-        text_url = f"https://api.telegram.org/bot{token}/sendMessage"
-        text_payload = {
-            "chat_id": chat_id,
-            "text": f"🎬 *{title}*\n\n{description}\n\n📁 File: `{video_path}`\n⚠️ File quá lớn để gửi qua Telegram.",
-            "parse_mode": "Markdown"
-        }
-        response = requests.post(text_url, json=text_payload, timeout=15)
-        return response.status_code == 200
+    if file_size_mb > TELEGRAM_MAX_MB:
+        print_warning(f"File quá lớn ({file_size_mb:.1f}MB > {TELEGRAM_MAX_MB}MB limit). Encode bản vừa giới hạn...")
+        fitted = fit_for_telegram(video_path, config.get("ffmpeg_path", "ffmpeg"))
+        if fitted is None:
+            # Fallback: gửi đường dẫn file
+            text_url = f"{api_url}/bot{token}/sendMessage"
+            text_payload = {
+                "chat_id": chat_id,
+                "text": f"🎬 *{title}*\n\n{description}\n\n📁 File: `{video_path}`\n⚠️ File quá lớn để gửi qua Telegram.",
+                "parse_mode": "Markdown"
+            }
+            response = requests.post(text_url, json=text_payload, timeout=15)
+            return response.status_code == 200
+        video_path = fitted
+        file_size_mb = Path(video_path).stat().st_size / (1024 * 1024)
     
     # Send video
-    url = f"https://api.telegram.org/bot{token}/sendVideo"
+    url = f"{api_url}/bot{token}/sendVideo"
     
     caption = f"🎬 *{title}*\n\n{description}"
     if len(caption) > 1024:
         caption = caption[:1021] + "..."
     
-    with open(video_path, "rb") as f:
-        files = {"video": f}
-        data = {
-            "chat_id": chat_id,
-            "caption": caption,
-            "parse_mode": "Markdown",
-            "supports_streaming": True,
-        }
-        
-        print(f"    📤 Uploading {file_size_mb:.1f}MB...")
-        response = requests.post(url, files=files, data=data, timeout=120)
+    body = MultipartStream({
+        "chat_id": chat_id,
+        "caption": caption,
+        "parse_mode": "Markdown",
+        "supports_streaming": "true",
+    }, "video", video_path)
+    
+    print(f"    📤 Uploading {file_size_mb:.1f}MB...")
+    try:
+        # timeout=(connect, read): read timeout tính giữa các lần nhận data, không phải tổng
+        with tracer.span("http:telegram-upload") as span:
+            response = requests.post(url, data=body, headers={"Content-Type": body.content_type},
+                                     timeout=(15, 300))
+            span.set(status_code=response.status_code)
+            span.add_bytes(bytes_in=len(response.content), bytes_out=len(body))
+    except requests.RequestException as e:
+        print_error(f"Telegram upload failed: {e}")
+        return False
     
     if response.status_code == 200:
         return True
@@ -330,14 +878,23 @@ def send_telegram(video_path, title, description, config):
         return False
 
 def aggregate_video(clips_dir, audio_path=None, script=None,
-                    send_telegram_flag=False, dry_run=False, config=None):
-    """Quy trình chính: ghép video + audio → gửi Telegram."""
+                    send_telegram_flag=False, dry_run=False, config=None,
+                    render_profile=None, renditions=None, workers=None):
+    """
+    Quy trình chính: encode segments song song → nối (copy) → audio → gửi Telegram.
+    workers: số lệnh ffmpeg song song (mặc định RENDER_WORKERS / theo số core).
+    """
     print_header("Agent 5: Video Aggregator", "🎞️")
     
     if config is None:
         config = get_config()
     
     ffmpeg = config.get("ffmpeg_path", "ffmpeg")
+    profile = get_render_profile(render_profile or config.get("render_profile"))
+    suffix = "" if profile["name"] == DEFAULT_RENDER_PROFILE else f"-{profile['name']}"
+    rendition_names = list(renditions or [])
+    if send_telegram_flag and "telegram" not in rendition_names:
+        rendition_names.append("telegram")
     output_dir = ensure_output_dirs()
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     
@@ -346,6 +903,9 @@ def aggregate_video(clips_dir, audio_path=None, script=None,
     print(f"  📹 Clips found: {len(clips)}")
     if audio_path:
         print(f"  🎵 Audio: {audio_path}")
+    print(f"  🎚️  Render profile: {profile['name']} "
+          f"({profile['resolution'].replace(':', 'x')}@{profile['fps']}fps, "
+          f"{profile['preset']}, crf {profile['crf']})")
     
     if not clips and not dry_run:
         print_error("Không tìm thấy clips!")
@@ -363,16 +923,25 @@ def aggregate_video(clips_dir, audio_path=None, script=None,
     result = {
         "title": title,
         "clips_count": len(clips),
+        "render_profile": profile["name"],
+        "inputs": {
+            "clips_dir": str(clips_dir) if clips_dir else None,
+            "audio": str(audio_path) if audio_path else None,
+        },
         "steps": [],
     }
     
     if dry_run:
         print_warning("DRY-RUN MODE")
         print(f"\n  📋 Pipeline sẽ thực hiện:")
-        print(f"    1. Ghép {len(clips) if clips else 'N'} clips → merged.mp4")
+        workers, threads = get_render_workers(workers or config.get("render_workers"), len(clips) or None)
+        print(f"    1. Encode {len(clips) if clips else 'N'} segments song song "
+              f"({workers} workers × {threads} threads, fade ở segment đầu/cuối)")
+        print(f"    2. Nối segments (stream copy) → merged.mp4")
         if audio_path:
-            print(f"    2. Overlay audio → with-audio.mp4")
-        print(f"    3. Thêm fade in/out → final.mp4")
+            print(f"    3. Overlay audio (video copy) → final.mp4")
+        if rendition_names:
+            print(f"       + renditions (cùng 1 decode): {', '.join(rendition_names)}")
         if send_telegram_flag:
             print(f"    4. Gửi qua Telegram")
         
@@ -380,56 +949,82 @@ def aggregate_video(clips_dir, audio_path=None, script=None,
         result["final_video"] = None
         return result
     
-    # Step 0.5: Normalize clips (same resolution/fps/codec)
-    print_step(1, 5, f"Normalize {len(clips)} clips (cùng format/fps/resolution)...")
-    clips = normalize_clips(clips, str(output_dir / "final"), ffmpeg)
-    print_success(f"Normalized {len(clips)} clips")
-
-    # Step 1: Merge clips
-    merged_path = str(output_dir / "final" / f"merged-{timestamp}.mp4")
-    print_step(2, 5, f"Ghép {len(clips)} clips...")
-    
-    if merge_clips(clips, merged_path, ffmpeg):
-        print_success(f"Merged → {merged_path}")
-        result["steps"].append({"step": "merge", "status": "ok", "file": merged_path})
-        current_video = merged_path
-    else:
+    # Step 1: Encode segments song song (normalize + encode final + fade đầu/cuối trong 1 lần)
+    # Segment cache: clip không đổi → dùng lại, chỉ encode clip mới/thay thế
+    audio_ok = bool(audio_path and Path(audio_path).exists())
+    # Audio: loudnorm + AAC 1 lần (cache theo hash) → duration có sẵn, overlay chỉ remux
+    audio_track = prepare_audio_track(audio_path, ffmpeg) if audio_ok else None
+    if audio_track and audio_track["cached"]:
+        print(f"  ♻️  Track AAC đã chuẩn hóa: {audio_track['file']}")
+    audio_dur = (audio_track or {}).get("duration") or (get_media_duration(audio_path, ffmpeg) if audio_ok else None)
+    cache_dir = output_dir / "final" / "segment-cache"
+    print_step(1, 4, f"Encode {len(clips)} segments song song...")
+    seg_stats = {}
+    segments = encode_segments(clips, cache_dir, ffmpeg, profile,
+                               durations=load_clip_timeline(clips_dir),
+                               min_duration=audio_dur, workers=workers or config.get("render_workers"),
+                               stats=seg_stats)
+    if not segments:
+        print_error("Encode segments failed!")
+        result["status"] = "failed"
+        return result
+    print_success(f"Segments sẵn sàng: {seg_stats['encoded']} encode mới, {seg_stats['cached']} từ cache")
+    result["steps"].append({"step": "segments", "status": "ok", "dir": str(cache_dir),
+                            "count": len(segments), **seg_stats})
+
+    # Step 2: Nối segments (stream copy) → không audio thì đây là bản final luôn
+    final_path = str(output_dir / "final" / f"final-{timestamp}{suffix}.mp4")
+    merged_path = str(output_dir / "final" / f"merged-{timestamp}{suffix}.mp4") if audio_ok else final_path
+    print_step(2, 4, f"Nối {len(segments)} segments (stream copy)...")
+    if not concat_segments(segments, merged_path, ffmpeg):
         print_error("Merge failed!")
         result["status"] = "failed"
         return result
-    
-    # Step 2: Overlay audio
-    if audio_path and Path(audio_path).exists():
-        audio_video_path = str(output_dir / "final" / f"with-audio-{timestamp}.mp4")
-        print_step(2, 4, "Overlay audio lên video...")
-        
-        if overlay_audio(current_video, audio_path, audio_video_path, ffmpeg):
-            print_success(f"Audio overlay → {audio_video_path}")
-            result["steps"].append({"step": "audio", "status": "ok", "file": audio_video_path})
-            current_video = audio_video_path
+    print_success(f"Merged → {merged_path}")
+    result["steps"].append({"step": "merge", "status": "ok", "file": merged_path})
+
+    # Step 3: Overlay audio (video stream copy) + renditions
+    if audio_ok:
+        print_step(3, 4, "Overlay audio lên video...")
+        if overlay_audio(merged_path, audio_path, final_path, ffmpeg,
+                         preset=profile["normalize_preset"], crf=profile["crf"]):
+            print_success(f"Audio overlay → {final_path}")
+            result["steps"].append({"step": "audio", "status": "ok", "file": final_path})
         else:
             print_warning("Audio overlay failed — giữ video không nhạc")
+            final_path = merged_path
     else:
-        print_step(2, 4, "Bỏ qua audio overlay (không có file audio)")
-    
-    # Step 3: Add transitions
-    final_path = str(output_dir / "final" / f"final-{timestamp}.mp4")
-    print_step(3, 4, "Thêm fade in/out transitions...")
-    
-    if add_transitions(current_video, final_path, ffmpeg_path=ffmpeg):
-        print_success(f"Transitions → {final_path}")
-        result["steps"].append({"step": "transitions", "status": "ok", "file": final_path})
-    else:
-        print_warning("Transitions failed — sử dụng video không transition")
-        final_path = current_video
+        print_step(3, 4, "Bỏ qua audio overlay (không có file audio)")
+
+    extra = build_renditions(rendition_names, final_path, profile)
+    result["renditions"] = {}
+    if extra:
+        print(f"    🎬 Renditions (cùng 1 decode): {', '.join(r['name'] for r in extra)}")
+        if encode_renditions(final_path, extra, ffmpeg, duration=audio_dur):
+            result["steps"].append({"step": "renditions", "status": "ok"})
+        for rend in extra:
+            if Path(rend["file"]).exists():
+                result["renditions"][rend["name"]] = {
+                    "label": rend["label"],
+                    "file": rend["file"],
+                    "resolution": rend["resolution"],
+                    "file_size_mb": round(Path(rend["file"]).stat().st_size / (1024 * 1024), 2),
+                }
+                print_success(f"  {rend['label']} → {rend['file']}")
     
     result["final_video"] = final_path
+    result["renditions"]["master"] = {
+        "label": "YouTube master 16:9",
+        "file": final_path,
+        "resolution": profile["resolution"],
+    }
     
     # Step 4: Send Telegram
     if send_telegram_flag:
         print_step(4, 4, "Gửi video qua Telegram...")
+        send_path = result["renditions"].get("telegram", {}).get("file", final_path)
         
-        if send_telegram(final_path, title, description, config):
+        if send_telegram(send_path, title, description, config):
             print_success("Đã gửi qua Telegram!")
             result["steps"].append({"step": "telegram", "status": "ok"})
         else:
@@ -459,10 +1054,20 @@ def main():
                        help="Test pipeline không thực hiện")
     parser.add_argument("--no-telegram", action="store_true",
                        help="Không gửi Telegram notification (dùng bởi orchestrator)")
+    parser.add_argument("--render-profile", choices=sorted(RENDER_PROFILES),
+                       help="draft (480p, nhanh) / standard / final (mặc định: RENDER_PROFILE hoặc standard)")
+    parser.add_argument("--renditions", default="",
+                       help=f"Xuất thêm bản phụ, phân cách bằng dấu phẩy ({', '.join(RENDITIONS)})")
+    parser.add_argument("--workers", type=int,
+                       help="Số segment encode song song (mặc định: RENDER_WORKERS hoặc theo số core)")
     parser.add_argument("--output", help="Đường dẫn video output")
     parser.add_argument("--json", action="store_true",
                        help="In JSON ra stdout")
+    parser.add_argument("--profile", nargs="?", const="auto", metavar="PATH",
+                       help="Chạy dưới cProfile, lưu .prof (mặc định: OUTPUT_DIR/profiles/)")
     args = parser.parse_args()
+    if args.json:
+        json_mode()
     
     config = get_config()
     
@@ -490,6 +1095,9 @@ def main():
         send_telegram_flag=args.send_telegram,
         dry_run=args.dry_run,
         config=config,
+        render_profile=args.render_profile,
+        renditions=[r.strip() for r in args.renditions.split(",") if r.strip()],
+        workers=args.workers,
     )
     
     if result is None:
@@ -497,7 +1105,7 @@ def main():
         sys.exit(1)
     
     if args.json:
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        emit_json(result)
     else:
         # Save result
         output_dir = ensure_output_dirs()
@@ -515,4 +1123,4 @@ def main():
         print(f"{'━' * 50}\n")
 
 if __name__ == "__main__":
-    main()
+    run_profiled(main, "video_aggregator")
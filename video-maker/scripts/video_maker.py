@@ -24,13 +24,17 @@ sys.path.insert(0, str(MYSHORT_ROOT / "shared"))
 from utils import (
     setup_logging, get_config, ensure_output_dirs, save_json, load_json,
     print_header, print_step, print_success, print_warning, print_error,
-    safe_filename, get_output_dir, send_telegram
+    safe_filename, get_output_dir, send_telegram, json_mode, emit_json
 )
+from timeline import (
+    VEO_MAX_CLIP_SECONDS, get_bpm, is_replanned, plan_scene_timeline, veo_request_seconds
+)
+from tracing import get_tracer, trace_response
+from ffmpeg_runner import probe_duration
+from profiling import run_profiled
 
 logger = setup_logging("VideoMaker")
-
-# ── Constants ──
-VEO_MAX_CLIP_SECONDS = 8  # Google Veo max per generation
+tracer = get_tracer("video_maker")
 
 RESOLUTION_MAP = {
     "720p": {"width": 1280, "height": 720},
@@ -113,10 +117,43 @@ def split_scene_to_subclips(scene):
 
     return subclips
 
-def build_veo_prompts(script):
+def plan_subclips(script, audio_duration=None):
+    """
+    Chia scenes thành sub-clips.
+    - Script audio-first (đã re-plan): mỗi scene = 1 clip, dùng nguyên duration
+    - Có audio_duration: timeline planner (tổng = độ dài nhạc, cắt theo beat)
+    - Không có: theo timestamps của LLM (split_scene_to_subclips)
+    """
+    scenes = script.get("scenes", [])
+    if is_replanned(script):
+        return [
+            {
+                **scene,
+                "sub_id": scene.get("part", [1, 1])[0],
+                "sub_total": scene.get("part", [1, 1])[1],
+                "sub_duration": scene["duration"],
+                "sub_start": scene["start"],
+            }
+            for scene in scenes
+        ]
+    if not audio_duration:
+        return [sub for scene in scenes for sub in split_scene_to_subclips(scene)]
+
+    timeline = plan_scene_timeline(scenes, audio_duration, get_bpm(script))
+    return [
+        {
+            **scenes[t["scene_index"]],
+            "sub_id": t["sub_id"],
+            "sub_total": t["sub_total"],
+            "sub_duration": t["sub_duration"],
+            "sub_start": t["sub_start"],
+        }
+        for t in timeline
+    ]
+
+def build_veo_prompts(script, audio_duration=None):
     """Tạo Google Veo prompts từ kịch bản. Tự chia scenes dài thành sub-clips."""
     prompts = []
-    scenes = script.get("scenes", [])
 
     base_style = (
         "3D animated cartoon, Pixar-quality rendering, bright vivid colors, "
@@ -131,46 +168,43 @@ def build_veo_prompts(script):
     )
 
     global_idx = 0
-    for scene in scenes:
-        subclips = split_scene_to_subclips(scene)
-
-        for sub in subclips:
-            global_idx += 1
-            character_desc = ", ".join(sub.get("characters", ["cute cartoon character"]))
-
-            # Add continuity hints for sub-clips
-            continuity = ""
-            if sub["sub_total"] > 1:
-                if sub["sub_id"] == 1:
-                    continuity = "Beginning of scene, establish setting. "
-                elif sub["sub_id"] == sub["sub_total"]:
-                    continuity = "End of scene, conclude action. "
-                else:
-                    continuity = "Continuing same scene, maintain consistency. "
-
-            prompt = (
-                f"{base_style}. {continuity}"
-                f"Scene: {sub.get('description', '')}. "
-                f"Characters: {character_desc}. "
-                f"Action: {sub.get('action', 'gentle movement')}. "
-                f"Background: {sub.get('background', 'colorful fantasy setting')}. "
-                f"Color palette: {sub.get('colors', 'bright rainbow colors')}. "
-                f"Camera: {sub.get('camera_movement', 'static wide shot')}. "
-                f"Mood: {sub.get('mood', 'happy and cheerful')}. "
-                f"Lighting: bright, even, no harsh shadows."
-            )
+    for sub in plan_subclips(script, audio_duration):
+        global_idx += 1
+        character_desc = ", ".join(sub.get("characters", ["cute cartoon character"]))
+
+        # Add continuity hints for sub-clips
+        continuity = ""
+        if sub["sub_total"] > 1:
+            if sub["sub_id"] == 1:
+                continuity = "Beginning of scene, establish setting. "
+            elif sub["sub_id"] == sub["sub_total"]:
+                continuity = "End of scene, conclude action. "
+            else:
+                continuity = "Continuing same scene, maintain consistency. "
+
+        prompt = (
+            f"{base_style}. {continuity}"
+            f"Scene: {sub.get('description', '')}. "
+            f"Characters: {character_desc}. "
+            f"Action: {sub.get('action', 'gentle movement')}. "
+            f"Background: {sub.get('background', 'colorful fantasy setting')}. "
+            f"Color palette: {sub.get('colors', 'bright rainbow colors')}. "
+            f"Camera: {sub.get('camera_movement', 'static wide shot')}. "
+            f"Mood: {sub.get('mood', 'happy and cheerful')}. "
+            f"Lighting: bright, even, no harsh shadows."
+        )
 
-            prompts.append({
-                "clip_idx": global_idx,
-                "scene_id": sub["id"],
-                "sub_id": sub["sub_id"],
-                "sub_total": sub["sub_total"],
-                "timestamp": sub.get("timestamp", ""),
-                "duration_seconds": sub["sub_duration"],
-                "lyrics_section": sub.get("lyrics_section", ""),
-                "prompt": prompt,
-                "negative_prompt": negative,
-            })
+        prompts.append({
+            "clip_idx": global_idx,
+            "scene_id": sub["id"],
+            "sub_id": sub["sub_id"],
+            "sub_total": sub["sub_total"],
+            "timestamp": sub.get("timestamp", ""),
+            "duration_seconds": sub["sub_duration"],
+            "lyrics_section": sub.get("lyrics_section", ""),
+            "prompt": prompt,
+            "negative_prompt": negative,
+        })
 
     return prompts
 
@@ -206,6 +240,7 @@ def call_veo_api(prompt_data, config, output_path):
     api_key = config["google_veo_api_key"]
     credentials_path = config["google_credentials"]
     timeout = config["veo_timeout"]
+    base_url = config.get("google_api_url", "https://generativelanguage.googleapis.com").rstrip("/")
     
     try:
         import requests
@@ -216,11 +251,12 @@ def call_veo_api(prompt_data, config, output_path):
     prompt_text = prompt_data["prompt"]
     negative = prompt_data.get("negative_prompt", "")
     duration = prompt_data.get("duration_seconds", 10)
+    veo_seconds = veo_request_seconds(duration)
     
     # ── Option 1: API Key (Gemini API) ──
     if api_key:
         url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/"
+            f"{base_url}/v1beta/models/"
             f"veo-2.0-generate-001:predictLongRunning?key={api_key}"
         )
         
@@ -230,7 +266,7 @@ def call_veo_api(prompt_data, config, output_path):
             }],
             "parameters": {
                 "aspectRatio": "16:9",
-                "durationSeconds": min(duration, VEO_MAX_CLIP_SECONDS),
+                "durationSeconds": veo_seconds,
             }
         }
         
@@ -238,10 +274,12 @@ def call_veo_api(prompt_data, config, output_path):
         if negative:
             payload["parameters"]["negativePrompt"] = negative
         
-        logger.info(f"Veo request: duration={min(duration, VEO_MAX_CLIP_SECONDS)}s")
+        logger.info(f"Veo request: duration={veo_seconds}s (planned {duration}s)")
         
         try:
-            response = requests.post(url, json=payload, timeout=30)
+            with tracer.span("http:veo-submit", seconds=veo_seconds) as span:
+                response = requests.post(url, json=payload, timeout=30)
+                trace_response(span, response)
             if response.status_code != 200:
                 print_error(f"Veo API error {response.status_code}: {response.text[:500]}")
                 return None
@@ -253,7 +291,9 @@ def call_veo_api(prompt_data, config, output_path):
         # Poll for completion
         op_name = operation.get("name", "")
         if op_name:
-            return poll_veo_operation(op_name, api_key, timeout, output_path)
+            return poll_veo_operation(op_name, api_key, timeout, output_path,
+                                      base_url=base_url,
+                                      poll_interval=config.get("veo_poll_interval", 15))
         
         return operation
     
@@ -280,17 +320,19 @@ def call_veo_api(prompt_data, config, output_path):
                 "instances": [{"prompt": prompt_text}],
                 "parameters": {
                     "aspectRatio": "16:9",
-                    "durationSeconds": min(duration, VEO_MAX_CLIP_SECONDS),
+                    "durationSeconds": veo_seconds,
                     "negativePrompt": negative,
                 }
             }
             
-            response = requests.post(
-                f"https://{location}-aiplatform.googleapis.com/v1/{endpoint}:predict",
-                json=payload,
-                headers={"Authorization": f"Bearer {credentials.token}"},
-                timeout=30
-            )
+            with tracer.span("http:veo-submit", seconds=veo_seconds, api="vertex") as span:
+                response = requests.post(
+                    f"https://{location}-aiplatform.googleapis.com/v1/{endpoint}:predict",
+                    json=payload,
+                    headers={"Authorization": f"Bearer {credentials.token}"},
+                    timeout=30
+                )
+                trace_response(span, response)
             response.raise_for_status()
             return response.json()
             
@@ -302,17 +344,20 @@ def call_veo_api(prompt_data, config, output_path):
         print_error("Cần GOOGLE_VEO_API_KEY hoặc GOOGLE_APPLICATION_CREDENTIALS + GOOGLE_CLOUD_PROJECT")
         return None
 
-def poll_veo_operation(op_name, api_key, timeout, output_path):
+def poll_veo_operation(op_name, api_key, timeout, output_path,
+                       base_url="https://generativelanguage.googleapis.com", poll_interval=15):
     """Poll Veo operation cho đến khi hoàn tất."""
     import requests
     
     start_time = time.time()
     while time.time() - start_time < timeout:
-        time.sleep(15)
+        time.sleep(poll_interval)
         
-        url = f"https://generativelanguage.googleapis.com/v1beta/{op_name}?key={api_key}"
-        response = requests.get(url, timeout=15)
-        data = response.json()
+        url = f"{base_url}/v1beta/{op_name}?key={api_key}"
+        with tracer.span("http:veo-poll") as span:
+            response = requests.get(url, timeout=15)
+            trace_response(span, response)
+            data = response.json()
         
         elapsed = int(time.time() - start_time)
         done = data.get("done", False)
@@ -325,10 +370,13 @@ def poll_veo_operation(op_name, api_key, timeout, output_path):
                 video_uri = videos[0].get("video", {}).get("uri", "")
                 if video_uri:
                     # Download video
-                    download_response = requests.get(video_uri, timeout=120, stream=True)
-                    with open(output_path, "wb") as f:
-                        for chunk in download_response.iter_content(chunk_size=8192):
-                            f.write(chunk)
+                    with tracer.span("http:veo-download") as span:
+                        download_response = requests.get(video_uri, timeout=120, stream=True)
+                        span.set(status_code=download_response.status_code)
+                        with open(output_path, "wb") as f:
+                            for chunk in download_response.iter_content(chunk_size=8192):
+                                f.write(chunk)
+                                span.add_bytes(bytes_in=len(chunk))
                     return {"video_file": str(output_path), "uri": video_uri}
             
             return result
@@ -339,13 +387,7 @@ def poll_veo_operation(op_name, api_key, timeout, output_path):
 def get_audio_duration(audio_path, ffmpeg_path="ffmpeg"):
     """Đo duration thật sự của file audio bằng FFprobe/FFmpeg."""
     try:
-        cmd = [ffmpeg_path, "-i", str(audio_path), "-hide_banner", "-f", "null", "-"]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        import re
-        match = re.search(r"Duration: (\d{2}):(\d{2}):(\d{2})\.(\d{2})", result.stderr)
-        if match:
-            h, m, s, cs = int(match.group(1)), int(match.group(2)), int(match.group(3)), int(match.group(4))
-            return h * 3600 + m * 60 + s + cs / 100.0
+        return probe_duration(audio_path, ffmpeg_path)
     except Exception as e:
         logger.warning(f"Cannot measure audio duration: {e}")
     return None
@@ -372,11 +414,16 @@ def create_video_clips(script, music_path=None, resolution="1080p", dry_run=Fals
         print(f"  🎵 Music: {music_path} ({audio_duration:.1f}s)" if audio_duration else f"  🎵 Music: {music_path}")
     print()
 
-    # Build prompts (auto-splits long scenes)
-    print_step(1, 2, "Tạo Veo prompts (tự chia sub-clips ≤ 8s)...")
-    veo_prompts = build_veo_prompts(script)
+    # Build prompts (auto-splits long scenes; khớp độ dài nhạc nếu có audio)
+    if is_replanned(script):
+        print_step(1, 2, "Tạo Veo prompts (script audio-first, đã re-plan theo nhạc)...")
+    elif audio_duration:
+        print_step(1, 2, f"Tạo Veo prompts (timeline theo nhạc {audio_duration:.1f}s, sub-clips 4-8s)...")
+    else:
+        print_step(1, 2, "Tạo Veo prompts (tự chia sub-clips ≤ 8s)...")
+    veo_prompts = build_veo_prompts(script, audio_duration)
     total_clips = len(veo_prompts)
-    total_video_duration = sum(p["duration_seconds"] for p in veo_prompts)
+    total_video_duration = round(sum(p["duration_seconds"] for p in veo_prompts), 3)
 
     print(f"  📊 {total_scenes} scenes → {total_clips} clips ({total_video_duration}s tổng)")
     if audio_duration:
@@ -390,6 +437,8 @@ def create_video_clips(script, music_path=None, resolution="1080p", dry_run=Fals
     clips_dir = output_dir / "clips" / datetime.now().strftime("%Y%m%d-%H%M%S")
     clips_dir.mkdir(parents=True, exist_ok=True)
 
+    # Timeline manifest: Agent 5 trim từng clip về đúng duration đã lập
+    timeline_clips = []
     results = []
 
     for i, prompt_data in enumerate(veo_prompts):
@@ -400,6 +449,11 @@ def create_video_clips(script, music_path=None, resolution="1080p", dry_run=Fals
 
         clip_filename = f"clip-{prompt_data['clip_idx']:03d}_scene-{scene_id}_sub-{prompt_data['sub_id']}.mp4"
         clip_path = clips_dir / clip_filename
+        timeline_clips.append({
+            "file": clip_filename,
+            "duration": prompt_data["duration_seconds"],
+            "veo_seconds": veo_request_seconds(prompt_data["duration_seconds"]),
+        })
 
         if dry_run:
             print_warning(f"    DRY-RUN — skip Veo API")
@@ -413,7 +467,11 @@ def create_video_clips(script, music_path=None, resolution="1080p", dry_run=Fals
             })
             continue
 
-        veo_result = call_veo_api(prompt_data, config, str(clip_path))
+        with tracer.span("veo:clip", clip_idx=prompt_data["clip_idx"], scene_id=scene_id,
+                         seconds=veo_request_seconds(prompt_data["duration_seconds"])) as span:
+            veo_result = call_veo_api(prompt_data, config, str(clip_path))
+            if not veo_result:
+                span.fail("no result")
 
         if veo_result:
             print_success(f"    Clip {prompt_data['clip_idx']} done!")
@@ -434,6 +492,12 @@ def create_video_clips(script, music_path=None, resolution="1080p", dry_run=Fals
                 "clip_path": None,
             })
 
+    save_json({
+        "audio_duration": audio_duration,
+        "total_duration": total_video_duration,
+        "clips": timeline_clips,
+    }, clips_dir / "timeline.json")
+
     return {
         "clips_dir": str(clips_dir),
         "total_scenes": total_scenes,
@@ -461,7 +525,11 @@ def main():
     parser.add_argument("--output-dir", help="Thư mục lưu clips")
     parser.add_argument("--json", action="store_true",
                        help="In JSON ra stdout")
+    parser.add_argument("--profile", nargs="?", const="auto", metavar="PATH",
+                       help="Chạy dưới cProfile, lưu .prof (mặc định: OUTPUT_DIR/profiles/)")
     args = parser.parse_args()
+    if args.json:
+        json_mode()
     
     # Load script
     if args.script:
@@ -480,7 +548,7 @@ def main():
     )
     
     if args.json:
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        emit_json(result)
     else:
         # Save result
         output_dir = ensure_output_dirs()
@@ -512,7 +580,7 @@ def main():
         msg_lines.append("⚠️ Dry-run mode")
     
     # Build prompts from script for notification
-    veo_prompts = build_veo_prompts(script)
+    veo_prompts = build_veo_prompts(script, result.get("audio_duration"))
     prompt_map = {p['clip_idx']: p['prompt'] for p in veo_prompts}
     
     msg_lines.append("\n🎬 *Scene Prompts:*")
@@ -534,4 +602,4 @@ def main():
     print_success("Đã gửi scene prompts qua Telegram")
 
 if __name__ == "__main__":
-    main()
+    run_profiled(main, "video_maker")